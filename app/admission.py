@@ -0,0 +1,192 @@
+"""Admission control: bounded concurrency and load shedding for the handlers.
+
+The CRUD handlers are sync `def`s run on AnyIO's threadpool, which queues
+requests without limit once its threads are busy: when the database slows
+down, latency grows for everyone instead of a few requests failing fast.
+`AdmissionMiddleware` puts a `CapacityLimiter` per pool in front of them:
+
+    read     GET requests, at most `admission_read_limit` at a time
+    write    every other method, at most `admission_write_limit`
+    <route>  "METHOD /path/template" of `admission_route_limits`, e.g.
+             "POST /trainers/bulk=2,GET /trainers/export=4", instead of the
+             read or write pool
+
+A request waits for a slot at most `admission_max_queue_ms`, and gives up at
+once if `admission_max_queue` requests are already waiting; either way it gets
+a 503 with `Retry-After: admission_retry_after` rather than a slow answer. A
+limit of 0 leaves the pool unlimited. `threadpool_size` sets the number of
+threads (AnyIO's default is 40); keep the read and write limits within it so
+requests queue here, where the wait is bounded, and not in the threadpool.
+
+The requests in flight and queued per pool, the ones shed, and the threadpool's
+busy threads and waiting tasks are on /metrics as `gym_admission_*` and
+`gym_threadpool_*` gauges, for autoscaling.
+"""
+import json
+from typing import Dict, Optional
+
+import anyio
+import anyio.to_thread
+from starlette.routing import Match
+
+from . import metrics
+from .settings import Settings, settings
+
+READ = "read"
+WRITE = "write"
+# Always admitted, so an overloaded instance can still be scraped and probed.
+EXEMPT_PATHS = frozenset({"/metrics", "/health/db"})
+
+
+class Pool:
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limiter = anyio.CapacityLimiter(limit or float("inf"))
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+    @property
+    def in_flight(self) -> int:
+        return self.limiter.borrowed_tokens
+
+    @property
+    def queued(self) -> int:
+        return self.limiter.statistics().tasks_waiting
+
+    async def admit(self) -> bool:
+        """Take a slot, waiting at most `max_wait`; False if the request is
+        shed instead."""
+        if (
+            self.max_queue
+            and self.limiter.available_tokens < 1
+            and self.queued >= self.max_queue
+        ):
+            return False
+        with anyio.move_on_after(self.max_wait):
+            await self.limiter.acquire()
+            return True
+        return False
+
+    def release(self) -> None:
+        self.limiter.release()
+
+
+def parse_route_limits(value: str) -> Dict[str, int]:
+    """Parse "POST /trainers/bulk=2,GET /x=4" into {route: limit}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        route, sep, limit = item.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        if not sep or not path:
+            raise ValueError(f"Invalid admission route limit: {item!r}")
+        limits[f"{method.upper()} {path.strip()}"] = int(limit)
+    return limits
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        read_limit: int = 0,
+        write_limit: int = 0,
+        route_limits: Optional[Dict[str, int]] = None,
+        max_queue: int = 0,
+        max_queue_ms: float = 1000.0,
+        retry_after: int = 1,
+    ):
+        max_wait = max_queue_ms / 1000
+
+        def pool(name, limit):
+            return Pool(name, limit, max_queue, max_wait)
+
+        self.pools = {READ: pool(READ, read_limit), WRITE: pool(WRITE, write_limit)}
+        self.route_pools = {
+            route: pool(route, limit) for route, limit in (route_limits or {}).items()
+        }
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "AdmissionController":
+        return cls(
+            settings.admission_read_limit,
+            settings.admission_write_limit,
+            parse_route_limits(settings.admission_route_limits),
+            settings.admission_max_queue,
+            settings.admission_max_queue_ms,
+            settings.admission_retry_after,
+        )
+
+    def pool_for(self, scope) -> Pool:
+        if self.route_pools:
+            for route in scope["app"].router.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    pool = self.route_pools.get(f"{scope['method']} {route.path}")
+                    if pool is not None:
+                        return pool
+                    break
+        return self.pools[READ if scope["method"] in ("GET", "HEAD") else WRITE]
+
+    def update_gauges(self) -> None:
+        for pool in (*self.pools.values(), *self.route_pools.values()):
+            metrics.admission_in_flight.set(pool.in_flight, pool.name)
+            metrics.admission_queued.set(pool.queued, pool.name)
+
+
+def admission_enabled(settings: Settings) -> bool:
+    return bool(
+        settings.admission_read_limit
+        or settings.admission_write_limit
+        or settings.admission_route_limits
+    )
+
+
+def set_threadpool_size(size: int) -> None:
+    """Resize AnyIO's default threadpool; call from inside the event loop."""
+    if size:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = size
+
+
+def update_threadpool_gauges() -> None:
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    metrics.threadpool_busy.set(limiter.borrowed_tokens)
+    metrics.threadpool_waiting.set(limiter.statistics().tasks_waiting)
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware, see the module docstring."""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or AdmissionController.from_settings(settings)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+        pool = self.controller.pool_for(scope)
+        admitted = await pool.admit()
+        self.controller.update_gauges()
+        if not admitted:
+            metrics.admission_shed.inc(pool.name)
+            return await self._shed(send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
+            self.controller.update_gauges()
+
+    async def _shed(self, send) -> None:
+        body = json.dumps(
+            {"detail": {"type": "overloaded", "msg": "Server busy, retry later"}}
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.controller.retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
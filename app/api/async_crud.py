@@ -0,0 +1,15 @@
+"""Async versions of the CRUD routes in app/main.py.
+
+Served instead of the sync routes when `settings.db_mode == "async"`. Handlers
+are `async def` on an `AsyncSession` (aiosqlite), so requests don't hold a
+threadpool worker while waiting on the database. They are generated from the
+same `Resource` specs as the sync routes, see app/crud.py.
+"""
+from fastapi import APIRouter
+
+from ..crud import RESOURCES, async_crud_router
+from ..database import get_async_session
+
+router = APIRouter()
+for resource in RESOURCES:
+    router.include_router(async_crud_router(resource, get_async_session))
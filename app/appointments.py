@@ -0,0 +1,239 @@
+"""Training appointments: booking, cancelling and finding free time.
+
+    POST   /appointments/                       book {"trainer_id", "start",
+                                                "duration_minutes"}; 409 if it
+                                                overlaps the trainer's schedule
+    GET    /appointments/{appointment_id}
+    DELETE /appointments/{appointment_id}       cancel, freeing the slot
+    GET    /trainers/{trainer_id}/appointments?from=&to=
+    GET    /trainers/{trainer_id}/availability?from=&to=&min_minutes=
+    GET    /facilities/{facility_id}/free-slots?from=&to=&min_minutes=
+                                                the availability of every
+                                                trainer working there
+
+Everything goes through the index on (trainer_id, start, end). A trainer's
+appointments never overlap, so ordered by start they are ordered by end too,
+and a new one [start, end) can only clash with its two neighbours: the last
+appointment starting at or before `start` (if it ends after `start`) and the
+first one starting at or after it (if it starts before `end`). Each is one
+index seek, so checking a booking costs O(log n) however long the schedule.
+The check runs after the INSERT, in the same transaction, when the request
+already holds SQLite's write lock: two bookings racing for one slot can't
+both see it free.
+
+An appointment lasts at most MAX_DURATION, so the ones overlapping a window
+[from, to) all start in (from - MAX_DURATION, to): listing them is an index
+range scan on the trainer's schedule. Free slots are the gaps between them;
+the facility finder reads the schedules of all the facility's trainers with
+one query, in (trainer, start) order, and finds every trainer's gaps in a
+single pass over it.
+"""
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_
+from sqlmodel import Session, SQLModel, select
+
+from .models import (
+    Facility,
+    Trainer,
+    TrainingAppointment,
+    TrainingAppointmentCreate,
+    naive_utc,
+)
+from .purge import live
+from .reassign import require
+
+MAX_DURATION = timedelta(minutes=480)
+# Longest from/to window the list and free time routes accept.
+MAX_WINDOW = timedelta(days=31)
+
+
+class Slot(SQLModel):
+    start: datetime
+    end: datetime
+
+
+class TrainerAvailability(SQLModel):
+    trainer_id: int
+    slots: List[Slot] = []
+
+
+class FacilityFreeSlots(SQLModel):
+    facility_id: int
+    trainers: List[TrainerAvailability] = []
+
+
+class TimeWindow:
+    def __init__(
+        self,
+        start: datetime = Query(alias="from", description="Start of the window"),
+        end: datetime = Query(alias="to", description="End of the window"),
+    ):
+        start, end = naive_utc(start), naive_utc(end)
+        if end <= start:
+            raise HTTPException(status_code=400, detail="`to` must be after `from`")
+        if end - start > MAX_WINDOW:
+            raise HTTPException(
+                status_code=400,
+                detail=f"The window can span at most {MAX_WINDOW.days} days",
+            )
+        self.start = start
+        self.end = end
+
+
+def min_minutes_query() -> Any:
+    return Query(default=30, ge=1, le=24 * 60, description="Shortest slot to list")
+
+
+def not_found() -> HTTPException:
+    return HTTPException(status_code=404, detail="TrainingAppointment not found")
+
+
+def _neighbours(
+    session: Session, trainer_id: int, start: datetime, exclude_id: int
+) -> Tuple[Optional[Any], Optional[Any]]:
+    """The trainer's appointments starting last at or before `start` and first
+    at or after it, one index seek each."""
+    columns = TrainingAppointment.__table__.c
+    schedule = select(columns.id, columns.start, columns.end).where(
+        columns.trainer_id == trainer_id, columns.id != exclude_id
+    )
+    before = schedule.where(columns.start <= start).order_by(columns.start.desc())
+    after = schedule.where(columns.start >= start).order_by(columns.start)
+    return (
+        session.execute(before.limit(1)).first(),
+        session.execute(after.limit(1)).first(),
+    )
+
+
+def conflicting_appointment(
+    session: Session, appointment: TrainingAppointment
+) -> Optional[int]:
+    """Id of an appointment of the same trainer overlapping `appointment`."""
+    before, after = _neighbours(
+        session, appointment.trainer_id, appointment.start, appointment.id
+    )
+    if before is not None and before.end > appointment.start:
+        return before.id
+    if after is not None and after.start < appointment.end:
+        return after.id
+    return None
+
+
+def book(session: Session, item: TrainingAppointmentCreate) -> TrainingAppointment:
+    require(session, Trainer, item.trainer_id)
+    appointment = TrainingAppointment(
+        trainer_id=item.trainer_id,
+        start=item.start,
+        end=item.start + timedelta(minutes=item.duration_minutes),
+    )
+    session.add(appointment)
+    # Taking the write lock before looking, see the module docstring.
+    session.flush()
+    conflict = conflicting_appointment(session, appointment)
+    if conflict is not None:
+        session.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "type": "appointment_conflict",
+                "msg": "The trainer is booked at that time",
+                "appointment_id": conflict,
+            },
+        )
+    session.commit()
+    return appointment
+
+
+def get_appointment(session: Session, appointment_id: int) -> TrainingAppointment:
+    appointment = session.get(TrainingAppointment, appointment_id)
+    if appointment is None:
+        raise not_found()
+    return appointment
+
+
+def cancel(session: Session, appointment_id: int) -> TrainingAppointment:
+    appointment = get_appointment(session, appointment_id)
+    session.delete(appointment)
+    session.commit()
+    return appointment
+
+
+def _overlapping(window: TimeWindow):
+    """Condition on the appointments overlapping `window`, as an index range."""
+    columns = TrainingAppointment.__table__.c
+    return and_(
+        columns.start > window.start - MAX_DURATION,
+        columns.start < window.end,
+        columns.end > window.start,
+    )
+
+
+def trainer_appointments(
+    session: Session, trainer_id: int, window: TimeWindow
+) -> List[TrainingAppointment]:
+    require(session, Trainer, trainer_id)
+    statement = (
+        select(TrainingAppointment)
+        .where(TrainingAppointment.trainer_id == trainer_id, _overlapping(window))
+        .order_by(TrainingAppointment.start)
+    )
+    return session.exec(statement).all()
+
+
+def free_slots(
+    busy: Iterable[Tuple[datetime, datetime]],
+    window: TimeWindow,
+    min_length: timedelta,
+) -> List[Slot]:
+    """Gaps of at least `min_length` in `window` between the `busy` intervals,
+    which are in start order and don't overlap."""
+    slots = []
+    free_from = window.start
+    for start, end in busy:
+        if start - free_from >= min_length:
+            slots.append(Slot(start=free_from, end=start))
+        free_from = max(free_from, end)
+    if window.end - free_from >= min_length:
+        slots.append(Slot(start=free_from, end=window.end))
+    return slots
+
+
+def trainer_availability(
+    session: Session, trainer_id: int, window: TimeWindow, min_minutes: int
+) -> TrainerAvailability:
+    busy = [(a.start, a.end) for a in trainer_appointments(session, trainer_id, window)]
+    slots = free_slots(busy, window, timedelta(minutes=min_minutes))
+    return TrainerAvailability(trainer_id=trainer_id, slots=slots)
+
+
+def facility_free_slots(
+    session: Session, facility_id: int, window: TimeWindow, min_minutes: int
+) -> FacilityFreeSlots:
+    require(session, Facility, facility_id)
+    trainers = Trainer.__table__.c
+    columns = TrainingAppointment.__table__.c
+    # Trainers without appointments in the window come back once, with NULLs.
+    statement = (
+        select(trainers.id, columns.start, columns.end)
+        .select_from(Trainer.__table__)
+        .outerjoin(
+            TrainingAppointment.__table__,
+            and_(columns.trainer_id == trainers.id, _overlapping(window)),
+        )
+        .where(trainers.facility_id == facility_id, live(trainers))
+        .order_by(trainers.id, columns.start)
+    )
+    min_length = timedelta(minutes=min_minutes)
+    result = FacilityFreeSlots(facility_id=facility_id)
+    for trainer_id, rows in groupby(session.execute(statement), lambda row: row.id):
+        busy = [(row.start, row.end) for row in rows if row.start is not None]
+        result.trainers.append(
+            TrainerAvailability(
+                trainer_id=trainer_id, slots=free_slots(busy, window, min_length)
+            )
+        )
+    return result
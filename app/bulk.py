@@ -0,0 +1,143 @@
+"""Bulk inserts for the `POST /<entity>/bulk` endpoints.
+
+Items are validated one by one through the entity's `*Create` model, then all
+valid rows are written with a single executemany `INSERT ... RETURNING id` in
+one transaction, so a batch costs one commit instead of one per row.
+"""
+from enum import StrEnum
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel
+
+
+class BulkMode(StrEnum):
+    # Any invalid item rejects the whole batch and nothing is written.
+    ATOMIC = "atomic"
+    # Valid items are written, invalid ones are reported back.
+    BEST_EFFORT = "best_effort"
+
+
+class BulkItemError(SQLModel):
+    index: int
+    errors: List[Dict[str, Any]]
+
+
+class BulkCreated(SQLModel):
+    index: int
+    id: int
+
+
+class BulkCreateResult(SQLModel):
+    created: List[BulkCreated] = []
+    errors: List[BulkItemError] = []
+
+
+@lru_cache(maxsize=None)
+def _table_only_fields(model: Type[SQLModel], create_model: Type[SQLModel]):
+    return [
+        (name, field)
+        for name, field in model.model_fields.items()
+        if name != "id" and name not in create_model.model_fields
+    ]
+
+
+def _to_row(model: Type[SQLModel], create_model: Type[SQLModel], item: Any):
+    # Equivalent to model.model_validate(create_model.model_validate(item))
+    # .model_dump(), without validating every row a second time through the
+    # (much slower) table model.
+    row = create_model.model_validate(item).model_dump()
+    for name, field in _table_only_fields(model, create_model):
+        row[name] = field.get_default(call_default_factory=True)
+    return row
+
+
+def validate_items(
+    model: Type[SQLModel], create_model: Type[SQLModel], items: List[Any]
+):
+    """Validate raw items, returning `(index, row)` pairs and per-item errors."""
+    rows = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            row = _to_row(model, create_model, item)
+        except ValidationError as exc:
+            errors.append(
+                BulkItemError(
+                    index=index,
+                    errors=exc.errors(include_url=False, include_context=False),
+                )
+            )
+            continue
+        rows.append((index, row))
+    return rows, errors
+
+
+def insert_rows(session: Session, model: Type[SQLModel], rows: List[Dict[str, Any]]):
+    """executemany INSERT returning the generated ids in parameter order."""
+    if not rows:
+        return []
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return session.execute(stmt, rows).scalars().all()
+
+
+def insert_one_by_one(session: Session, model: Type[SQLModel], rows):
+    # Fallback when the batch hits a constraint: isolate each row in a
+    # savepoint so one bad row doesn't take the others down with it.
+    created = []
+    errors = []
+    for index, row in rows:
+        try:
+            with session.begin_nested():
+                (new_id,) = insert_rows(session, model, [row])
+        except IntegrityError as exc:
+            errors.append(
+                BulkItemError(index=index, errors=[_integrity_error(exc)])
+            )
+            continue
+        created.append(BulkCreated(index=index, id=new_id))
+    return created, errors
+
+
+def _integrity_error(exc: IntegrityError) -> Dict[str, Any]:
+    return {"type": "integrity_error", "msg": str(exc.orig)}
+
+
+def bulk_create(
+    session: Session,
+    model: Type[SQLModel],
+    create_model: Type[SQLModel],
+    items: List[Any],
+    mode: BulkMode = BulkMode.ATOMIC,
+    max_items: Optional[int] = None,
+) -> BulkCreateResult:
+    if max_items is not None and len(items) > max_items:
+        raise HTTPException(
+            status_code=413, detail=f"At most {max_items} items per bulk request"
+        )
+
+    rows, errors = validate_items(model, create_model, items)
+    if errors and mode == BulkMode.ATOMIC:
+        raise HTTPException(
+            status_code=422, detail=[error.model_dump() for error in errors]
+        )
+
+    try:
+        ids = insert_rows(session, model, [row for _, row in rows])
+        created = [
+            BulkCreated(index=index, id=new_id)
+            for (index, _), new_id in zip(rows, ids)
+        ]
+    except IntegrityError as exc:
+        session.rollback()
+        if mode == BulkMode.ATOMIC:
+            raise HTTPException(status_code=409, detail=_integrity_error(exc))
+        created, insert_errors = insert_one_by_one(session, model, rows)
+        errors = sorted(errors + insert_errors, key=lambda error: error.index)
+
+    session.commit()
+    return BulkCreateResult(created=created, errors=errors)
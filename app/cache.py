@@ -0,0 +1,462 @@
+"""Read-through response cache for the GET routes, with ETags.
+
+`CacheMiddleware` serves GET requests for routes marked with `@cached(Model)`
+from a cache keyed on the path and the (sorted) query string. Every response
+it handles carries a strong `ETag`; a matching `If-None-Match` gets a 304.
+
+Entries are tagged with what they were built from, read off the JSON body:
+
+    owner:5              the owner with id 5 appears in the response
+    manager.owner_id=5   the response lists the managers of owner 5
+    owner                the response is a list of owners (any change to the
+                         owners table can add, drop or reorder items)
+    owner/any            anything from the owners table appears
+
+Writes are tracked through SQLAlchemy session events and the matching tags
+are invalidated once the outermost transaction commits (a SAVEPOINT's go
+with it, or are dropped if it rolls back): a PATCH of trainer 3 moving it
+from facility 1 to 2 drops `trainer:3`, `trainer`, `trainer.facility_id=1`
+and `trainer.facility_id=2`, i.e. trainer 3 itself, the trainer lists and
+both facilities' staff/trainers pages. Set-based UPDATE/DELETE statements
+drop everything tagged with their table.
+
+Writes from outside this process (another worker with the in-memory backend,
+the bulk importer) are not seen; use the shared "redis" backend with several
+workers and `cache_ttl` as a bound for out-of-band writes.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlmodel import SQLModel
+from starlette.routing import Match
+
+from .expand import RELATIONS
+from .settings import Settings, settings
+
+Headers = List[Tuple[bytes, bytes]]
+
+# Response headers that are recomputed, not replayed from the cache.
+_SKIPPED_HEADERS = {b"content-length", b"server-timing", b"etag"}
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: Headers
+    body: bytes
+    etag: str
+    expires: Optional[float] = None
+
+
+def _now() -> float:
+    return time.monotonic()
+
+
+class MemoryBackend:
+    """In-process LRU with a tag -> keys index for invalidation."""
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[CachedResponse, Set[str]]]" = (
+            OrderedDict()
+        )
+        self._tags: Dict[str, Set[str]] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            found = self._entries.get(key)
+            if found is None:
+                return None
+            entry, _ = found
+            if entry.expires is not None and entry.expires <= _now():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedResponse, tags: Set[str], version: int):
+        with self._lock:
+            # Something was invalidated while the response was being built;
+            # it may already be stale.
+            if version != self._version:
+                return
+            if self.ttl:
+                entry.expires = _now() + self.ttl
+            self._remove(key)
+            self._entries[key] = (entry, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            self._version += 1
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        found = self._entries.pop(key, None)
+        if found is None:
+            return
+        for tag in found[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    """Cache shared by every worker, stored in Redis (needs `redis`).
+
+    Each entry is a JSON string under `<prefix>entry:<key>`; each tag is a set
+    of entry keys under `<prefix>tag:<tag>`. The version check in `set` is not
+    atomic with the write, so an entry may outlive an invalidation that races
+    with it by at most `ttl` seconds.
+    """
+
+    def __init__(self, url: str, ttl: float = 0.0, prefix: str = "gym:cache:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def version(self) -> int:
+        return int(self.client.get(f"{self.prefix}version") or 0)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raw = self.client.get(f"{self.prefix}entry:{key}")
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CachedResponse(
+            status=data["status"],
+            headers=[
+                (k.encode("latin-1"), v.encode("latin-1")) for k, v in data["headers"]
+            ],
+            body=data["body"].encode(),
+            etag=data["etag"],
+        )
+
+    def set(self, key: str, entry: CachedResponse, tags: Set[str], version: int):
+        if version != self.version():
+            return
+        data = {
+            "status": entry.status,
+            "headers": [
+                (k.decode("latin-1"), v.decode("latin-1")) for k, v in entry.headers
+            ],
+            "body": entry.body.decode(),
+            "etag": entry.etag,
+        }
+        entry_key = f"{self.prefix}entry:{key}"
+        pipe = self.client.pipeline()
+        pipe.set(entry_key, json.dumps(data), ex=int(self.ttl) or None)
+        for tag in tags:
+            pipe.sadd(f"{self.prefix}tag:{tag}", entry_key)
+        pipe.execute()
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        tag_keys = [f"{self.prefix}tag:{tag}" for tag in tags]
+        pipe = self.client.pipeline()
+        pipe.incr(f"{self.prefix}version")
+        if tag_keys:
+            pipe.sunion(tag_keys)
+        results = pipe.execute()
+        entry_keys = results[1] if tag_keys else set()
+        if entry_keys or tag_keys:
+            self.client.delete(*entry_keys, *tag_keys)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+        self.client.incr(f"{self.prefix}version")
+
+
+def make_backend(settings: Settings):
+    if not settings.cache_backend:
+        return None
+    if settings.cache_backend == "memory":
+        return MemoryBackend(settings.cache_max_entries, settings.cache_ttl)
+    if settings.cache_backend == "redis":
+        return RedisBackend(settings.cache_url, settings.cache_ttl)
+    raise ValueError(f"Unknown cache backend: {settings.cache_backend!r}")
+
+
+backend = make_backend(settings)
+
+
+def set_backend(new_backend) -> None:
+    """Swap the cache backend (None disables caching)."""
+    global backend
+    backend = new_backend
+
+
+def invalidate_table(table: str) -> None:
+    """Drop the cached responses built from any row of `table`; for writes made
+    outside a Session, e.g. by the background workers."""
+    if backend is not None:
+        backend.invalidate({table, f"{table}/any"})
+
+
+def cached(model: Type[SQLModel]):
+    """Mark a GET endpoint whose JSON response is built from `model` rows."""
+
+    def mark(endpoint):
+        endpoint.cache_model = model
+        return endpoint
+
+    return mark
+
+
+def _table(model: Type[SQLModel]) -> str:
+    return model.__tablename__
+
+
+def _row_tags(model: Type[SQLModel], item: Any, tags: Set[str]) -> None:
+    if not isinstance(item, dict):
+        return
+    table = _table(model)
+    tags.add(f"{table}/any")
+    if item.get("id") is not None:
+        tags.add(f"{table}:{item['id']}")
+    for name, relation in RELATIONS.get(model, {}).items():
+        if name not in item:
+            continue
+        if relation.many:
+            target = _table(relation.target)
+            tags.add(f"{target}.{relation.remote_key}={item.get('id')}")
+            tags.add(f"{target}/any")
+            for child in item[name] or ():
+                _row_tags(relation.target, child, tags)
+        else:
+            _row_tags(relation.target, item[name], tags)
+
+
+def response_tags(model: Type[SQLModel], body: Any) -> Set[str]:
+    tags: Set[str] = set()
+    if isinstance(body, list):
+        tags.add(_table(model))
+        tags.add(f"{_table(model)}/any")
+        for item in body:
+            _row_tags(model, item, tags)
+    else:
+        _row_tags(model, body, tags)
+    return tags
+
+
+def _foreign_keys(model: Type[SQLModel]) -> List[str]:
+    return [column.key for column in model.__table__.columns if column.foreign_keys]
+
+
+def _object_tags(obj: Any) -> Set[str]:
+    state = inspect(obj)
+    table = state.mapper.local_table.name
+    tags = {table, f"{table}:{state.identity[0] if state.identity else obj.id}"}
+    for key in _foreign_keys(type(obj)):
+        history = state.attrs[key].history
+        for value in (*history.added, *history.deleted, *history.unchanged):
+            if value is not None:
+                tags.add(f"{table}.{key}={value}")
+    return tags
+
+
+def _current(session: Session):
+    return session.get_nested_transaction() or session.get_transaction()
+
+
+def _pending(session: Session) -> Set[str]:
+    """Tags of the rows changed in the session's innermost transaction; they
+    are invalidated once the outermost one commits, see `_after_commit`."""
+    pending = session.info.setdefault("cache_invalidate", {})
+    return pending.setdefault(_current(session), set())
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    if backend is None:
+        return
+    pending = _pending(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if type(obj) in RELATIONS:
+            pending |= _object_tags(obj)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(orm_execute_state):
+    if backend is None or orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in RELATIONS:
+        return
+    table = mapper.local_table.name
+    pending = _pending(orm_execute_state.session)
+    pending.add(table)
+    if orm_execute_state.is_insert:
+        # New rows: only lists and the collections they join are affected.
+        params = orm_execute_state.parameters or []
+        for row in params if isinstance(params, list) else [params]:
+            for key in _foreign_keys(mapper.class_):
+                if row.get(key) is not None:
+                    pending.add(f"{table}.{key}={row[key]}")
+    else:
+        # UPDATE/DELETE ... WHERE: which rows changed isn't known here.
+        pending.add(f"{table}/any")
+
+
+# These also fire for a SAVEPOINT (e.g. app/writes.py, app/bulk.py): a
+# released one hands its tags to the enclosing transaction, and nothing is
+# invalidated before the rows are committed for every reader to see.
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    pending = session.info.get("cache_invalidate", {})
+    transaction = _current(session)
+    tags = pending.pop(transaction, None)
+    if not tags:
+        return
+    if transaction.nested:
+        pending.setdefault(transaction.parent, set()).update(tags)
+    elif backend is not None:
+        backend.invalidate(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.get("cache_invalidate", {}).pop(_current(session), None)
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _after_transaction_create(session, transaction):
+    # do_orm_execute can run before the session has begun its transaction.
+    pending = session.info.get("cache_invalidate", {})
+    if transaction.parent is None and None in pending:
+        pending[transaction] = pending.pop(None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    session.info.get("cache_invalidate", {}).pop(transaction, None)
+
+
+def cache_key(scope) -> str:
+    query = parse_qsl(scope.get("query_string", b"").decode(), keep_blank_values=True)
+    return f"{scope['path']}?{urlencode(sorted(query))}"
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses the weak comparison.
+    return "*" in candidates or etag in [tag.removeprefix("W/") for tag in candidates]
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _cached_route(scope):
+    for route in scope["app"].router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            model = getattr(getattr(route, "endpoint", None), "cache_model", None)
+            return (route, model) if model is not None else (None, None)
+    return None, None
+
+
+class CacheMiddleware:
+    """Pure ASGI middleware; a no-op while no backend is configured."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        cache = backend
+        if cache is None or scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        route, model = _cached_route(scope)
+        if model is None:
+            return await self.app(scope, receive, send)
+
+        key = cache_key(scope)
+        if_none_match = _header(scope, b"if-none-match")
+        entry = cache.get(key)
+        if entry is not None:
+            # Routing is skipped; let the metrics label the hit with the route.
+            scope["route"] = route
+            return await self._send(send, entry, if_none_match, b"HIT")
+
+        version = cache.version()
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        headers = [
+            (k, v) for k, v in start.get("headers", []) if k not in _SKIPPED_HEADERS
+        ]
+        entry = CachedResponse(start["status"], headers, body, make_etag(body))
+        if entry.status == 200:
+            tags = response_tags(model, json.loads(body))
+            cache.set(key, entry, tags, version)
+        await self._send(send, entry, if_none_match, b"MISS")
+
+    async def _send(self, send, entry: CachedResponse, if_none_match, cache_status):
+        headers = list(entry.headers)
+        if entry.status == 200:
+            headers += [(b"etag", entry.etag.encode()), (b"x-cache", cache_status)]
+            if etag_matches(if_none_match, entry.etag):
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 304,
+                        "headers": [(k, v) for k, v in headers if k != b"content-type"],
+                    }
+                )
+                await send({"type": "http.response.body", "body": b""})
+                return
+        headers.append((b"content-length", str(len(entry.body)).encode()))
+        await send(
+            {"type": "http.response.start", "status": entry.status, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": entry.body})
@@ -0,0 +1,770 @@
+"""CRUD routes generated from a `Resource` spec, for the sync and async apps.
+
+For each entity in `RESOURCES` the factories below register:
+
+    POST   /<path>/                      create
+    POST   /<path>/bulk                  see app/bulk.py
+    POST   /<path>/lookup                multi-get, see app/multiget.py
+    GET    /<path>/export                see app/export.py
+    GET    /<path>/search                see app/search.py, if `searchable`
+    GET    /<path>/                      keyset-paginated list, ?expand=, ?fields=,
+                                         filters; ?ids= for a multi-get
+    GET    /<path>/{<name>_id}           get by id, ?expand=, ?fields=
+    GET    /<path>/{<name>_id}/<rel>/    the row with some relations included
+    PATCH  /<path>/{<name>_id}           partial update
+    DELETE /<path>/{<name>_id}           soft with `soft_delete`, see app/purge.py
+
+All handlers share one code path per operation. Rows are fetched by id with a
+`SELECT ... WHERE id = :id` built once per model, so a request neither
+constructs a statement nor goes through `session.get`'s identity-map and
+loader-option handling; SQLAlchemy finds the compiled SQL in its cache straight
+away. Responses are rendered straight from the rows by app/serializers.py,
+instead of FastAPI's model_dump/validate/jsonable_encoder/json.dumps round
+trip. `response_model` is still declared on every route, so the OpenAPI
+schema doesn't change.
+Writes serialize the row after a flush and before the commit, which saves the
+`refresh()` SELECT the hand-written handlers did. With `write_coalescing`,
+creates and updates are committed in groups by app/writes.py.
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Type
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Request, Response
+from sqlalchemy import bindparam, inspect
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import writes
+from .bulk import BulkCreateResult, BulkMode, bulk_create
+from .cache import cached
+from .expand import (
+    READ_MODELS,
+    expand_query,
+    expanded_list_response,
+    expanded_response,
+    json_response,
+    parse_expand,
+)
+from .export import ExportFormat, aexport_response, export_response
+from .fields import (
+    columns_by_id_statement,
+    columns_statement,
+    fields_query,
+    parse_fields,
+    selected_columns,
+    sparse_model,
+)
+from .filters import FacilityFilters, NoFilters
+from .models import (
+    EmailStatus,
+    Facility,
+    FacilityCreate,
+    FacilityReadWithManager,
+    FacilityReadWithOwner,
+    FacilityReadWithStaffAndTrainers,
+    FacilityUpdate,
+    Manager,
+    ManagerCreate,
+    ManagerReadWithOwner,
+    ManagerUpdate,
+    Owner,
+    OwnerCreate,
+    OwnerReadWithManagers,
+    OwnerUpdate,
+    Staff,
+    StaffCreate,
+    StaffReadWithFacility,
+    StaffReadWithManager,
+    StaffReadWithOwner,
+    StaffUpdate,
+    Trainer,
+    TrainerCreate,
+    TrainerReadWithFacility,
+    TrainerReadWithManager,
+    TrainerReadWithOwner,
+    TrainerUpdate,
+)
+from .multiget import ids_body, ids_query, multi_get, parse_ids, unique_ids
+from .mx import averify_email_domain, verification_deferred
+from .pagination import (
+    KeysetParams,
+    PageParams,
+    SortKey,
+    page_statement,
+    paginate,
+    set_next_cursor,
+)
+from .purge import live
+from .reassign import Assignment, assign_from_update
+from .search import SearchParams, search
+from .serializers import dump_json
+from .settings import settings
+
+
+@dataclass(frozen=True)
+class RelationRoute:
+    # Appended to the item path, e.g. "owner/" for /trainers/{trainer_id}/owner/.
+    path: str
+    response_model: Type[SQLModel]
+    relations: FrozenSet[str]
+
+
+@dataclass(frozen=True)
+class Resource:
+    model: Type[SQLModel]
+    create_model: Type[SQLModel]
+    update_model: Type[SQLModel]
+    path: str
+    # Response model of GET /<path>/{id}, which always includes these relations.
+    detail_model: Optional[Type[SQLModel]] = None
+    detail_relations: FrozenSet[str] = frozenset()
+    relation_routes: Tuple[RelationRoute, ...] = ()
+    # Resolve the email domains of new rows before validation (async only).
+    warm_email_domain: bool = False
+    # Has a full-text index, see app/search.py.
+    searchable: bool = False
+    # Query parameters filtering the list and export, see app/filters.py.
+    filters: Type = NoFilters
+    # *Update fields that reassign other rows to this one, see app/reassign.py.
+    assignments: Tuple[Assignment, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return self.model.__tablename__
+
+    @property
+    def id_param(self) -> str:
+        return f"{self.name}_id"
+
+    @property
+    def read_model(self) -> Type[SQLModel]:
+        return READ_MODELS[self.model]
+
+
+def _relation_route(path: str, response_model: Type[SQLModel], *relations: str):
+    return RelationRoute(path, response_model, frozenset(relations))
+
+
+RESOURCES = [
+    Resource(
+        Manager,
+        ManagerCreate,
+        ManagerUpdate,
+        "managers",
+        detail_model=ManagerReadWithOwner,
+        detail_relations=frozenset({"owner"}),
+        warm_email_domain=True,
+        assignments=(
+            Assignment("trainer_ids", Trainer, "manager_id"),
+            Assignment("staff_ids", Staff, "manager_id"),
+        ),
+    ),
+    Resource(
+        Owner,
+        OwnerCreate,
+        OwnerUpdate,
+        "owners",
+        detail_model=OwnerReadWithManagers,
+        detail_relations=frozenset({"managers"}),
+        warm_email_domain=True,
+    ),
+    Resource(
+        Facility,
+        FacilityCreate,
+        FacilityUpdate,
+        "facilities",
+        relation_routes=(
+            _relation_route("owner/", FacilityReadWithOwner, "owner"),
+            _relation_route("manager/", FacilityReadWithManager, "manager"),
+            _relation_route(
+                "staff/trainers/", FacilityReadWithStaffAndTrainers, "staff", "trainers"
+            ),
+        ),
+        filters=FacilityFilters,
+    ),
+    Resource(
+        Trainer,
+        TrainerCreate,
+        TrainerUpdate,
+        "trainers",
+        relation_routes=(
+            _relation_route("owner/", TrainerReadWithOwner, "owner"),
+            _relation_route("manager/", TrainerReadWithManager, "manager"),
+            _relation_route("facility/", TrainerReadWithFacility, "facility"),
+        ),
+        searchable=True,
+    ),
+    Resource(
+        Staff,
+        StaffCreate,
+        StaffUpdate,
+        "staff",
+        relation_routes=(
+            _relation_route("owner/", StaffReadWithOwner, "owner"),
+            _relation_route("manager/", StaffReadWithManager, "manager"),
+            _relation_route("facility/", StaffReadWithFacility, "facility"),
+        ),
+        searchable=True,
+    ),
+]
+
+
+@lru_cache(maxsize=None)
+def by_id_statement(model: Type[SQLModel]):
+    return select(model).where(model.id == bindparam("id"), live(model))
+
+
+@lru_cache(maxsize=None)
+def all_statement(model: Type[SQLModel]):
+    return select(model).where(live(model))
+
+
+def list_statement(
+    model: Type[SQLModel],
+    fields: FrozenSet[str],
+    expand: FrozenSet[str],
+    order_by: SortKey = SortKey.ID,
+):
+    """SELECT of whole rows, or of the columns behind `?fields=` (see fields.py)."""
+    if not fields:
+        return all_statement(model)
+    return columns_statement(model, selected_columns(model, fields, expand, order_by))
+
+
+def get_statement(
+    model: Type[SQLModel], fields: FrozenSet[str], expand: FrozenSet[str]
+):
+    if not fields:
+        return by_id_statement(model)
+    return columns_by_id_statement(model, selected_columns(model, fields, expand))
+
+
+def sparse_base(
+    model: Type[SQLModel], fields: FrozenSet[str]
+) -> Optional[Type[SQLModel]]:
+    return sparse_model(model, fields) if fields else None
+
+
+def serialize(
+    response_model: Any, content: Any, response: Optional[Response] = None
+) -> Response:
+    return json_response(dump_json(response_model, content), response)
+
+
+def not_found(model: Type[SQLModel]) -> HTTPException:
+    return HTTPException(status_code=404, detail=f"{model.__name__} not found")
+
+
+def get_or_404(
+    session: Session, model: Type[SQLModel], obj_id: int, statement: Any = None
+):
+    statement = by_id_statement(model) if statement is None else statement
+    obj = session.exec(statement, params={"id": obj_id}).first()
+    if obj is None:
+        raise not_found(model)
+    return obj
+
+
+async def aget_or_404(
+    session: AsyncSession, model: Type[SQLModel], obj_id: int, statement: Any = None
+):
+    statement = by_id_statement(model) if statement is None else statement
+    result = await session.exec(statement, params={"id": obj_id})
+    obj = result.first()
+    if obj is None:
+        raise not_found(model)
+    return obj
+
+
+def apply_update(obj: SQLModel, update: SQLModel) -> None:
+    # Only columns are assigned; other fields of the *Update models (such as
+    # ManagerUpdate.trainer_ids) are `Resource.assignments`.
+    fields = type(obj).model_fields
+    for key, value in update.model_dump(exclude_unset=True).items():
+        if key in fields:
+            setattr(obj, key, value)
+    # A new email is verified again, see app/verification.py.
+    if "email_status" in fields and verification_deferred():
+        if inspect(obj).attrs.email.history.added:
+            obj.email_status = EmailStatus.PENDING
+
+
+def insert_row(session: Session, resource: Resource, item: SQLModel) -> Response:
+    obj = resource.model.model_validate(item)
+    session.add(obj)
+    session.flush()
+    return serialize(resource.read_model, obj)
+
+
+def update_row(
+    session: Session, resource: Resource, obj_id: int, item: SQLModel
+) -> Response:
+    obj = get_or_404(session, resource.model, obj_id)
+    apply_update(obj, item)
+    session.flush()
+    content = serialize(resource.read_model, obj)
+    if resource.assignments:
+        assign_from_update(session, resource.assignments, obj.id, item, content)
+    return content
+
+
+async def warm_email_domain(request: Request):
+    # Route dependencies are solved before the request body is validated, so
+    # resolving the email domains here without blocking fills the MX cache
+    # that the *Create validators then read from.
+    if verification_deferred():
+        return
+    try:
+        body = await request.json()
+    except ValueError:
+        return
+    items = body if isinstance(body, list) else [body]
+    emails = {
+        item["email"]
+        for item in items
+        if isinstance(item, dict) and isinstance(item.get("email"), str)
+    }
+    # Errors are left to the validators, which report them per field.
+    await asyncio.gather(
+        *(averify_email_domain(email) for email in emails), return_exceptions=True
+    )
+
+
+def _id_param(resource: Resource) -> Any:
+    return Path(alias=resource.id_param)
+
+
+def _bulk_body(resource: Resource) -> Any:
+    return Body(
+        title=resource.path.title(),
+        description=f"Array of {resource.create_model.__name__} objects",
+    )
+
+
+def _add_routes(
+    router: APIRouter,
+    resource: Resource,
+    handlers: Dict[str, Callable],
+    relation_handlers: List[Callable],
+    create_dependencies: List[Any],
+) -> None:
+    model, name, path = resource.model, resource.name, resource.path
+    read_model = resource.read_model
+    item_path = f"/{path}/{{{resource.id_param}}}"
+
+    def add(route_path, endpoint, method, route_name, cache=False, **kwargs):
+        if cache:
+            endpoint = cached(model)(endpoint)
+        router.add_api_route(
+            route_path, endpoint, methods=[method], name=route_name, **kwargs
+        )
+
+    add(
+        f"/{path}/",
+        handlers["create"],
+        "POST",
+        f"create_{name}",
+        response_model=read_model,
+        dependencies=create_dependencies,
+    )
+    add(
+        f"/{path}/bulk",
+        handlers["bulk"],
+        "POST",
+        f"create_{path}_bulk",
+        response_model=BulkCreateResult,
+        dependencies=create_dependencies,
+    )
+    add(
+        f"/{path}/lookup",
+        handlers["lookup"],
+        "POST",
+        f"lookup_{path}",
+        response_model=List[read_model],
+    )
+    add(f"/{path}/export", handlers["export"], "GET", f"export_{path}")
+    if resource.searchable:
+        # Before the item routes, or /{id} would take "search" for an id.
+        add(
+            f"/{path}/search",
+            handlers["search"],
+            "GET",
+            f"search_{path}",
+            cache=True,
+            response_model=List[read_model],
+        )
+    add(
+        f"/{path}/",
+        handlers["list"],
+        "GET",
+        f"list_{path}",
+        cache=True,
+        response_model=List[read_model],
+    )
+    add(
+        item_path,
+        handlers["get"],
+        "GET",
+        f"get_{name}",
+        cache=True,
+        response_model=resource.detail_model or read_model,
+    )
+    for route, handler in zip(resource.relation_routes, relation_handlers):
+        add(
+            f"{item_path}/{route.path}",
+            handler,
+            "GET",
+            f"get_{name}_with_{'_and_'.join(sorted(route.relations))}",
+            cache=True,
+            response_model=route.response_model,
+        )
+    for method, action in (("PATCH", "update"), ("DELETE", "delete")):
+        add(
+            item_path,
+            handlers[action],
+            method,
+            f"{action}_{name}",
+            response_model=read_model,
+        )
+
+
+def crud_router(resource: Resource, get_session: Callable) -> APIRouter:
+    """Sync routes for `resource`, on sessions from `get_session`."""
+    model, create_model = resource.model, resource.create_model
+    update_model, read_model = resource.update_model, resource.read_model
+    list_model = List[read_model]
+    filter_params = resource.filters
+
+    def create(*, session: Session = Depends(get_session), item: create_model):
+        return writes.write(session, insert_row, resource, item)
+
+    def bulk(
+        *,
+        session: Session = Depends(get_session),
+        items: List[Dict[str, Any]] = _bulk_body(resource),
+        mode: BulkMode = BulkMode.ATOMIC,
+    ):
+        return bulk_create(
+            session, model, create_model, items, mode, settings.bulk_max_items
+        )
+
+    def export(
+        *,
+        session: Session = Depends(get_session),
+        page: KeysetParams = Depends(),
+        filters: filter_params = Depends(),
+        format: ExportFormat = ExportFormat.NDJSON,
+    ):
+        return export_response(
+            session,
+            model,
+            read_model,
+            page,
+            format,
+            settings.export_batch_size,
+            filters,
+        )
+
+    def list_rows(
+        *,
+        session: Session = Depends(get_session),
+        response: Response,
+        page: PageParams = Depends(),
+        filters: filter_params = Depends(),
+        expand: Optional[str] = expand_query(),
+        fields: Optional[str] = fields_query(),
+        ids: Optional[str] = ids_query(),
+    ):
+        names = parse_expand(model, expand)
+        only = parse_fields(model, fields)
+        statement = list_statement(model, only, names, page.order_by)
+        statement = filters.apply(statement, model)
+        if ids is not None:
+            unique = unique_ids(parse_ids(ids), settings.multi_get_max_ids)
+            rows = multi_get(session, statement, model, unique, response)
+        else:
+            rows = paginate(session, statement, model, page, response)
+        return render_list(session, rows, names, only, response)
+
+    def lookup(
+        *,
+        session: Session = Depends(get_session),
+        response: Response,
+        ids: List[int] = ids_body(),
+        expand: Optional[str] = expand_query(),
+        fields: Optional[str] = fields_query(),
+    ):
+        names = parse_expand(model, expand)
+        only = parse_fields(model, fields)
+        statement = list_statement(model, only, names)
+        unique = unique_ids(ids, settings.multi_get_max_ids)
+        rows = multi_get(session, statement, model, unique, response)
+        return render_list(session, rows, names, only, response)
+
+    def render_list(session, rows, names, only, response):
+        base = sparse_base(model, only)
+        if names:
+            return expanded_list_response(
+                session, model, rows, names, response, base
+            )
+        return serialize(List[base] if base else list_model, rows, response)
+
+    def search_rows(
+        *,
+        session: Session = Depends(get_session),
+        response: Response,
+        params: SearchParams = Depends(),
+    ):
+        rows = search(session, model, params, response)
+        return serialize(list_model, rows, response)
+
+    def get(
+        *,
+        session: Session = Depends(get_session),
+        obj_id: int = _id_param(resource),
+        expand: Optional[str] = expand_query(),
+        fields: Optional[str] = fields_query(),
+    ):
+        names = parse_expand(model, expand) | resource.detail_relations
+        only = parse_fields(model, fields)
+        obj = get_or_404(session, model, obj_id, get_statement(model, only, names))
+        base = sparse_base(model, only)
+        if names:
+            return expanded_response(session, model, obj, names, base)
+        return serialize(base or read_model, obj)
+
+    def relation_handler(route: RelationRoute):
+        def get_with_relations(
+            *,
+            session: Session = Depends(get_session),
+            obj_id: int = _id_param(resource),
+        ):
+            obj = get_or_404(session, model, obj_id)
+            return expanded_response(session, model, obj, route.relations)
+
+        return get_with_relations
+
+    def update(
+        *,
+        session: Session = Depends(get_session),
+        obj_id: int = _id_param(resource),
+        item: update_model,
+    ):
+        return writes.write(session, update_row, resource, obj_id, item)
+
+    def delete(
+        *, session: Session = Depends(get_session), obj_id: int = _id_param(resource)
+    ):
+        obj = get_or_404(session, model, obj_id)
+        content = serialize(read_model, obj)
+        if settings.soft_delete:
+            obj.deleted_at = datetime.now()
+        else:
+            session.delete(obj)
+        session.commit()
+        return content
+
+    router = APIRouter()
+    handlers = {
+        "create": create,
+        "bulk": bulk,
+        "lookup": lookup,
+        "export": export,
+        "list": list_rows,
+        "search": search_rows,
+        "get": get,
+        "update": update,
+        "delete": delete,
+    }
+    relation_handlers = [relation_handler(r) for r in resource.relation_routes]
+    _add_routes(router, resource, handlers, relation_handlers, [])
+    return router
+
+
+def async_crud_router(resource: Resource, get_session: Callable) -> APIRouter:
+    """Async routes for `resource`; the ORM work that has no async API (bulk
+    inserts, expansion) runs through `AsyncSession.run_sync`."""
+    model, create_model = resource.model, resource.create_model
+    update_model, read_model = resource.update_model, resource.read_model
+    list_model = List[read_model]
+    filter_params = resource.filters
+
+    async def create(
+        *, session: AsyncSession = Depends(get_session), item: create_model
+    ):
+        if writes.coalescer is not None:
+            return await writes.coalescer.arun(insert_row, resource, item)
+        obj = model.model_validate(item)
+        session.add(obj)
+        await session.flush()
+        content = serialize(read_model, obj)
+        await session.commit()
+        return content
+
+    async def bulk(
+        *,
+        session: AsyncSession = Depends(get_session),
+        items: List[Dict[str, Any]] = _bulk_body(resource),
+        mode: BulkMode = BulkMode.ATOMIC,
+    ):
+        return await session.run_sync(
+            bulk_create, model, create_model, items, mode, settings.bulk_max_items
+        )
+
+    async def export(
+        *,
+        session: AsyncSession = Depends(get_session),
+        page: KeysetParams = Depends(),
+        filters: filter_params = Depends(),
+        format: ExportFormat = ExportFormat.NDJSON,
+    ):
+        return aexport_response(
+            session,
+            model,
+            read_model,
+            page,
+            format,
+            settings.export_batch_size,
+            filters,
+        )
+
+    async def list_rows(
+        *,
+        session: AsyncSession = Depends(get_session),
+        response: Response,
+        page: PageParams = Depends(),
+        filters: filter_params = Depends(),
+        expand: Optional[str] = expand_query(),
+        fields: Optional[str] = fields_query(),
+        ids: Optional[str] = ids_query(),
+    ):
+        names = parse_expand(model, expand)
+        only = parse_fields(model, fields)
+        statement = list_statement(model, only, names, page.order_by)
+        statement = filters.apply(statement, model)
+        if ids is not None:
+            unique = unique_ids(parse_ids(ids), settings.multi_get_max_ids)
+            rows = await session.run_sync(
+                multi_get, statement, model, unique, response
+            )
+        else:
+            statement = page_statement(statement, model, page)
+            rows = (await session.exec(statement)).all()
+            set_next_cursor(response, rows, page)
+        return await render_list(session, rows, names, only, response)
+
+    async def lookup(
+        *,
+        session: AsyncSession = Depends(get_session),
+        response: Response,
+        ids: List[int] = ids_body(),
+        expand: Optional[str] = expand_query(),
+        fields: Optional[str] = fields_query(),
+    ):
+        names = parse_expand(model, expand)
+        only = parse_fields(model, fields)
+        statement = list_statement(model, only, names)
+        unique = unique_ids(ids, settings.multi_get_max_ids)
+        rows = await session.run_sync(multi_get, statement, model, unique, response)
+        return await render_list(session, rows, names, only, response)
+
+    async def render_list(session, rows, names, only, response):
+        base = sparse_base(model, only)
+        if names:
+            return await session.run_sync(
+                expanded_list_response, model, rows, names, response, base
+            )
+        return serialize(List[base] if base else list_model, rows, response)
+
+    async def search_rows(
+        *,
+        session: AsyncSession = Depends(get_session),
+        response: Response,
+        params: SearchParams = Depends(),
+    ):
+        rows = await session.run_sync(search, model, params, response)
+        return serialize(list_model, rows, response)
+
+    async def get(
+        *,
+        session: AsyncSession = Depends(get_session),
+        obj_id: int = _id_param(resource),
+        expand: Optional[str] = expand_query(),
+        fields: Optional[str] = fields_query(),
+    ):
+        names = parse_expand(model, expand) | resource.detail_relations
+        only = parse_fields(model, fields)
+        statement = get_statement(model, only, names)
+        obj = await aget_or_404(session, model, obj_id, statement)
+        base = sparse_base(model, only)
+        if names:
+            return await session.run_sync(
+                expanded_response, model, obj, names, base
+            )
+        return serialize(base or read_model, obj)
+
+    def relation_handler(route: RelationRoute):
+        async def get_with_relations(
+            *,
+            session: AsyncSession = Depends(get_session),
+            obj_id: int = _id_param(resource),
+        ):
+            obj = await aget_or_404(session, model, obj_id)
+            return await session.run_sync(
+                expanded_response, model, obj, route.relations
+            )
+
+        return get_with_relations
+
+    async def update(
+        *,
+        session: AsyncSession = Depends(get_session),
+        obj_id: int = _id_param(resource),
+        item: update_model,
+    ):
+        if writes.coalescer is not None:
+            return await writes.coalescer.arun(update_row, resource, obj_id, item)
+        obj = await aget_or_404(session, model, obj_id)
+        apply_update(obj, item)
+        await session.flush()
+        content = serialize(read_model, obj)
+        if resource.assignments:
+            await session.run_sync(
+                assign_from_update, resource.assignments, obj.id, item, content
+            )
+        await session.commit()
+        return content
+
+    async def delete(
+        *,
+        session: AsyncSession = Depends(get_session),
+        obj_id: int = _id_param(resource),
+    ):
+        obj = await aget_or_404(session, model, obj_id)
+        content = serialize(read_model, obj)
+        if settings.soft_delete:
+            obj.deleted_at = datetime.now()
+        else:
+            await session.delete(obj)
+        await session.commit()
+        return content
+
+    router = APIRouter()
+    handlers = {
+        "create": create,
+        "bulk": bulk,
+        "lookup": lookup,
+        "export": export,
+        "list": list_rows,
+        "search": search_rows,
+        "get": get,
+        "update": update,
+        "delete": delete,
+    }
+    relation_handlers = [relation_handler(r) for r in resource.relation_routes]
+    dependencies = [Depends(warm_email_domain)] if resource.warm_email_domain else []
+    _add_routes(router, resource, handlers, relation_handlers, dependencies)
+    return router
@@ -0,0 +1,277 @@
+"""Per-owner rollups for `GET /owners/{owner_id}/dashboard`.
+
+Counts are kept in three summary tables that SQLite triggers on manager,
+facility, trainer and staff update on every INSERT, DELETE and UPDATE of a
+counted column, whether the write comes from the ORM, a bulk executemany or
+the importer:
+
+    owner_stats         owner_id -> facilities, managers, trainers, staff
+    facility_stats      facility_id -> trainers, staff
+    owner_hiring_stats  (owner_id, month of employment_date) -> trainers, staff
+
+so the dashboard reads a handful of rows however many trainers and staff an
+owner has, instead of loading the relationships: one for the totals, one per
+month of the hiring trend and one per facility for the breakdown. Trainers
+and staff count towards the owner in their own `owner_id`. A trigger adds to
+the row of the new values and subtracts from the row of the old ones, within
+the writing transaction. The tables are created with the schema (and by
+migration 3 for older databases); should they ever drift, recompute them
+from scratch with
+
+    python -m app.dashboard rebuild
+"""
+import argparse
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlmodel import SQLModel
+
+SUMMARY_TABLES = {
+    "owner_stats": (
+        "CREATE TABLE IF NOT EXISTS owner_stats ("
+        "owner_id INTEGER PRIMARY KEY, "
+        "facilities INTEGER NOT NULL DEFAULT 0, "
+        "managers INTEGER NOT NULL DEFAULT 0, "
+        "trainers INTEGER NOT NULL DEFAULT 0, "
+        "staff INTEGER NOT NULL DEFAULT 0)"
+    ),
+    "facility_stats": (
+        "CREATE TABLE IF NOT EXISTS facility_stats ("
+        "facility_id INTEGER PRIMARY KEY, "
+        "trainers INTEGER NOT NULL DEFAULT 0, "
+        "staff INTEGER NOT NULL DEFAULT 0)"
+    ),
+    "owner_hiring_stats": (
+        "CREATE TABLE IF NOT EXISTS owner_hiring_stats ("
+        "owner_id INTEGER NOT NULL, "
+        "month TEXT NOT NULL, "
+        "trainers INTEGER NOT NULL DEFAULT 0, "
+        "staff INTEGER NOT NULL DEFAULT 0, "
+        "PRIMARY KEY (owner_id, month))"
+    ),
+}
+
+MONTH = "strftime('%Y-%m', {row}.employment_date)"
+
+
+def _summaries(table: str, row: str):
+    """(summary table, key columns, key expressions over `row`) counting `table`."""
+    summaries = [("owner_stats", ["owner_id"], [f"{row}.owner_id"])]
+    if table in ("trainer", "staff"):
+        summaries.append(("facility_stats", ["facility_id"], [f"{row}.facility_id"]))
+        summaries.append(
+            (
+                "owner_hiring_stats",
+                ["owner_id", "month"],
+                [f"{row}.owner_id", MONTH.format(row=row)],
+            )
+        )
+    return summaries
+
+
+def _not_null(values: List[str]) -> str:
+    return " AND ".join(f"{value} IS NOT NULL" for value in values)
+
+
+def _counted(row: str, values: List[str], soft_delete: bool) -> str:
+    # Soft-deleted rows (app/purge.py) no longer count.
+    if not soft_delete:
+        return _not_null(values)
+    return f"{_not_null(values)} AND {row}.deleted_at IS NULL"
+
+
+def _add(
+    table: str, column: str, row: str, delta: str, soft_delete: bool
+) -> List[str]:
+    """Upserts adding `delta` to `column` of every summary row `row` counts in."""
+    return [
+        f"INSERT INTO {summary} ({', '.join(keys)}, {column}) "
+        f"SELECT {', '.join(values)}, {delta} "
+        f"WHERE {_counted(row, values, soft_delete)} "
+        f"ON CONFLICT ({', '.join(keys)}) "
+        f"DO UPDATE SET {column} = {column} + excluded.{column};"
+        for summary, keys, values in _summaries(table, row)
+    ]
+
+
+# Source table -> (summary column, columns whose change moves the row).
+# With soft delete, stamping `deleted_at` moves it too.
+COUNTED = {
+    "facility": ("facilities", ["owner_id"]),
+    "manager": ("managers", ["owner_id"]),
+    "trainer": ("trainers", ["owner_id", "facility_id", "employment_date"]),
+    "staff": ("staff", ["owner_id", "facility_id", "employment_date"]),
+}
+
+
+def trigger_names() -> List[str]:
+    return [
+        f"{table}_stats_{event_name}"
+        for table in COUNTED
+        for event_name in ("insert", "delete", "update")
+    ]
+
+
+def trigger_ddl(soft_delete: bool = True) -> List[str]:
+    """The triggers; without `soft_delete`, as they were before the tables had
+    a `deleted_at` column (for migration 3)."""
+    ddl = []
+    for table, (column, moved_by) in COUNTED.items():
+        if soft_delete:
+            moved_by = moved_by + ["deleted_at"]
+
+        def add(row, delta):
+            return _add(table, column, row, delta, soft_delete)
+
+        bodies = {
+            "insert": (f"AFTER INSERT ON {table}", add("new", "1")),
+            "delete": (f"AFTER DELETE ON {table}", add("old", "-1")),
+            "update": (
+                f"AFTER UPDATE OF {', '.join(moved_by)} ON {table}",
+                add("old", "-1") + add("new", "1"),
+            ),
+        }
+        for event_name, (when, statements) in bodies.items():
+            ddl.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_stats_{event_name} {when} "
+                f"BEGIN {' '.join(statements)} END"
+            )
+    return ddl
+
+
+def install(conn: Connection, soft_delete: bool = True) -> None:
+    """Create the summary tables and their triggers unless they exist."""
+    for ddl in list(SUMMARY_TABLES.values()) + trigger_ddl(soft_delete):
+        conn.exec_driver_sql(ddl)
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def _install_after_create(target, connection, tables=(), **kw):
+    # Only along with new source tables: the migrations install the triggers
+    # matching the columns of an older database.
+    if set(COUNTED) <= {table.name for table in tables}:
+        install(connection)
+
+
+def rebuild(conn: Connection, soft_delete: bool = True) -> None:
+    """Recompute every summary table from the source tables."""
+    for table in SUMMARY_TABLES:
+        conn.exec_driver_sql(f"DELETE FROM {table}")
+    for table, (column, _) in COUNTED.items():
+        for summary, keys, values in _summaries(table, table):
+            counted = _counted(table, values, soft_delete)
+            conn.exec_driver_sql(
+                f"INSERT INTO {summary} ({', '.join(keys)}, {column}) "
+                f"SELECT {', '.join(values)}, count(*) FROM {table} "
+                f"WHERE {counted} GROUP BY {', '.join(values)} "
+                f"ON CONFLICT ({', '.join(keys)}) "
+                f"DO UPDATE SET {column} = excluded.{column}"
+            )
+
+
+class FacilityCounts(SQLModel):
+    facility_id: int
+    name: str
+    trainers: int = 0
+    staff: int = 0
+
+
+class HiringMonth(SQLModel):
+    month: str
+    trainers: int = 0
+    staff: int = 0
+
+
+class OwnerDashboard(SQLModel):
+    owner_id: int
+    facilities: int = 0
+    managers: int = 0
+    trainers: int = 0
+    staff: int = 0
+    by_facility: List[FacilityCounts] = []
+    hiring: List[HiringMonth] = []
+
+
+def calendar_months(last: date, count: int) -> List[str]:
+    """The `count` months up to and including the month of `last`, as YYYY-MM."""
+    end = last.year * 12 + last.month - 1
+    return [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in range(end - count + 1, end + 1)]
+
+
+def owner_dashboard(
+    conn: Connection,
+    owner_id: int,
+    months: int = 12,
+    until: Optional[date] = None,
+) -> Optional[OwnerDashboard]:
+    """The owner's rollups, or None when there is no such owner; the hiring
+    trend covers `months` calendar months up to `until` (default today)."""
+    owner = conn.execute(
+        text("SELECT 1 FROM owner WHERE id = :id AND deleted_at IS NULL"),
+        {"id": owner_id},
+    )
+    if owner.first() is None:
+        return None
+    totals = conn.execute(
+        text(
+            "SELECT facilities, managers, trainers, staff FROM owner_stats "
+            "WHERE owner_id = :id"
+        ),
+        {"id": owner_id},
+    ).first()
+    # Facilities belong to the owner through facility.owner_id; those with
+    # nobody assigned have no facility_stats row yet. Unlike the rest, this
+    # is one row per facility (an ix_facility_owner_id range and a primary
+    # key lookup each), as many as the response lists.
+    by_facility = conn.execute(
+        text(
+            "SELECT f.id AS facility_id, f.name, "
+            "coalesce(s.trainers, 0) AS trainers, coalesce(s.staff, 0) AS staff "
+            "FROM facility AS f LEFT JOIN facility_stats AS s "
+            "ON s.facility_id = f.id "
+            "WHERE f.owner_id = :id AND f.deleted_at IS NULL ORDER BY f.id"
+        ),
+        {"id": owner_id},
+    ).all()
+    trend = calendar_months(until or date.today(), months)
+    hired = conn.execute(
+        text(
+            "SELECT month, trainers, staff FROM owner_hiring_stats "
+            "WHERE owner_id = :id AND month BETWEEN :first AND :last"
+        ),
+        {"id": owner_id, "first": trend[0], "last": trend[-1]},
+    )
+    by_month = {row.month: row for row in hired}
+    return OwnerDashboard(
+        owner_id=owner_id,
+        **(totals._asdict() if totals else {}),
+        by_facility=[FacilityCounts(**row._asdict()) for row in by_facility],
+        # Months without hires are in the trend, with zeros.
+        hiring=[
+            HiringMonth(**by_month[month]._asdict())
+            if month in by_month
+            else HiringMonth(month=month)
+            for month in trend
+        ],
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from . import models  # noqa: F401  (registers the tables)
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the dashboard rollups.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        rebuild(conn)
+        owners = conn.exec_driver_sql("SELECT count(*) FROM owner_stats").scalar()
+    print(f"rebuilt dashboard rollups for {owners} owners")
+
+
+if __name__ == "__main__":
+    main()
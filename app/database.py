@@ -1,12 +1,125 @@
+from functools import lru_cache
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .metrics import instrument_engine
+from .migrations import migrate
+from .settings import Settings, settings
+
+# Reported by /health/db.
+REPORTED_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "busy_timeout",
+    "mmap_size",
+    "cache_size",
+    "foreign_keys",
+)
+
+
+def connection_pragmas(settings: Settings) -> Dict[str, Any]:
+    pragmas = {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "mmap_size": settings.sqlite_mmap_size,
+        "cache_size": settings.sqlite_cache_size,
+    }
+    return {name: value for name, value in pragmas.items() if value != ""}
+
+
+def install_pragmas(engine: Engine, settings: Settings) -> None:
+    """Run the configured PRAGMAs on every new DBAPI connection of `engine`."""
+    pragmas = connection_pragmas(settings)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _is_memory(url: str) -> bool:
+    return make_url(url).database in (None, "", ":memory:")
+
+
+def _engine_kwargs(settings: Settings, is_async: bool = False) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {
+        "echo": settings.db_echo,
+        "connect_args": {"check_same_thread": False},
+    }
+    if _is_memory(settings.db_url):
+        # One shared connection, otherwise every connection gets its own
+        # empty in-memory database.
+        kwargs["poolclass"] = StaticPool
+    else:
+        kwargs["poolclass"] = AsyncAdaptedQueuePool if is_async else QueuePool
+        kwargs["pool_size"] = settings.db_pool_size
+        kwargs["max_overflow"] = settings.db_max_overflow
+        kwargs["pool_timeout"] = settings.db_pool_timeout
+    return kwargs
 
-DB_FILE = "db.sqlite3"
-connect_args = {"check_same_thread": False}
-engine = create_engine(f"sqlite:///{DB_FILE}", echo=True, connect_args=connect_args)
+
+def make_engine(settings: Settings) -> Engine:
+    """Build the sync engine for a settings profile."""
+    engine = create_engine(settings.db_url, **_engine_kwargs(settings))
+    install_pragmas(engine, settings)
+    instrument_engine(engine)
+    return engine
+
+
+def make_async_engine(settings: Settings) -> AsyncEngine:
+    url = make_url(settings.db_url).set(drivername="sqlite+aiosqlite")
+    async_engine = create_async_engine(url, **_engine_kwargs(settings, is_async=True))
+    install_pragmas(async_engine.sync_engine, settings)
+    instrument_engine(async_engine.sync_engine)
+    return async_engine
+
+
+engine = make_engine(settings)
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    """Async engine over the same database, created on first use so the
+    aiosqlite driver is only needed when the async routes are enabled."""
+    return make_async_engine(settings)
+
+
+async def get_async_session():
+    # expire_on_commit=False: expired attributes would be lazy-loaded during
+    # response serialization, which can't do IO under asyncio.
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+def database_health(connection) -> Dict[str, Any]:
+    """Active PRAGMA values and pool status, as reported by /health/db."""
+    pragmas = {
+        name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        for name in REPORTED_PRAGMAS
+    }
+    return {
+        "profile": settings.profile,
+        "url": connection.engine.url.render_as_string(hide_password=True),
+        "pragmas": pragmas,
+        "pool": connection.engine.pool.status(),
+    }
 
 
 def create_tables():
     """Create the tables registered with SQLModel.metadata (i.e classes with table=True).
     More info: https://sqlmodel.tiangolo.com/tutorial/create-db-and-table/#sqlmodel-metadata
+
+    Tables that already exist are left alone by create_all; the migrations
+    bring their indexes and columns up to date.
     """
     SQLModel.metadata.create_all(engine)
+    migrate(engine)
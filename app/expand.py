@@ -0,0 +1,213 @@
+"""`?expand=` support: include related rows in get-by-id and list responses.
+
+Relations are loaded for a whole page at once with one `IN (...)` query per
+relation, never through the lazy ORM relationships, so listing 100 trainers
+with `?expand=owner,manager,facility` costs 4 queries instead of 301.
+Responses are serialized through a model composed from the entity's `*Read`
+class plus the requested relations, built once per combination.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Type
+
+from fastapi import HTTPException, Query, Response
+from pydantic import create_model
+from sqlalchemy import Row
+from sqlmodel import Session, SQLModel, select
+
+from .models import (
+    Facility,
+    FacilityRead,
+    Manager,
+    ManagerRead,
+    Owner,
+    OwnerRead,
+    Staff,
+    StaffRead,
+    Trainer,
+    TrainerRead,
+)
+from .purge import live
+from .serializers import dump_json
+
+# SQLite's default limit on bound parameters is 999.
+IN_CHUNK_SIZE = 500
+
+READ_MODELS: Dict[Type[SQLModel], Type[SQLModel]] = {
+    Owner: OwnerRead,
+    Manager: ManagerRead,
+    Facility: FacilityRead,
+    Trainer: TrainerRead,
+    Staff: StaffRead,
+}
+
+
+@dataclass(frozen=True)
+class Relation:
+    target: Type[SQLModel]
+    # Rows match when `source.<local_key> == target.<remote_key>`.
+    local_key: str
+    remote_key: str
+    many: bool
+
+
+def one(target: Type[SQLModel], foreign_key: str) -> Relation:
+    return Relation(target, local_key=foreign_key, remote_key="id", many=False)
+
+
+def many(target: Type[SQLModel], foreign_key: str) -> Relation:
+    return Relation(target, local_key="id", remote_key=foreign_key, many=True)
+
+
+RELATIONS: Dict[Type[SQLModel], Dict[str, Relation]] = {
+    Owner: {
+        "facilities": many(Facility, "owner_id"),
+        "managers": many(Manager, "owner_id"),
+        "trainers": many(Trainer, "owner_id"),
+        "staff": many(Staff, "owner_id"),
+    },
+    Manager: {
+        "owner": one(Owner, "owner_id"),
+        "facilities": many(Facility, "manager_id"),
+        "trainers": many(Trainer, "manager_id"),
+        "staff": many(Staff, "manager_id"),
+    },
+    Facility: {
+        "owner": one(Owner, "owner_id"),
+        "manager": one(Manager, "manager_id"),
+        "trainers": many(Trainer, "facility_id"),
+        "staff": many(Staff, "facility_id"),
+    },
+    Trainer: {
+        "owner": one(Owner, "owner_id"),
+        "manager": one(Manager, "manager_id"),
+        "facility": one(Facility, "facility_id"),
+    },
+    Staff: {
+        "owner": one(Owner, "owner_id"),
+        "manager": one(Manager, "manager_id"),
+        "facility": one(Facility, "facility_id"),
+    },
+}
+
+
+def expand_query() -> Any:
+    return Query(
+        default=None,
+        description="Comma-separated relations to include, e.g. owner,manager",
+    )
+
+
+def parse_expand(model: Type[SQLModel], expand: Optional[str]) -> FrozenSet[str]:
+    names = frozenset(
+        name.strip() for name in (expand or "").split(",") if name.strip()
+    )
+    unknown = names - RELATIONS[model].keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot expand {', '.join(sorted(unknown))} on {model.__name__}; "
+            f"choose from {', '.join(sorted(RELATIONS[model]))}",
+        )
+    return names
+
+
+@lru_cache(maxsize=None)
+def expanded_model(
+    model: Type[SQLModel],
+    names: FrozenSet[str],
+    base: Optional[Type[SQLModel]] = None,
+) -> Type[SQLModel]:
+    """`<Entity>Read` (or `base`) plus one field per requested relation."""
+    read_model = base or READ_MODELS[model]
+    fields = {}
+    for name in sorted(names):
+        relation = RELATIONS[model][name]
+        target_read = READ_MODELS[relation.target]
+        if relation.many:
+            fields[name] = (List[target_read], [])
+        else:
+            fields[name] = (Optional[target_read], None)
+    suffix = "".join(name.title() for name in sorted(names))
+    return create_model(
+        f"{read_model.__name__}With{suffix}", __base__=read_model, **fields
+    )
+
+
+def chunks(values: Sequence[Any]) -> Iterable[Sequence[Any]]:
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        yield values[start : start + IN_CHUNK_SIZE]
+
+
+def load_relation(session: Session, relation: Relation, keys: Iterable[Any]):
+    """Fetch the related rows for `keys`, grouped by the key they matched."""
+    keys = sorted({key for key in keys if key is not None})
+    column = getattr(relation.target, relation.remote_key)
+    grouped: Dict[Any, List[Any]] = defaultdict(list)
+    for chunk in chunks(keys):
+        statement = select(relation.target).where(
+            column.in_(chunk), live(relation.target)
+        )
+        if relation.many:
+            statement = statement.order_by(relation.target.id)
+        for row in session.exec(statement):
+            grouped[getattr(row, relation.remote_key)].append(row)
+    return grouped
+
+
+def expand_rows(
+    session: Session, model: Type[SQLModel], rows: Sequence[Any], names: FrozenSet[str]
+) -> List[Dict[str, Any]]:
+    """`rows` as dicts, with the related rows under the relation names."""
+    # Rows are ORM objects, or plain rows of the columns ?fields= selected.
+    items = [
+        row._asdict() if isinstance(row, Row) else row.model_dump() for row in rows
+    ]
+    for name in names:
+        relation = RELATIONS[model][name]
+        grouped = load_relation(
+            session, relation, (item[relation.local_key] for item in items)
+        )
+        for item in items:
+            related = grouped.get(item[relation.local_key], [])
+            if relation.many:
+                item[name] = related
+            else:
+                item[name] = related[0] if related else None
+    return items
+
+
+def json_response(content: bytes, response: Optional[Response]) -> Response:
+    expanded = Response(content=content, media_type="application/json")
+    if response is not None:
+        # Headers set on the injected response (e.g. X-Next-Cursor) are only
+        # copied by FastAPI when the handler doesn't return a Response itself.
+        for key, value in response.headers.items():
+            if key.lower() not in ("content-length", "content-type"):
+                expanded.headers[key] = value
+    return expanded
+
+
+def expanded_list_response(
+    session: Session,
+    model: Type[SQLModel],
+    rows: Sequence[Any],
+    names: FrozenSet[str],
+    response: Optional[Response] = None,
+    base: Optional[Type[SQLModel]] = None,
+) -> Response:
+    items = expand_rows(session, model, rows, names)
+    content = dump_json(List[expanded_model(model, names, base)], items)
+    return json_response(content, response)
+
+
+def expanded_response(
+    session: Session,
+    model: Type[SQLModel],
+    row: Any,
+    names: FrozenSet[str],
+    base: Optional[Type[SQLModel]] = None,
+) -> Response:
+    (item,) = expand_rows(session, model, [row], names)
+    return json_response(dump_json(expanded_model(model, names, base), item), None)
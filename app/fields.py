@@ -0,0 +1,87 @@
+"""`?fields=` support: sparse fieldsets for the list and get-by-id responses.
+
+`GET /trainers/?fields=id,name` selects only those columns instead of whole
+rows, so a large `bio` is neither read from the database nor serialized, and
+dumps them through a model with just those fields, built once per field set.
+`id` is always returned. Columns that paging (`created_at` for
+`order_by=created_at`) or `?expand=` (the foreign keys) depend on are selected
+too but left out of the response.
+"""
+from functools import lru_cache
+from typing import Any, FrozenSet, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query
+from pydantic import create_model
+from sqlalchemy import bindparam, select
+from sqlmodel import SQLModel
+
+from .expand import READ_MODELS, RELATIONS
+from .pagination import SortKey, keyset_columns
+from .purge import live
+
+
+def fields_query() -> Any:
+    return Query(
+        default=None,
+        description="Comma-separated fields to return, e.g. id,name "
+        "(default: all of them)",
+    )
+
+
+def parse_fields(model: Type[SQLModel], fields: Optional[str]) -> FrozenSet[str]:
+    """The requested fields plus `id`, or an empty set for all of them."""
+    names = frozenset(
+        name.strip() for name in (fields or "").split(",") if name.strip()
+    )
+    if not names:
+        return names
+    known = READ_MODELS[model].model_fields
+    unknown = names - known.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {', '.join(sorted(unknown))} on "
+            f"{model.__name__}; choose from {', '.join(known)}",
+        )
+    return names | {"id"}
+
+
+@lru_cache(maxsize=None)
+def sparse_model(model: Type[SQLModel], names: FrozenSet[str]) -> Type[SQLModel]:
+    """`<Entity>Read` cut down to `names`, without its input validators."""
+    read_model = READ_MODELS[model]
+    fields = {
+        name: (info.annotation, info)
+        for name, info in read_model.model_fields.items()
+        if name in names
+    }
+    suffix = "".join(name.title().replace("_", "") for name in sorted(names))
+    return create_model(
+        f"{read_model.__name__}Only{suffix}", __base__=SQLModel, **fields
+    )
+
+
+def selected_columns(
+    model: Type[SQLModel],
+    names: FrozenSet[str],
+    expand: FrozenSet[str] = frozenset(),
+    order_by: SortKey = SortKey.ID,
+) -> Tuple[str, ...]:
+    """Columns to select for `names`, in table order."""
+    table = model.__table__
+    wanted = set(names)
+    wanted.update(column.name for column in keyset_columns(table.c, order_by))
+    wanted.update(RELATIONS[model][name].local_key for name in expand)
+    return tuple(column.name for column in table.c if column.name in wanted)
+
+
+@lru_cache(maxsize=None)
+def columns_statement(model: Type[SQLModel], columns: Tuple[str, ...]):
+    table = model.__table__
+    return select(*(table.c[name] for name in columns)).where(live(table.c))
+
+
+@lru_cache(maxsize=None)
+def columns_by_id_statement(model: Type[SQLModel], columns: Tuple[str, ...]):
+    table = model.__table__
+    return columns_statement(model, columns).where(table.c.id == bindparam("id"))
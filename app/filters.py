@@ -0,0 +1,71 @@
+"""Filter query parameters for the list and export endpoints.
+
+A resource's filter class is a dependency like `PageParams`; its `apply` adds
+the WHERE clauses for the parameters that were given. Every filter is backed
+by an index (see the bottom of app/models.py), and text comparisons go
+through `lower()` on both sides so they match the expression indexes exactly:
+
+    GET /facilities/?city=austin&state_abbr=tx
+        WHERE lower(city) = lower(?) AND lower(state_abbr) = lower(?)
+    GET /facilities/?zip=787
+        WHERE zip_code >= '787' AND zip_code < '788'
+"""
+from typing import Any, Optional
+
+from fastapi import Query
+from sqlalchemy import func
+from sqlmodel.sql.expression import Select
+
+
+class NoFilters:
+    """For resources without filters."""
+
+    def apply(self, statement: Select, columns: Any) -> Select:
+        return statement
+
+
+def _equals_ignoring_case(column, value: str):
+    return func.lower(column) == func.lower(value.strip())
+
+
+def zip_prefix_range(prefix: str):
+    """Bounds such that `low <= zip_code < high` iff zip_code starts with prefix."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class FacilityFilters:
+    def __init__(
+        self,
+        city: Optional[str] = Query(default=None, description="Case-insensitive"),
+        state: Optional[str] = Query(default=None, description="Full state name"),
+        state_abbr: Optional[str] = Query(default=None, description="e.g. TX"),
+        zip: Optional[str] = Query(
+            default=None, pattern=r"^\d{1,5}$", description="Zip code or its prefix"
+        ),
+        owner_id: Optional[int] = None,
+        manager_id: Optional[int] = None,
+    ):
+        self.city = city
+        self.state = state
+        self.state_abbr = state_abbr
+        self.zip = zip
+        self.owner_id = owner_id
+        self.manager_id = manager_id
+
+    def apply(self, statement: Select, columns: Any) -> Select:
+        """Add the given filters; `columns` is the model or `table.c`."""
+        for name in ("city", "state", "state_abbr"):
+            value = getattr(self, name)
+            if value is not None:
+                column = getattr(columns, name)
+                statement = statement.where(_equals_ignoring_case(column, value))
+        if self.zip is not None:
+            low, high = zip_prefix_range(self.zip)
+            statement = statement.where(
+                columns.zip_code >= low, columns.zip_code < high
+            )
+        if self.owner_id is not None:
+            statement = statement.where(columns.owner_id == self.owner_id)
+        if self.manager_id is not None:
+            statement = statement.where(columns.manager_id == self.manager_id)
+        return statement
@@ -0,0 +1,363 @@
+"""Bulk import of owners, managers, facilities, trainers and staff from files.
+
+    python -m app.importer --owners owners.csv --managers managers.jsonl \\
+        --facilities facilities.csv --trainers trainers.csv --staff staff.csv
+
+Files are CSV or JSON Lines (by extension) with the columns of the entity's
+`*Create` model. References can use natural keys instead of ids, resolved
+through in-memory maps preloaded from the database and extended as rows are
+inserted:
+
+    owner_email -> owner_id, manager_email -> manager_id,
+    facility_name -> facility_id
+
+Entities are imported in dependency order, in transactions of `--batch-size`
+rows written with one executemany INSERT each. After every committed batch
+the number of rows consumed per file is saved to the checkpoint file, so a
+failed run picks up where it stopped when started again. Rows whose natural
+key (email, or name for facilities) already exists are skipped, which also
+makes re-importing the same file harmless. Email domains are not checked for
+MX records unless `--verify-mx` is given, and then once per domain.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel, select
+
+from . import mx
+from .bulk import insert_one_by_one, insert_rows, validate_items
+from .database import make_engine
+from .models import (
+    Facility,
+    FacilityCreate,
+    Manager,
+    ManagerCreate,
+    Owner,
+    OwnerCreate,
+    Staff,
+    StaffCreate,
+    Trainer,
+    TrainerCreate,
+)
+from .settings import settings
+
+DEFAULT_BATCH_SIZE = 5_000
+
+
+@dataclass(frozen=True)
+class Entity:
+    name: str
+    model: Type[SQLModel]
+    create_model: Type[SQLModel]
+    # Column identifying an existing row, e.g. the email of an owner.
+    natural_key: str
+    # Input column -> (entity it refers to, foreign key column it fills).
+    references: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+
+
+OWNER_REF = {"owner_email": ("owners", "owner_id")}
+MANAGER_REF = {"manager_email": ("managers", "manager_id")}
+FACILITY_REF = {"facility_name": ("facilities", "facility_id")}
+
+# In dependency order.
+ENTITIES = [
+    Entity("owners", Owner, OwnerCreate, "email"),
+    Entity("managers", Manager, ManagerCreate, "email", OWNER_REF),
+    Entity(
+        "facilities", Facility, FacilityCreate, "name", {**OWNER_REF, **MANAGER_REF}
+    ),
+    Entity(
+        "trainers",
+        Trainer,
+        TrainerCreate,
+        "email",
+        {**OWNER_REF, **MANAGER_REF, **FACILITY_REF},
+    ),
+    Entity(
+        "staff",
+        Staff,
+        StaffCreate,
+        "email",
+        {**OWNER_REF, **MANAGER_REF, **FACILITY_REF},
+    ),
+]
+ENTITIES_BY_NAME = {entity.name: entity for entity in ENTITIES}
+
+# Marks a natural key shared by several existing rows.
+AMBIGUOUS = -1
+
+
+def _key(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    key = str(value).strip().casefold()
+    return key or None
+
+
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream rows from a CSV or JSON Lines file."""
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                # Empty CSV cells mean "not given".
+                yield {k: v for k, v in row.items() if v not in ("", None)}
+    else:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class KeyMaps:
+    """Natural key -> id for every entity referenced or deduplicated."""
+
+    def __init__(self):
+        self.maps: Dict[str, Dict[str, int]] = {}
+
+    def load(self, session: Session, entity: Entity) -> None:
+        self.maps.setdefault(entity.name, {})
+        column = getattr(entity.model, entity.natural_key)
+        for value, id in session.execute(select(column, entity.model.id)):
+            self.add(entity.name, value, id)
+
+    def add(self, name: str, value: Any, id: int) -> None:
+        key = _key(value)
+        if key is not None:
+            keys = self.maps.setdefault(name, {})
+            keys[key] = AMBIGUOUS if key in keys and keys[key] != id else id
+
+    def get(self, name: str, value: Any) -> Optional[int]:
+        return self.maps.get(name, {}).get(_key(value))
+
+
+class Checkpoint:
+    """Rows consumed per input file, saved after every committed batch."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.state: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def position(self, name: str, source: str) -> int:
+        entry = self.state.get(name)
+        if entry and entry["file"] == os.path.abspath(source):
+            return entry["rows"]
+        return 0
+
+    def advance(self, name: str, source: str, rows: int) -> None:
+        self.state[name] = {"file": os.path.abspath(source), "rows": rows}
+        if self.path:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.path)
+
+
+@dataclass
+class ImportStats:
+    entity: str
+    read: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.entity}: {self.read} read, {self.inserted} inserted, "
+            f"{self.skipped} skipped, {self.invalid} invalid "
+            f"in {self.seconds:.1f}s ({self.rows_per_second:,.0f} rows/s)"
+        )
+
+
+def _batches(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch: List[Any] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def resolve(entity: Entity, row: Dict[str, Any], keys: KeyMaps):
+    """Replace natural-key references by ids; returns (item, errors)."""
+    item = {k: v for k, v in row.items() if k not in entity.references}
+    errors = []
+    for column, (target, foreign_key) in entity.references.items():
+        if row.get(column) is None:
+            continue
+        id = keys.get(target, row[column])
+        if id is None:
+            errors.append({"type": "unknown_reference", "loc": [column]})
+        elif id == AMBIGUOUS:
+            errors.append({"type": "ambiguous_reference", "loc": [column]})
+        else:
+            item[foreign_key] = id
+    return item, errors
+
+
+class Importer:
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        checkpoint: Optional[Checkpoint] = None,
+        errors_file=None,
+        progress=None,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.errors_file = errors_file
+        self.progress = progress
+        self.keys = KeyMaps()
+
+    def run(self, sources: Dict[str, str]) -> List[ImportStats]:
+        entities = [entity for entity in ENTITIES if entity.name in sources]
+        needed = {entity.name for entity in entities}
+        for entity in entities:
+            needed.update(target for target, _ in entity.references.values())
+        with Session(self.engine) as session:
+            for name in needed:
+                self.keys.load(session, ENTITIES_BY_NAME[name])
+        return [self.import_file(entity, sources[entity.name]) for entity in entities]
+
+    def import_file(self, entity: Entity, source: str) -> ImportStats:
+        stats = ImportStats(entity.name)
+        start = time.perf_counter()
+        done = self.checkpoint.position(entity.name, source)
+        rows = enumerate(read_rows(source), start=1)
+        for batch in _batches(rows, self.batch_size):
+            batch = [(line, row) for line, row in batch if line > done]
+            if not batch:
+                continue
+            self._import_batch(entity, source, batch, stats)
+            self.checkpoint.advance(entity.name, source, batch[-1][0])
+            stats.seconds = time.perf_counter() - start
+            if self.progress:
+                print(stats, file=self.progress)
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    def _import_batch(self, entity, source, batch, stats: ImportStats) -> None:
+        stats.read += len(batch)
+        lines, items = [], []
+        seen = set()
+        for line, row in batch:
+            key = _key(row.get(entity.natural_key))
+            if key is not None and (
+                key in seen or self.keys.get(entity.name, key) is not None
+            ):
+                stats.skipped += 1
+                continue
+            item, errors = resolve(entity, row, self.keys)
+            if errors:
+                self._report(entity, source, line, errors, stats)
+                continue
+            seen.add(key)
+            lines.append(line)
+            items.append(item)
+
+        rows, validation_errors = validate_items(
+            entity.model, entity.create_model, items
+        )
+        for error in validation_errors:
+            self._report(entity, source, lines[error.index], error.errors, stats)
+
+        with Session(self.engine) as session:
+            try:
+                ids = insert_rows(session, entity.model, [row for _, row in rows])
+                created = [(index, id) for (index, _), id in zip(rows, ids)]
+            except IntegrityError:
+                session.rollback()
+                results, insert_errors = insert_one_by_one(
+                    session, entity.model, rows
+                )
+                created = [(result.index, result.id) for result in results]
+                for error in insert_errors:
+                    line = lines[error.index]
+                    self._report(entity, source, line, error.errors, stats)
+            session.commit()
+
+        row_by_index = dict(rows)
+        for index, id in created:
+            self.keys.add(entity.name, row_by_index[index][entity.natural_key], id)
+        stats.inserted += len(created)
+
+    def _report(self, entity, source, line, errors, stats: ImportStats) -> None:
+        stats.invalid += 1
+        if self.errors_file is not None:
+            record = {"entity": entity.name, "file": source, "line": line}
+            record["errors"] = errors
+            self.errors_file.write(json.dumps(record, default=str) + "\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import gym data from files.")
+    for entity in ENTITIES:
+        parser.add_argument(f"--{entity.name}", metavar="FILE")
+    parser.add_argument("--db", help=f"database URL (default: {settings.db_url})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default="import.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    parser.add_argument("--errors", default="import.errors.jsonl")
+    parser.add_argument("--verify-mx", action="store_true")
+    args = parser.parse_args(argv)
+
+    sources = {
+        entity.name: getattr(args, entity.name)
+        for entity in ENTITIES
+        if getattr(args, entity.name)
+    }
+    if not sources:
+        parser.error("nothing to import")
+
+    if not args.verify_mx:
+        mx.set_backend(mx.StubBackend())
+    # Multi-thousand-row executemany statements aren't worth logging.
+    logging.getLogger("app.sql.slow").setLevel(logging.ERROR)
+    engine = make_engine(
+        replace(settings, db_url=args.db or settings.db_url, db_echo=False)
+    )
+    SQLModel.metadata.create_all(engine)
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    with open(args.errors, "a") as errors_file:
+        importer = Importer(
+            engine,
+            batch_size=args.batch_size,
+            checkpoint=Checkpoint(args.checkpoint),
+            errors_file=errors_file,
+            progress=sys.stderr,
+        )
+        results = importer.run(sources)
+
+    for stats in results:
+        print(stats)
+    total = sum(stats.read for stats in results)
+    seconds = sum(stats.seconds for stats in results)
+    rate = total / seconds if seconds else 0.0
+    print(f"total: {total} rows in {seconds:.1f}s ({rate:,.0f} rows/s)")
+    return 1 if any(stats.invalid for stats in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,56 +1,112 @@
 from contextlib import asynccontextmanager
+from datetime import date
 from typing import List, Optional
 
 import httpx
-from fastapi import Depends, FastAPI, HTTPException, Query, Request
-from sqlmodel import Session, select
-
-from .database import create_tables, engine
+from fastapi import APIRouter, Depends, FastAPI, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from . import cache, writes
+from .admission import (
+    AdmissionMiddleware,
+    admission_enabled,
+    set_threadpool_size,
+    update_threadpool_gauges,
+)
+from .appointments import (
+    FacilityFreeSlots,
+    TimeWindow,
+    TrainerAvailability,
+    book,
+    cancel,
+    facility_free_slots,
+    get_appointment,
+    min_minutes_query,
+    trainer_appointments,
+    trainer_availability,
+)
+from .cache import CacheMiddleware
+from .crud import RESOURCES, crud_router, not_found
+from .dashboard import OwnerDashboard, owner_dashboard
+from .database import create_tables, database_health, engine
+from .metrics import REGISTRY, MetricsMiddleware
 from .models import (
-    Manager,
-    ManagerCreate,
-    ManagerRead,
-    ManagerReadWithOwner,
-    ManagerUpdate,
     Owner,
-    OwnerCreate,
-    OwnerRead,
-    OwnerReadWithManagers,
-    OwnerUpdate,
-    FacilityRead,
-    FacilityReadWithOwner,
-    FacilityReadWithManager,
-    FacilityReadWithStaffAndTrainers,
-    FacilityUpdate,
-    FacilityCreate,
-    Facility,
-    TrainerRead,
-    TrainerReadWithOwner,
-    TrainerReadWithManager,
-    TrainerReadWithFacility,
-    TrainerUpdate,
-    TrainerCreate,
-    Trainer,
-    StaffRead,
-    StaffReadWithOwner,
-    StaffReadWithManager,
-    StaffReadWithFacility,
-    StaffUpdate,
-    StaffCreate,
     Staff,
+    Trainer,
+    TrainingAppointmentCreate,
+    TrainingAppointmentRead,
+)
+from .purge import PurgeStatus, PurgeWorker, purge_status
+from .reassign import (
+    FacilityReassignment,
+    Reassignment,
+    ReassignResult,
+    reassign_facility,
+    reassign_people,
 )
+from .settings import settings
+from .verification import EmailVerifier, VerificationStatus, verification_status
+from .writes import WriteCoalescer
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with httpx.AsyncClient(app=app) as client:
         print("client created")
+        set_threadpool_size(settings.threadpool_size)
         create_tables()
+        worker = None
+        if settings.soft_delete:
+            worker = PurgeWorker(
+                engine,
+                settings.purge_batch_size,
+                settings.purge_interval,
+                settings.purge_pause,
+                on_change=cache.invalidate_table,
+            )
+            worker.start()
+        app.state.purge_worker = worker
+        verifier = None
+        if settings.email_verification == "deferred":
+            verifier = EmailVerifier(
+                engine,
+                workers=settings.email_verify_workers,
+                batch_size=settings.email_verify_batch_size,
+                retries=settings.email_verify_retries,
+                retry_delay=settings.email_verify_retry_delay,
+                interval=settings.email_verify_interval,
+                on_change=cache.invalidate_table,
+            )
+            verifier.start()
+        app.state.email_verifier = verifier
+        if settings.write_coalescing:
+            writes.coalescer = WriteCoalescer(
+                engine,
+                settings.write_batch_max,
+                settings.write_batch_delay_ms / 1000,
+            ).start()
         yield {"client": client}
+        if writes.coalescer is not None:
+            writes.coalescer.stop()
+            writes.coalescer = None
+        if worker is not None:
+            worker.stop()
+        if verifier is not None:
+            verifier.stop()
         print("client closed")
 
 
 app = FastAPI(lifespan=lifespan)
+# Innermost: cache hits never wait for a slot, and 503s are still measured.
+if admission_enabled(settings):
+    app.add_middleware(AdmissionMiddleware)
+# Inside the metrics middleware so cache hits are still counted and timed.
+app.add_middleware(CacheMiddleware)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
 
 
 def get_session():
@@ -58,347 +114,151 @@ def get_session():
         yield session
 
 
-@app.post("/managers/", response_model=ManagerRead)
-def create_manager(*, session: Session = Depends(get_session), manager: ManagerCreate):
-    db_manager = Manager.model_validate(manager)
-    session.add(db_manager)
-    session.commit()
-    session.refresh(db_manager)
-    return db_manager
+# Sync CRUD routes, served unless settings.db_mode is "async" (see bottom).
+router = APIRouter()
+for resource in RESOURCES:
+    router.include_router(crud_router(resource, get_session))
 
 
-@app.get("/managers/{manager_id}", response_model=ManagerReadWithOwner)
-def get_manager(*, session: Session = Depends(get_session), manager_id: int):
-    manager = session.get(Manager, manager_id)
-    if not manager:
-        raise HTTPException(status_code=404, detail="Manager not found")
-    return manager
+@app.exception_handler(IntegrityError)
+def integrity_error(request: Request, exc: IntegrityError):
+    # e.g. a second account with the same email, see the indexes in models.py
+    return JSONResponse(
+        status_code=409,
+        content={"detail": {"type": "integrity_error", "msg": str(exc.orig)}},
+    )
 
 
-@app.get("/managers/", response_model=List[ManagerRead])
-def get_managers(
-    *,
-    session: Session = Depends(get_session),
-    offset: int = 0,
-    limit: int = Query(default=100, le=100),
-):
-    managers = session.exec(select(Manager).offset(offset).limit(limit)).all()
-    return managers
+# async: answered on the event loop even when every thread is busy.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    update_threadpool_gauges()
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
-@app.patch("/managers/{manager_id}", response_model=ManagerRead)
-def update_manager(
-    *,
-    session: Session = Depends(get_session),
-    manager_id: int,
-    manager_update: ManagerUpdate,
-):
-    manager = session.get(Manager, manager_id)
-    if not manager:
-        raise HTTPException(status_code=404, detail="Manager not found")
-    manager_data = manager_update.dict(exclude_unset=True)
-    for key, value in manager_data.items():
-        setattr(manager, key, value)
-    session.add(manager)
-    session.commit()
-    session.refresh(manager)
-    return manager
-
-
-@app.delete("/managers/{manager_id}", response_model=ManagerRead)
-def delete_manager(*, session: Session = Depends(get_session), manager_id: int):
-    manager = session.get(Manager, manager_id)
-    if not manager:
-        raise HTTPException(status_code=404, detail="Manager not found")
-    session.delete(manager)
-    session.commit()
-    return manager
-
-
-@app.post("/owners/", response_model=OwnerRead)
-def create_owner(*, session: Session = Depends(get_session), owner: OwnerCreate):
-    db_owner = Owner.model_validate(owner)
-    session.add(db_owner)
-    session.commit()
-    session.refresh(db_owner)
-    return db_owner
-
-
-@app.get("/owners/{owner_id}", response_model=OwnerReadWithManagers)
-def get_owner(*, session: Session = Depends(get_session), owner_id: int):
-    owner = session.get(Owner, owner_id)
-    if not owner:
-        raise HTTPException(status_code=404, detail="Owner not found")
-    return owner
-
-
-@app.get("/owners/", response_model=List[OwnerRead])
-def get_owners(
-    *,
-    session: Session = Depends(get_session),
-    offset: int = 0,
-    limit: int = Query(default=100, le=100),
-):
-    owners = session.exec(select(Owner).offset(offset).limit(limit)).all()
-    return owners
+@app.get("/health/db")
+def health_db(*, session: Session = Depends(get_session)):
+    return database_health(session.connection())
 
 
-@app.patch("/owners/{owner_id}", response_model=OwnerRead)
-def update_owner(
+@app.get("/owners/{owner_id}/dashboard", response_model=OwnerDashboard)
+def get_owner_dashboard(
     *,
     session: Session = Depends(get_session),
     owner_id: int,
-    owner_update: OwnerUpdate,
-):
-    owner = session.get(Owner, owner_id)
-    if not owner:
-        raise HTTPException(status_code=404, detail="Owner not found")
-    owner_data = owner_update.model_dump(exclude_unset=True)
-    for key, value in owner_data.items():
-        setattr(owner, key, value)
-    session.add(owner)
-    session.commit()
-    session.refresh(owner)
-    return owner
-
-
-@app.delete("/owners/{owner_id}", response_model=OwnerRead)
-def delete_owner(*, session: Session = Depends(get_session), owner_id: int):
-    owner = session.get(Owner, owner_id)
-    if not owner:
-        raise HTTPException(status_code=404, detail="Owner not found")
-    session.delete(owner)
-    session.commit()
-    return owner
-
-
-@app.post("/facilities/", response_model=FacilityRead)
-def create_facility(
-    *, session: Session = Depends(get_session), facility: FacilityCreate
+    months: int = Query(default=12, ge=1, le=120, description="Hiring trend length"),
+    until: Optional[date] = Query(
+        default=None, description="A day in the trend's last month; default today"
+    ),
 ):
-    db_facility = Facility.model_validate(facility)
-    session.add(db_facility)
-    session.commit()
-    session.refresh(db_facility)
-    return db_facility
+    # Served from the summary tables in app/dashboard.py, in both db modes.
+    dashboard = owner_dashboard(session.connection(), owner_id, months, until)
+    if dashboard is None:
+        raise not_found(Owner)
+    return dashboard
 
 
-@app.get("/facilities/", response_model=List[FacilityRead])
-def get_facilities(
-    *,
-    session: Session = Depends(get_session),
-    offset: int = 0,
-    limit: int = Query(default=100, le=100),
-):
-    facilities = session.exec(select(Facility).offset(offset).limit(limit)).all()
-    return facilities
+@app.get("/purge", response_model=PurgeStatus)
+def get_purge_status(*, session: Session = Depends(get_session), request: Request):
+    worker = getattr(request.app.state, "purge_worker", None)
+    return purge_status(session.connection(), worker)
 
 
-@app.get("/facilities/{facility_id}/owner/", response_model=FacilityReadWithOwner)
-def get_facility(*, session: Session = Depends(get_session), facility_id: int):
-    facility = session.get(Facility, facility_id)
-    if not facility:
-        raise HTTPException(status_code=404, detail="Facility not found")
-    return facility
+@app.get("/email-verification", response_model=VerificationStatus)
+def get_email_verification_status(
+    *, session: Session = Depends(get_session), request: Request
+):
+    verifier = getattr(request.app.state, "email_verifier", None)
+    return verification_status(
+        session.connection(), verifier, settings.email_verification
+    )
 
 
-@app.get("/facilities/{facility_id}/manager/", response_model=FacilityReadWithManager)
-def get_facility_with_manager(
-    *, session: Session = Depends(get_session), facility_id: int
+# Set-based moves that never load the rows (app/reassign.py), in both db modes.
+@app.post("/trainers/reassign", response_model=ReassignResult)
+def reassign_trainers(
+    *, session: Session = Depends(get_session), reassignment: Reassignment
 ):
-    facility = session.get(Facility, facility_id)
-    if not facility:
-        raise HTTPException(status_code=404, detail="Facility not found")
-    return facility
+    return reassign_people(session, Trainer, reassignment)
 
 
-@app.get(
-    "/facilities/{facility_id}/staff/trainers/",
-    response_model=FacilityReadWithStaffAndTrainers,
-)
-def get_facility_with_staff_and_trainers(
-    *, session: Session = Depends(get_session), facility_id: int
+@app.post("/staff/reassign", response_model=ReassignResult)
+def reassign_staff(
+    *, session: Session = Depends(get_session), reassignment: Reassignment
 ):
-    facility = session.get(Facility, facility_id)
-    if not facility:
-        raise HTTPException(status_code=404, detail="Facility not found")
-    return facility
+    return reassign_people(session, Staff, reassignment)
 
 
-@app.patch("/facilities/{facility_id}", response_model=FacilityRead)
-def update_facility(
+@app.post("/facilities/{facility_id}/reassign", response_model=ReassignResult)
+def reassign_facility_manager(
     *,
     session: Session = Depends(get_session),
     facility_id: int,
-    facility_update: FacilityUpdate,
-):
-    facility = session.get(Facility, facility_id)
-    if not facility:
-        raise HTTPException(status_code=404, detail="Facility not found")
-    facility_data = facility_update.dict(exclude_unset=True)
-    for key, value in facility_data.items():
-        setattr(facility, key, value)
-    session.add(facility)
-    session.commit()
-    session.refresh(facility)
-    return facility
-
-
-@app.delete("/facilities/{facility_id}", response_model=FacilityRead)
-def delete_facility(*, session: Session = Depends(get_session), facility_id: int):
-    facility = session.get(Facility, facility_id)
-    if not facility:
-        raise HTTPException(status_code=404, detail="Facility not found")
-    session.delete(facility)
-    session.commit()
-    return facility
-
-
-@app.post("/trainers/", response_model=TrainerRead)
-def create_trainer(*, session: Session = Depends(get_session), trainer: TrainerCreate):
-    db_trainer = Trainer.model_validate(trainer)
-    session.add(db_trainer)
-    session.commit()
-    session.refresh(db_trainer)
-    return db_trainer
-
-
-@app.get("/trainers/", response_model=List[TrainerRead])
-def get_trainers(
-    *,
-    session: Session = Depends(get_session),
-    offset: int = 0,
-    limit: int = Query(default=100, le=100),
+    reassignment: FacilityReassignment,
 ):
-    trainers = session.exec(select(Trainer).offset(offset).limit(limit)).all()
-    return trainers
+    return reassign_facility(session, facility_id, reassignment)
 
 
-@app.get("/trainers/{trainer_id}/owner/", response_model=TrainerReadWithOwner)
-def get_trainer_with_owner(*, session: Session = Depends(get_session), trainer_id: int):
-    trainer = session.get(Trainer, trainer_id)
-    if not trainer:
-        raise HTTPException(status_code=404, detail="Trainer not found")
-    return trainer
+# Training appointments (app/appointments.py), in both db modes.
+@app.post("/appointments/", response_model=TrainingAppointmentRead)
+def create_appointment(
+    *, session: Session = Depends(get_session), item: TrainingAppointmentCreate
+):
+    return book(session, item)
 
 
-@app.get("/trainers/{trainer_id}/manager/", response_model=TrainerReadWithManager)
-def get_trainer_with_manager(
-    *, session: Session = Depends(get_session), trainer_id: int
-):
-    trainer = session.get(Trainer, trainer_id)
-    if not trainer:
-        raise HTTPException(status_code=404, detail="Trainer not found")
-    return trainer
+@app.get("/appointments/{appointment_id}", response_model=TrainingAppointmentRead)
+def read_appointment(*, session: Session = Depends(get_session), appointment_id: int):
+    return get_appointment(session, appointment_id)
 
 
-@app.get("/trainers/{trainer_id}/facility/", response_model=TrainerReadWithFacility)
-def get_trainer_with_facility(
-    *, session: Session = Depends(get_session), trainer_id: int
+@app.delete("/appointments/{appointment_id}", response_model=TrainingAppointmentRead)
+def cancel_appointment(
+    *, session: Session = Depends(get_session), appointment_id: int
 ):
-    trainer = session.get(Trainer, trainer_id)
-    if not trainer:
-        raise HTTPException(status_code=404, detail="Trainer not found")
-    return trainer
+    return cancel(session, appointment_id)
 
 
-@app.patch("/trainers/{trainer_id}", response_model=TrainerRead)
-def update_trainer(
+@app.get(
+    "/trainers/{trainer_id}/appointments",
+    response_model=List[TrainingAppointmentRead],
+)
+def list_trainer_appointments(
     *,
     session: Session = Depends(get_session),
     trainer_id: int,
-    trainer_update: TrainerUpdate,
+    window: TimeWindow = Depends(),
 ):
-    trainer = session.get(Trainer, trainer_id)
-    if not trainer:
-        raise HTTPException(status_code=404, detail="Trainer not found")
-    trainer_data = trainer_update.dict(exclude_unset=True)
-    for key, value in trainer_data.items():
-        setattr(trainer, key, value)
-    session.add(trainer)
-    session.commit()
-    session.refresh(trainer)
-    return trainer
-
-
-@app.delete("/trainers/{trainer_id}", response_model=TrainerRead)
-def delete_trainer(*, session: Session = Depends(get_session), trainer_id: int):
-    trainer = session.get(Trainer, trainer_id)
-    if not trainer:
-        raise HTTPException(status_code=404, detail="Trainer not found")
-    session.delete(trainer)
-    session.commit()
-    return trainer
-
-
-@app.post("/staff/", response_model=StaffRead)
-def create_staff(*, session: Session = Depends(get_session), staff: StaffCreate):
-    db_staff = Staff.model_validate(staff)
-    session.add(db_staff)
-    session.commit()
-    session.refresh(db_staff)
-    return db_staff
-
-
-@app.get("/staff/", response_model=List[StaffRead])
-def read_staff(
+    return trainer_appointments(session, trainer_id, window)
+
+
+@app.get("/trainers/{trainer_id}/availability", response_model=TrainerAvailability)
+def get_trainer_availability(
     *,
     session: Session = Depends(get_session),
-    offset: int = 0,
-    limit: int = Query(default=100, le=100),
+    trainer_id: int,
+    window: TimeWindow = Depends(),
+    min_minutes: int = min_minutes_query(),
 ):
-    staff = session.exec(select(Staff).offset(offset).limit(limit)).all()
-    return staff
+    return trainer_availability(session, trainer_id, window, min_minutes)
 
 
-@app.get("/staff/{staff_id}/owner/", response_model=StaffReadWithOwner)
-def get_staff_with_owner(*, session: Session = Depends(get_session), staff_id: int):
-    staff = session.get(Staff, staff_id)
-    if not staff:
-        raise HTTPException(status_code=404, detail="Staff not found")
-    return staff
-
-
-@app.get("/staff/{staff_id}/manager/", response_model=StaffReadWithManager)
-def get_staff_with_manager(*, session: Session = Depends(get_session), staff_id: int):
-    staff = session.get(Staff, staff_id)
-    if not staff:
-        raise HTTPException(status_code=404, detail="Staff not found")
-    return staff
-
-
-@app.get("/staff/{staff_id}/facility/", response_model=StaffReadWithFacility)
-def get_staff_with_facility(*, session: Session = Depends(get_session), staff_id: int):
-    staff = session.get(Staff, staff_id)
-    if not staff:
-        raise HTTPException(status_code=404, detail="Staff not found")
-    return staff
-
-
-@app.patch("/staff/{staff_id}", response_model=StaffRead)
-def update_staff(
+@app.get("/facilities/{facility_id}/free-slots", response_model=FacilityFreeSlots)
+def get_facility_free_slots(
     *,
     session: Session = Depends(get_session),
-    staff_id: int,
-    staff_update: StaffUpdate,
+    facility_id: int,
+    window: TimeWindow = Depends(),
+    min_minutes: int = min_minutes_query(),
 ):
-    staff = session.get(Staff, staff_id)
-    if not staff:
-        raise HTTPException(status_code=404, detail="Staff not found")
-    staff_data = staff_update.dict(exclude_unset=True)
-    for key, value in staff_data.items():
-        setattr(staff, key, value)
-    session.add(staff)
-    session.commit()
-    session.refresh(staff)
-    return staff
-
-
-@app.delete("/staff/{staff_id}", response_model=StaffRead)
-def delete_staff(*, session: Session = Depends(get_session), staff_id: int):
-    staff = session.get(Staff, staff_id)
-    if not staff:
-        raise HTTPException(status_code=404, detail="Staff not found")
-    session.delete(staff)
-    session.commit()
-    return staff
+    return facility_free_slots(session, facility_id, window, min_minutes)
+
+
+if settings.db_mode == "async":
+    from .api.async_crud import router as async_router
+
+    app.include_router(async_router)
+else:
+    app.include_router(router)
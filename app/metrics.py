@@ -0,0 +1,364 @@
+"""Per-request latency and SQL instrumentation, exposed on `/metrics`.
+
+`MetricsMiddleware` times every request and, through SQLAlchemy cursor
+events, counts the SQL statements it ran, their total time and the rows they
+returned (as fetched from the DBAPI cursor, whether by the ORM or a Core
+query) or changed. Each response carries a `Server-Timing` header with those numbers;
+the totals per route template are kept in an in-process registry rendered in
+the Prometheus text format. Statements slower than `settings.slow_query_ms`
+are logged together with their bound parameters.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .settings import settings
+
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _format_labels(
+    labelnames: Sequence[str], values: Sequence[str], extra: str = ""
+) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in sorted(self._values.items()):
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}{label_str} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts, total, count = self._values.get(
+                labels, ([0] * len(self.buckets), 0.0, 0)
+            )
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self._values[labels] = (counts, total + value, count + 1)
+
+    def count(self, *labels: str) -> int:
+        return self._values.get(labels, ([], 0.0, 0))[2]
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{bound:g}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total:g}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+ROUTE_LABELS = ("method", "route")
+
+http_requests = REGISTRY.register(
+    Counter("gym_http_requests_total", "HTTP requests.", ROUTE_LABELS + ("status",))
+)
+http_latency = REGISTRY.register(
+    Histogram(
+        "gym_http_request_duration_seconds", "HTTP request latency.", ROUTE_LABELS
+    )
+)
+sql_statements = REGISTRY.register(
+    Counter("gym_sql_statements_total", "SQL statements executed.", ROUTE_LABELS)
+)
+sql_statements_per_request = REGISTRY.register(
+    Histogram(
+        "gym_sql_statements_per_request",
+        "SQL statements executed per request.",
+        ROUTE_LABELS,
+        buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100, 250),
+    )
+)
+sql_seconds = REGISTRY.register(
+    Counter("gym_sql_duration_seconds_total", "Time spent in SQL.", ROUTE_LABELS)
+)
+sql_rows = REGISTRY.register(
+    Counter(
+        "gym_sql_rows_total",
+        "Rows fetched by SELECTs plus rows affected by INSERT/UPDATE/DELETE.",
+        ROUTE_LABELS,
+    )
+)
+
+# Group commits, see app/writes.py.
+write_batch_size = REGISTRY.register(
+    Histogram(
+        "gym_write_batch_size",
+        "Writes committed together per group commit.",
+        buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+    )
+)
+write_batch_latency = REGISTRY.register(
+    Histogram(
+        "gym_write_batch_latency_seconds",
+        "Time from the first write of a batch being queued to its commit.",
+    )
+)
+write_lock_wait = REGISTRY.register(
+    Histogram(
+        "gym_write_lock_wait_seconds",
+        "Time a group commit waited for the SQLite write lock.",
+    )
+)
+write_queue_depth = REGISTRY.register(
+    Gauge("gym_write_queue_depth", "Writes queued for the next group commit.")
+)
+
+# Admission control, see app/admission.py.
+admission_in_flight = REGISTRY.register(
+    Gauge("gym_admission_in_flight", "Requests being handled, per pool.", ("pool",))
+)
+admission_queued = REGISTRY.register(
+    Gauge("gym_admission_queued", "Requests waiting for a slot, per pool.", ("pool",))
+)
+admission_shed = REGISTRY.register(
+    Counter(
+        "gym_admission_shed_total", "Requests refused with a 503, per pool.", ("pool",)
+    )
+)
+threadpool_busy = REGISTRY.register(
+    Gauge("gym_threadpool_busy", "Threads running sync handlers.")
+)
+threadpool_waiting = REGISTRY.register(
+    Gauge("gym_threadpool_waiting", "Sync handlers waiting for a thread.")
+)
+
+
+@dataclass
+class RequestStats:
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    rows: int = 0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, params, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, params, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+        # With RETURNING, the rows are counted as they are fetched.
+        if (
+            context is not None
+            and (context.isinsert or context.isupdate or context.isdelete)
+            and cursor.description is None
+        ):
+            stats.rows += max(cursor.rowcount, 0)
+    if settings.slow_query_ms > 0 and elapsed * 1000 >= settings.slow_query_ms:
+        slow_query_logger.warning(
+            "slow query (%.1f ms): %s; parameters=%r",
+            elapsed * 1000,
+            statement,
+            params if settings.slow_query_log_params else "<hidden>",
+        )
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute doesn't run for failed statements.
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def _fetched(count: int) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += count
+
+
+class _CountingCursor:
+    """DBAPI cursor proxy counting the rows fetched through it."""
+
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            _fetched(1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        _fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        _fetched(len(rows))
+        return rows
+
+
+def _counting_context(context_cls):
+    # There is no event for fetching rows; the cursors each statement runs on
+    # are wrapped instead, so Core, ORM and raw SQL results are all counted.
+    class CountingExecutionContext(context_cls):
+        def create_cursor(self):
+            return _CountingCursor(super().create_cursor())
+
+    return CountingExecutionContext
+
+
+def instrument_engine(engine: Engine) -> None:
+    dialect = engine.dialect
+    dialect.execution_ctx_cls = _counting_context(dialect.execution_ctx_cls)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                db_ms = stats.sql_seconds * 1000
+                timing = (
+                    f"app;dur={elapsed_ms:.2f}, "
+                    f'db;dur={db_ms:.2f};desc="{stats.sql_count} queries"'
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"server-timing", timing.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            labels = (scope["method"], _route_template(scope))
+            http_requests.inc(*labels, str(status))
+            http_latency.observe(time.perf_counter() - start, *labels)
+            sql_statements.inc(*labels, amount=stats.sql_count)
+            sql_statements_per_request.observe(stats.sql_count, *labels)
+            sql_seconds.inc(*labels, amount=stats.sql_seconds)
+            sql_rows.inc(*labels, amount=stats.rows)
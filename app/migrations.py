@@ -0,0 +1,279 @@
+"""Versioned schema migrations for existing SQLite databases.
+
+`create_tables` builds a fresh database from the models, which already carry
+every index and column. Databases created by an older version of the app are
+brought up to date by the migrations below, applied in order, each in its own
+transaction and recorded in the `schema_migrations` table. They only add
+things (CREATE INDEX, ALTER TABLE ... ADD COLUMN) or replace an index,
+never rebuild a table, and check for what already exists, so running them
+against a fresh database is a no-op and they can be applied while the app is
+serving requests (SQLite blocks writers for the duration of an index build,
+readers carry on in WAL mode).
+
+    python -m app.migrations            # apply pending migrations
+    python -m app.migrations status
+
+To change the schema, change the model and append a migration doing the same
+to existing databases; never edit one that has shipped.
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from . import dashboard, purge, search, verification
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    def register(upgrade: Callable[[Connection], None]):
+        assert not MIGRATIONS or MIGRATIONS[-1].version < version
+        MIGRATIONS.append(Migration(version, name, upgrade))
+        return upgrade
+
+    return register
+
+
+def column_exists(conn: Connection, table: str, column: str) -> bool:
+    rows = conn.exec_driver_sql(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in rows)
+
+
+def add_column(conn: Connection, table: str, column: str, definition: str) -> None:
+    """ALTER TABLE ... ADD COLUMN unless the column is already there."""
+    if not column_exists(conn, table, column):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def create_index(
+    conn: Connection,
+    name: str,
+    table: str,
+    expression: str,
+    unique: bool = False,
+    where: str = "",
+) -> None:
+    unique_sql = "UNIQUE " if unique else ""
+    where_sql = f" WHERE {where}" if where else ""
+    conn.exec_driver_sql(
+        f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({expression})"
+        f"{where_sql}"
+    )
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+    )
+
+
+def applied_versions(conn: Connection) -> List[int]:
+    _ensure_version_table(conn)
+    rows = conn.exec_driver_sql("SELECT version FROM schema_migrations ORDER BY 1")
+    return [row[0] for row in rows]
+
+
+def pending(engine: Engine) -> List[Migration]:
+    with engine.begin() as conn:
+        applied = set(applied_versions(conn))
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def migrate(engine: Engine, target: Optional[int] = None, log=None) -> List[Migration]:
+    """Apply pending migrations up to `target` (default: all)."""
+    done = []
+    for m in pending(engine):
+        if target is not None and m.version > target:
+            break
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            m.upgrade(conn)
+            conn.execute(
+                text(
+                    "INSERT INTO schema_migrations (version, name, applied_at) "
+                    "VALUES (:version, :name, :applied_at)"
+                ),
+                {
+                    "version": m.version,
+                    "name": m.name,
+                    "applied_at": datetime.now().isoformat(),
+                },
+            )
+        done.append(m)
+        if log:
+            elapsed = time.perf_counter() - start
+            log(f"applied {m.version:04d} {m.name} ({elapsed:.2f}s)")
+    return done
+
+
+FOREIGN_KEYS = {
+    "manager": ["owner_id"],
+    "facility": ["owner_id", "manager_id"],
+    "trainer": ["owner_id", "manager_id", "facility_id"],
+    "staff": ["owner_id", "manager_id", "facility_id"],
+}
+
+
+@migration(1, "index foreign keys and created_at")
+def _index_foreign_keys(conn: Connection) -> None:
+    for table, columns in FOREIGN_KEYS.items():
+        for column in columns:
+            create_index(conn, f"ix_{table}_{column}", table, column)
+    for table in ("owner", "manager", "facility", "trainer", "staff"):
+        create_index(conn, f"ix_{table}_created_at", table, "created_at")
+
+
+@migration(2, "unique index on lower(email)")
+def _unique_emails(conn: Connection) -> None:
+    for table in ("owner", "manager", "trainer", "staff"):
+        duplicates = conn.exec_driver_sql(
+            f"SELECT lower(email), count(*) FROM {table} WHERE email IS NOT NULL "
+            f"GROUP BY lower(email) HAVING count(*) > 1 LIMIT 5"
+        ).all()
+        if duplicates:
+            emails = ", ".join(f"{email} ({count}x)" for email, count in duplicates)
+            raise RuntimeError(
+                f"Cannot add a unique email index on {table}: duplicates such as "
+                f"{emails} have to be merged first"
+            )
+        create_index(
+            conn, f"ux_{table}_email_normalized", table, "lower(email)", unique=True
+        )
+
+
+@migration(3, "owner dashboard summary tables")
+def _dashboard_summaries(conn: Connection) -> None:
+    # As shipped: the tables get `deleted_at` and the triggers that read it
+    # in migration 6.
+    dashboard.install(conn, soft_delete=False)
+    dashboard.rebuild(conn, soft_delete=False)
+
+
+@migration(4, "full-text search indexes on trainer and staff")
+def _search_indexes(conn: Connection) -> None:
+    search.install(conn)
+    search.rebuild(conn)
+
+
+FACILITY_FILTER_INDEXES = {
+    "ix_facility_city_state_abbr": "lower(city), lower(state_abbr)",
+    "ix_facility_state_abbr_city": "lower(state_abbr), lower(city)",
+    "ix_facility_state_city": "lower(state), lower(city)",
+    "ix_facility_zip_code": "zip_code",
+}
+
+
+@migration(5, "facility location and zip code indexes")
+def _facility_filter_indexes(conn: Connection) -> None:
+    for name, expression in FACILITY_FILTER_INDEXES.items():
+        create_index(conn, name, "facility", expression)
+
+
+@migration(6, "soft delete: deleted_at columns and indexes")
+def _soft_delete(conn: Connection) -> None:
+    for table in purge.TABLES:
+        add_column(conn, table, "deleted_at", "DATETIME")
+        create_index(
+            conn,
+            f"ix_{table}_deleted_at",
+            table,
+            "deleted_at",
+            where="deleted_at IS NOT NULL",
+        )
+    # The rollup triggers now skip soft-deleted rows.
+    for name in dashboard.trigger_names():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    dashboard.install(conn)
+    dashboard.rebuild(conn)
+
+
+@migration(7, "email verification status")
+def _email_status(conn: Connection) -> None:
+    # Existing rows went through the synchronous check (or an import that
+    # skipped it on purpose); treat them as verified rather than queue them all.
+    for table in verification.TABLES:
+        add_column(conn, table, "email_status", "VARCHAR(8)")
+        conn.exec_driver_sql(
+            f"UPDATE {table} SET email_status = 'VERIFIED' WHERE email_status IS NULL"
+        )
+        create_index(
+            conn,
+            f"ix_{table}_email_pending",
+            table,
+            "id",
+            where="email_status = 'PENDING'",
+        )
+
+
+@migration(8, "training appointment schedule index")
+def _appointment_schedule_index(conn: Connection) -> None:
+    create_index(
+        conn,
+        "ix_trainingappointment_trainer_id_start_end",
+        "trainingappointment",
+        'trainer_id, start, "end"',
+    )
+
+
+@migration(9, "unique emails among rows not soft-deleted")
+def _unique_live_emails(conn: Connection) -> None:
+    for table in ("owner", "manager", "trainer", "staff"):
+        name = f"ux_{table}_email_normalized"
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)
+        ).scalar()
+        if sql is not None and "WHERE" in sql.upper():
+            continue
+        # Replaced in one transaction: writers wait, nothing sees it missing.
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        create_index(
+            conn,
+            name,
+            table,
+            "lower(email)",
+            unique=True,
+            where="deleted_at IS NULL",
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from sqlmodel import SQLModel
+
+    from . import models  # noqa: F401  (registers the tables)
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations.")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status"])
+    parser.add_argument("--to", type=int, help="stop after this version")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        with engine.begin() as conn:
+            applied = set(applied_versions(conn))
+        for m in MIGRATIONS:
+            state = "applied" if m.version in applied else "pending"
+            print(f"{m.version:04d} {state:8} {m.name}")
+        return
+    # Tables that don't exist yet are created complete, with every index.
+    SQLModel.metadata.create_all(engine)
+    done = migrate(engine, args.to, log=print)
+    if not done:
+        print("database is up to date")
+
+
+if __name__ == "__main__":
+    main()
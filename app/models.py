@@ -1,11 +1,15 @@
 from typing import List, Optional
 from pydantic import constr, field_validator
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import StrEnum
-import dns.resolver
 
+from sqlalchemy import Index, func
 from sqlmodel import SQLModel, Field, Relationship
 
+# Create their summary tables and search indexes along with the schema.
+from . import dashboard, search  # noqa: F401
+from .mx import validate_email_domain, verification_deferred
+
 
 class Role(StrEnum):
     OWNER = "Owner"
@@ -17,11 +21,25 @@ class Role(StrEnum):
     VENDOR = "Vendor"
 
 
+class EmailStatus(StrEnum):
+    # MX lookup outcome for an owner's or manager's email, see
+    # app/verification.py. FAILED: the lookups kept timing out.
+    PENDING = "pending"
+    VERIFIED = "verified"
+    INVALID = "invalid"
+    FAILED = "failed"
+
+
+def initial_email_status() -> EmailStatus:
+    # Synchronous validation has already checked the domain.
+    return EmailStatus.PENDING if verification_deferred() else EmailStatus.VERIFIED
+
+
 class OwnerBase(SQLModel):
     name: constr(min_length=3, max_length=100)
     email: str
     role: Optional[Role] = Field(default=Role.OWNER)
-    created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    created_at: Optional[datetime] = Field(default_factory=datetime.now, index=True)
 
     @field_validator("name")
     def validate_name(cls, v):
@@ -32,19 +50,18 @@ class OwnerBase(SQLModel):
     @field_validator("email")
     def validate_email(cls, v):
         # Verify's that the email's domain has valid MX (Mail Exchange) records, indicating that it is capable of receiving emails.
-        domain = v.split("@")[1]
-        try:
-            dns.resolver.resolve(domain, "MX")
-        except dns.resolver.NoAnswer:
-            raise ValueError("Email domain has no MX records")
-
-        # TODO: Email verification logic should be handled by a separate service
-
-        return v.lower()
+        # Lookups are cached and shared across requests, see app/mx.py; with
+        # deferred verification they happen after the save (app/verification.py).
+        return validate_email_domain(v)
 
 
 class Owner(OwnerBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Set by a soft delete; the row is purged later, see app/purge.py.
+    deleted_at: Optional[datetime] = None
+    email_status: Optional[EmailStatus] = Field(
+        default_factory=initial_email_status
+    )
     # dashboard_data: Optional[DashboardData] = None
     facilities: List["Facility"] = Relationship(back_populates="owner")
     managers: List["Manager"] = Relationship(back_populates="owner")
@@ -72,6 +89,7 @@ class OwnerCreate(OwnerBase):
 
 class OwnerRead(OwnerBase):
     id: int
+    email_status: Optional[EmailStatus] = None
 
 
 class OwnerUpdate(SQLModel):
@@ -85,9 +103,9 @@ class ManagerBase(SQLModel):
     name: constr(min_length=3, max_length=100)
     email: str
     role: Optional[Role] = Field(default=Role.MANAGER)
-    created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    created_at: Optional[datetime] = Field(default_factory=datetime.now, index=True)
 
-    owner_id: Optional[int] = Field(default=None, foreign_key="owner.id")
+    owner_id: Optional[int] = Field(default=None, foreign_key="owner.id", index=True)
 
     @field_validator("name")
     def validate_name(cls, v):
@@ -98,19 +116,18 @@ class ManagerBase(SQLModel):
     @field_validator("email")
     def validate_email(cls, v):
         # Verify's that the email's domain has valid MX (Mail Exchange) records, indicating that it is capable of receiving emails.
-        domain = v.split("@")[1]
-        try:
-            dns.resolver.resolve(domain, "MX")
-        except dns.resolver.NoAnswer:
-            raise ValueError("Email domain has no MX records")
-
-        # TODO: Email verification logic should be handled by a separate service
-
-        return v.lower()
+        # Lookups are cached and shared across requests, see app/mx.py; with
+        # deferred verification they happen after the save (app/verification.py).
+        return validate_email_domain(v)
 
 
 class Manager(ManagerBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Set by a soft delete; the row is purged later, see app/purge.py.
+    deleted_at: Optional[datetime] = None
+    email_status: Optional[EmailStatus] = Field(
+        default_factory=initial_email_status
+    )
     # financial_data: Optional[FinancialData] = None
     facilities: List["Facility"] = Relationship(back_populates="manager")
     staff: List["Staff"] = Relationship(back_populates="manager")
@@ -133,6 +150,7 @@ class Manager(ManagerBase, table=True):
 
 class ManagerRead(ManagerBase):
     id: int
+    email_status: Optional[EmailStatus] = None
 
 
 class ManagerCreate(ManagerBase):
@@ -157,8 +175,10 @@ class FacilityBase(SQLModel):
     state_abbr: Optional[str]
     zip_code: str
 
-    owner_id: int = Field(default=None, foreign_key="owner.id")
-    manager_id: Optional[int] = Field(default=None, foreign_key="manager.id")
+    owner_id: int = Field(default=None, foreign_key="owner.id", index=True)
+    manager_id: Optional[int] = Field(
+        default=None, foreign_key="manager.id", index=True
+    )
 
     @field_validator("zip_code")
     def must_be_valid_zip_code(cls, v):
@@ -192,7 +212,9 @@ class FacilityBase(SQLModel):
 
 class Facility(FacilityBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    created_at: Optional[datetime] = Field(default_factory=datetime.now, index=True)
+    # Set by a soft delete; the row is purged later, see app/purge.py.
+    deleted_at: Optional[datetime] = None
 
     owner: Owner = Relationship(back_populates="facilities")
     manager: Optional[Manager] = Relationship(back_populates="facilities")
@@ -226,18 +248,23 @@ class TrainerBase(SQLModel):
     email: Optional[str] = None
     bio: Optional[str] = None
     role: Optional[Role] = Field(default=Role.TRAINER)
-    created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    created_at: Optional[datetime] = Field(default_factory=datetime.now, index=True)
     employment_date: Optional[datetime] = Field(default_factory=datetime.now)
 
-    owner_id: Optional[int] = Field(default=None, foreign_key="owner.id")
-    manager_id: Optional[int] = Field(default=None, foreign_key="manager.id")
-    facility_id: Optional[int] = Field(default=None, foreign_key="facility.id")
+    owner_id: Optional[int] = Field(default=None, foreign_key="owner.id", index=True)
+    manager_id: Optional[int] = Field(
+        default=None, foreign_key="manager.id", index=True
+    )
+    facility_id: Optional[int] = Field(
+        default=None, foreign_key="facility.id", index=True
+    )
 
 
 class Trainer(TrainerBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Set by a soft delete; the row is purged later, see app/purge.py.
+    deleted_at: Optional[datetime] = None
 
-    # appointments: List["TrainingAppointment"] = Relationship(back_populates="trainer")
     owner: Optional[Owner] = Relationship(back_populates="trainers")
     manager: Optional[Manager] = Relationship(back_populates="trainers")
     facility: Optional[Facility] = Relationship(back_populates="trainers")
@@ -274,29 +301,37 @@ class TrainerUpdate(SQLModel):
 #     "facility_id": 1,
 # }
 
-# class TrainingAppointmentBase(SQLModel):
-#     trainer_id: int = Field(foreign_key="trainer.id")
-#     appointment_time: datetime
+class TrainingAppointmentBase(SQLModel):
+    trainer_id: int = Field(foreign_key="trainer.id")
+    start: datetime
+    end: datetime
 
 
-# class TrainingAppointment(TrainingAppointmentBase, table=True):
-#     id: Optional[int] = Field(default=None, primary_key=True)
-#     # member_id: int = Field(foreign_key="member.id")
-#     trainer: Trainer = Relationship(back_populates="appointments")
+class TrainingAppointment(TrainingAppointmentBase, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # member_id: int = Field(foreign_key="member.id")
 
 
-# class TrainingAppointmentRead(TrainingAppointmentBase):
-#     id: int
+class TrainingAppointmentRead(TrainingAppointmentBase):
+    id: int
 
 
-# class TrainingAppointmentCreate(TrainingAppointmentBase):
-#     pass
+def naive_utc(value: datetime) -> datetime:
+    """`value` as stored: naive, in UTC when it carries an offset."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
 
 
-# class TrainingAppointmentUpdate(SQLModel):
-#     id: Optional[int] = None
-#     trainer_id: Optional[int] = None
-#     appointment_time: Optional[datetime] = None
+class TrainingAppointmentCreate(SQLModel):
+    trainer_id: int
+    start: datetime
+    # At most 8 hours, see MAX_DURATION in app/appointments.py.
+    duration_minutes: int = Field(ge=1, le=480)
+
+    @field_validator("start")
+    def validate_start(cls, v):
+        return naive_utc(v)
 
 
 class StaffBase(SQLModel):
@@ -304,16 +339,20 @@ class StaffBase(SQLModel):
     email: str
     bio: Optional[str] = None
     role: Optional[Role] = Field(default=Role.STAFF)
-    created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    created_at: Optional[datetime] = Field(default_factory=datetime.now, index=True)
 
-    owner_id: Optional[int] = Field(default=None, foreign_key="owner.id")
-    manager_id: Optional[int] = Field(default=None, foreign_key="manager.id")
-    facility_id: int = Field(default=None, foreign_key="facility.id")
+    owner_id: Optional[int] = Field(default=None, foreign_key="owner.id", index=True)
+    manager_id: Optional[int] = Field(
+        default=None, foreign_key="manager.id", index=True
+    )
+    facility_id: int = Field(default=None, foreign_key="facility.id", index=True)
 
 
 class Staff(StaffBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     employment_date: datetime = Field(default_factory=datetime.now)
+    # Set by a soft delete; the row is purged later, see app/purge.py.
+    deleted_at: Optional[datetime] = None
 
     owner: Owner = Relationship(back_populates="staff")
     manager: Manager = Relationship(back_populates="staff")
@@ -381,3 +420,62 @@ class StaffReadWithManager(StaffRead):
 
 class StaffReadWithFacility(StaffRead):
     facility: FacilityRead
+
+
+# One account per email address and table, ignoring case. Soft-deleted rows
+# don't count, so a deleted account can be created again before it is purged.
+# Existing databases get these (and the other indexes below) from
+# app/migrations.py.
+for _model in (Owner, Manager, Trainer, Staff):
+    Index(
+        f"ux_{_model.__tablename__}_email_normalized",
+        func.lower(_model.__table__.c.email),
+        unique=True,
+        sqlite_where=_model.__table__.c.deleted_at.is_(None),
+    )
+
+# Facility filters (app/filters.py): case-insensitive location lookups and zip
+# code prefixes are index range scans.
+facility_columns = Facility.__table__.c
+Index(
+    "ix_facility_city_state_abbr",
+    func.lower(facility_columns.city),
+    func.lower(facility_columns.state_abbr),
+)
+Index(
+    "ix_facility_state_abbr_city",
+    func.lower(facility_columns.state_abbr),
+    func.lower(facility_columns.city),
+)
+Index(
+    "ix_facility_state_city",
+    func.lower(facility_columns.state),
+    func.lower(facility_columns.city),
+)
+Index("ix_facility_zip_code", facility_columns.zip_code)
+
+# Soft-deleted rows waiting for the purge worker (app/purge.py). Partial, so
+# they stay as small as the backlog and cost live rows nothing.
+for _model in (Owner, Manager, Facility, Trainer, Staff):
+    Index(
+        f"ix_{_model.__tablename__}_deleted_at",
+        _model.__table__.c.deleted_at,
+        sqlite_where=_model.__table__.c.deleted_at.isnot(None),
+    )
+
+# Rows waiting for a deferred email verification (app/verification.py).
+for _model in (Owner, Manager):
+    Index(
+        f"ix_{_model.__tablename__}_email_pending",
+        _model.__table__.c.id,
+        sqlite_where=_model.__table__.c.email_status == EmailStatus.PENDING.name,
+    )
+
+# A trainer's schedule in time order, see app/appointments.py.
+appointment_columns = TrainingAppointment.__table__.c
+Index(
+    "ix_trainingappointment_trainer_id_start_end",
+    appointment_columns.trainer_id,
+    appointment_columns.start,
+    appointment_columns.end,
+)
@@ -0,0 +1,65 @@
+"""Multi-get: `GET /<path>/?ids=3,1,2` and `POST /<path>/lookup`.
+
+The rows for all the ids are fetched with one `SELECT ... WHERE id IN (...)`
+per `IN_CHUNK_SIZE` ids, instead of one request (and session) per id. Ids
+are deduplicated, rows come back in the order their ids were first given,
+and the ids without a row are listed in the `X-Missing-Ids` response header.
+The POST variant takes the ids as a JSON array in the body, for lists too
+long for a URL; both accept `?fields=` and `?expand=` like the list.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Type
+
+from fastapi import Body, HTTPException, Query, Response
+from sqlmodel import Session, SQLModel
+from sqlmodel.sql.expression import Select
+
+from .expand import chunks
+
+MISSING_IDS_HEADER = "X-Missing-Ids"
+
+
+def ids_query() -> Any:
+    return Query(
+        default=None,
+        description="Comma-separated ids to fetch, in this order, instead of a page",
+    )
+
+
+def ids_body() -> Any:
+    return Body(description="Ids to fetch, in this order", examples=[[3, 1, 2]])
+
+
+def parse_ids(ids: str) -> List[int]:
+    try:
+        return [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid ids: {exc}")
+
+
+def unique_ids(ids: Iterable[int], max_ids: Optional[int] = None) -> List[int]:
+    """`ids` without repeats, in first-seen order."""
+    unique = list(dict.fromkeys(ids))
+    if max_ids is not None and len(unique) > max_ids:
+        raise HTTPException(
+            status_code=413, detail=f"At most {max_ids} ids per request"
+        )
+    return unique
+
+
+def multi_get(
+    session: Session,
+    statement: Select,
+    model: Type[SQLModel],
+    ids: List[int],
+    response: Optional[Response] = None,
+) -> List[Any]:
+    """Rows of `statement` with the given ids, in that order; the ids without a
+    row go to the X-Missing-Ids header."""
+    found: Dict[int, Any] = {}
+    for chunk in chunks(ids):
+        for row in session.exec(statement.where(model.id.in_(chunk))):
+            found[row.id] = row
+    missing = [obj_id for obj_id in ids if obj_id not in found]
+    if response is not None and missing:
+        response.headers[MISSING_IDS_HEADER] = ",".join(map(str, missing))
+    return [found[obj_id] for obj_id in ids if obj_id in found]
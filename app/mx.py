@@ -0,0 +1,239 @@
+"""MX (Mail Exchange) lookups for email domain validation.
+
+Lookups go through a shared `MXResolver` that keeps an in-process LRU cache
+with separate TTLs for domains that have MX records and domains that don't,
+and makes concurrent lookups for the same domain wait on a single query.
+The backend doing the actual lookup is pluggable: `DNSBackend` queries the
+network, `StubBackend` answers from a table and never does.
+
+With `email_verification` set to "deferred" the validators only check that an
+email has a domain; app/verification.py resolves it after the row is saved.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+from .settings import settings
+
+
+class DNSBackend:
+    """Resolve MX records over the network with dnspython."""
+
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout
+
+    def lookup(self, domain: str) -> bool:
+        try:
+            dns.resolver.resolve(domain, "MX", lifetime=self.timeout)
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+            return False
+        return True
+
+    async def alookup(self, domain: str) -> bool:
+        try:
+            await dns.asyncresolver.resolve(domain, "MX", lifetime=self.timeout)
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+            return False
+        return True
+
+
+class StubBackend:
+    """Answer MX lookups from a table, without touching the network.
+
+    Domains missing from `records` get `default`. `calls` counts lookups that
+    reached the backend, which is handy for asserting on cache behaviour.
+    Every lookup takes `delay` seconds, and the first `failures[domain]`
+    lookups of a domain time out, like a slow or flaky resolver would.
+    """
+
+    def __init__(
+        self,
+        records: Optional[Dict[str, bool]] = None,
+        default: bool = True,
+        delay: float = 0.0,
+        failures: Optional[Dict[str, int]] = None,
+    ):
+        self.records = {k.lower(): v for k, v in (records or {}).items()}
+        self.default = default
+        self.delay = delay
+        self.failures = {k.lower(): v for k, v in (failures or {}).items()}
+        self.calls = 0
+
+    def _answer(self, domain: str) -> bool:
+        self.calls += 1
+        if self.failures.get(domain, 0) > 0:
+            self.failures[domain] -= 1
+            raise dns.exception.Timeout()
+        return self.records.get(domain, self.default)
+
+    def lookup(self, domain: str) -> bool:
+        if self.delay:
+            time.sleep(self.delay)
+        return self._answer(domain)
+
+    async def alookup(self, domain: str) -> bool:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._answer(domain)
+
+
+class MXCache:
+    """Thread-safe LRU cache of domain -> has-MX answers with per-answer TTLs."""
+
+    def __init__(self, maxsize: int, positive_ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, domain: str) -> Optional[bool]:
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is None:
+                return None
+            has_mx, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[domain]
+                return None
+            self._entries.move_to_end(domain)
+            return has_mx
+
+    def set(self, domain: str, has_mx: bool) -> None:
+        ttl = self.positive_ttl if has_mx else self.negative_ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[domain] = (has_mx, time.monotonic() + ttl)
+            self._entries.move_to_end(domain)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MXResolver:
+    def __init__(self, backend, cache: MXCache):
+        self.backend = backend
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[Tuple[int, str], "asyncio.Task[bool]"] = {}
+
+    def has_mx(self, domain: str) -> bool:
+        domain = domain.strip().lower()
+        cached = self.cache.get(domain)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            cached = self.cache.get(domain)
+            if cached is not None:
+                return cached
+            call = self._inflight.get(domain)
+            leader = call is None
+            if leader:
+                call = self._inflight[domain] = Future()
+        if not leader:
+            return call.result()
+
+        try:
+            has_mx = self.backend.lookup(domain)
+        except BaseException as exc:
+            # Transient failures (timeouts, no nameservers) are not cached.
+            call.set_exception(exc)
+            raise
+        else:
+            self.cache.set(domain, has_mx)
+            call.set_result(has_mx)
+            return has_mx
+        finally:
+            with self._lock:
+                self._inflight.pop(domain, None)
+
+    async def ahas_mx(self, domain: str) -> bool:
+        domain = domain.strip().lower()
+        cached = self.cache.get(domain)
+        if cached is not None:
+            return cached
+
+        # Tasks are bound to their event loop, so only coalesce within one.
+        key = (id(asyncio.get_running_loop()), domain)
+        task = self._ainflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._alookup(key, domain))
+            self._ainflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _alookup(self, key: Tuple[int, str], domain: str) -> bool:
+        try:
+            has_mx = await self.backend.alookup(domain)
+            self.cache.set(domain, has_mx)
+            return has_mx
+        finally:
+            self._ainflight.pop(key, None)
+
+
+def make_backend(name: str):
+    if name == "dns":
+        return DNSBackend(timeout=settings.mx_timeout)
+    if name == "stub":
+        return StubBackend(
+            default=settings.mx_stub_default, delay=settings.mx_stub_delay
+        )
+    raise ValueError(f"Unknown MX backend: {name!r}")
+
+
+resolver = MXResolver(
+    make_backend(settings.mx_backend),
+    MXCache(settings.mx_cache_size, settings.mx_positive_ttl, settings.mx_negative_ttl),
+)
+
+
+def set_backend(backend) -> None:
+    """Swap the backend of the shared resolver and drop cached answers."""
+    resolver.backend = backend
+    resolver.cache.clear()
+
+
+def _email_domain(email: str) -> str:
+    local, sep, domain = email.rpartition("@")
+    if not sep or not local or not domain:
+        raise ValueError("Email must contain a local part and a domain")
+    return domain
+
+
+def verification_deferred() -> bool:
+    return settings.email_verification == "deferred"
+
+
+def validate_email_domain(email: str) -> str:
+    """Check that the email's domain has MX records and return it lowercased.
+
+    When verification is deferred only the email's shape is checked here.
+    """
+    domain = _email_domain(email)
+    if not verification_deferred() and not resolver.has_mx(domain):
+        raise ValueError("Email domain has no MX records")
+    return email.lower()
+
+
+async def averify_email_domain(email: str) -> bool:
+    """Async counterpart of `validate_email_domain` for async handlers.
+
+    Resolving here first warms the shared cache, so the model validators that
+    run afterwards don't block on the network.
+    """
+    return await resolver.ahas_mx(_email_domain(email))
@@ -0,0 +1,157 @@
+"""Keyset (cursor) pagination for the list endpoints.
+
+Pages are ordered by `id`, or by `(created_at, id)` with the rows without a
+`created_at` first, and the next page starts strictly after the last row of
+the previous one (`WHERE id > :last_id`), so the database seeks straight to
+it through the index instead of scanning and discarding `offset` rows. Rows
+inserted while a client is paging can't shift rows between pages the way
+they do with offsets.
+
+The cursor for the next page is returned in the `X-Next-Cursor` response
+header; it is absent on the last page. `offset` still works as a legacy mode.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from enum import StrEnum
+from typing import Any, List, Optional, Type
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import or_, tuple_
+from sqlmodel import Session, SQLModel
+from sqlmodel.sql.expression import Select
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class SortKey(StrEnum):
+    ID = "id"
+    CREATED_AT = "created_at"
+
+
+def cursor_query() -> Any:
+    return Query(
+        default=None, description="Value of X-Next-Cursor from the previous page"
+    )
+
+
+class KeysetParams:
+    """Order and starting point of a scan; the export endpoints, which stream
+    everything after the cursor, take only these."""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = cursor_query(),
+        order_by: SortKey = SortKey.ID,
+    ):
+        self.cursor = cursor
+        self.order_by = order_by
+
+
+class PageParams(KeysetParams):
+    """Query parameters shared by every list endpoint."""
+
+    def __init__(
+        self,
+        offset: int = Query(default=0, ge=0, description="Legacy offset paging"),
+        limit: int = Query(default=100, ge=1, le=100),
+        cursor: Optional[str] = cursor_query(),
+        order_by: SortKey = SortKey.ID,
+    ):
+        if cursor is not None and offset:
+            raise HTTPException(
+                status_code=400, detail="Use either cursor or offset, not both"
+            )
+        super().__init__(cursor, order_by)
+        self.offset = offset
+        self.limit = limit
+
+
+def encode_values(key: str, values: List[Any]) -> str:
+    """Opaque cursor holding the sort `key` and the last row's `values`."""
+    payload = json.dumps({"k": key, "v": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_values(cursor: str, key: str) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        if payload["k"] != key:
+            raise ValueError("cursor was issued for a different order")
+        return list(payload["v"])
+    except (binascii.Error, ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {exc}")
+
+
+def encode_cursor(order_by: SortKey, row: Any) -> str:
+    if order_by == SortKey.CREATED_AT:
+        created_at = row.created_at
+        values = [created_at and created_at.isoformat(), row.id]
+    else:
+        values = [row.id]
+    return encode_values(order_by.value, values)
+
+
+def decode_cursor(cursor: str, order_by: SortKey) -> List[Any]:
+    values = decode_values(cursor, order_by.value)
+    try:
+        if order_by == SortKey.CREATED_AT:
+            created_at = values[0] and datetime.fromisoformat(values[0])
+            return [created_at, int(values[1])]
+        return [int(values[0])]
+    except (ValueError, IndexError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {exc}")
+
+
+def keyset_columns(columns: Any, order_by: SortKey) -> tuple:
+    """Columns that define the page order; `columns` is a model or `table.c`."""
+    if order_by == SortKey.CREATED_AT:
+        return (columns.created_at, columns.id)
+    return (columns.id,)
+
+
+def apply_keyset(statement: Select, columns: Any, page: KeysetParams) -> Select:
+    """Order `statement` by the page key and start it after `page.cursor`."""
+    keys = keyset_columns(columns, page.order_by)
+    statement = statement.order_by(*keys)
+    if page.cursor is not None:
+        values = decode_cursor(page.cursor, page.order_by)
+        if len(keys) == 1:
+            statement = statement.where(keys[0] > values[0])
+        elif values[0] is None:
+            # SQLite sorts NULLs first: after the last page's row come the rest
+            # of the rows without a created_at, then every row with one.
+            statement = statement.where(or_(keys[0].isnot(None), keys[1] > values[1]))
+        else:
+            statement = statement.where(tuple_(*keys) > tuple_(*values))
+    return statement
+
+
+def page_statement(
+    statement: Select, model: Type[SQLModel], page: PageParams
+) -> Select:
+    """Apply ordering and cursor/offset paging to `statement`."""
+    statement = apply_keyset(statement, model, page)
+    if page.cursor is None and page.offset:
+        statement = statement.offset(page.offset)
+    return statement.limit(page.limit)
+
+
+def set_next_cursor(response: Optional[Response], rows: List[Any], page: PageParams):
+    if response is not None and rows and len(rows) == page.limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page.order_by, rows[-1])
+
+
+def paginate(
+    session: Session,
+    statement: Select,
+    model: Type[SQLModel],
+    page: PageParams,
+    response: Optional[Response] = None,
+) -> List[Any]:
+    """Run one page of `statement` and set the next page's cursor header."""
+    rows = session.exec(page_statement(statement, model, page)).all()
+    set_next_cursor(response, rows, page)
+    return rows
@@ -0,0 +1,241 @@
+"""Soft delete, and the background purge that cascades it.
+
+With `soft_delete` on (GYM_SOFT_DELETE=true), `DELETE /<entity>/{id}` only
+stamps the row's `deleted_at`, a one-row UPDATE. Every read path (get, list,
+multi-get, search, export, ?expand=, the dashboard, the reassign endpoints)
+filters on `deleted_at IS NULL`, so the row is gone for clients at once.
+
+`PurgeWorker` then removes the stamped rows ("tombstones") in the background,
+together with what depends on them, following CASCADES:
+
+    owner      its managers, facilities, trainers and staff are deleted
+    facility   its trainers and staff are deleted
+    manager    the facilities, trainers and staff it manages lose it
+    trainer    its training appointments are deleted
+
+Dependents are first stamped (or unlinked) and a row is only deleted once
+nothing references it any more, so there are never orphans. Every statement
+touches at most `purge_batch_size` rows and runs in its own transaction, so
+however many dependents an owner has, the SQLite write lock is only ever held
+for one batch; the worker pauses `purge_pause` seconds between batches to let
+requests in. Tombstones are found through partial indexes on `deleted_at`.
+
+`GET /purge` reports the tombstones left per table and what the worker has
+done so far. To purge everything now, e.g. with the worker disabled:
+
+    python -m app.purge
+"""
+import argparse
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+TABLES = ("owner", "manager", "facility", "trainer", "staff")
+
+DELETE = "delete"
+SET_NULL = "set null"
+# For children without soft delete of their own: deleted outright.
+PURGE = "purge"
+
+# Parent table -> (child table, foreign key, action) for every reference.
+CASCADES: Dict[str, List[Tuple[str, str, str]]] = {
+    "owner": [
+        ("manager", "owner_id", DELETE),
+        ("facility", "owner_id", DELETE),
+        ("trainer", "owner_id", DELETE),
+        ("staff", "owner_id", DELETE),
+    ],
+    "facility": [
+        ("trainer", "facility_id", DELETE),
+        ("staff", "facility_id", DELETE),
+    ],
+    "manager": [
+        ("facility", "manager_id", SET_NULL),
+        ("trainer", "manager_id", SET_NULL),
+        ("staff", "manager_id", SET_NULL),
+    ],
+    "trainer": [("trainingappointment", "trainer_id", PURGE)],
+}
+
+# Children before their parents, so a pass deletes a whole cascade.
+DELETE_ORDER = ("trainer", "staff", "facility", "manager", "owner")
+
+
+def live(columns: Any) -> Any:
+    """Condition excluding soft-deleted rows; `columns` is a model or `table.c`."""
+    return columns.deleted_at.is_(None)
+
+
+def _tombstones(table: str) -> str:
+    return f"SELECT id FROM {table} WHERE deleted_at IS NOT NULL"
+
+
+def cascade_statements() -> Iterator[Tuple[str, str, str]]:
+    """(kind, table, SQL) of one purge pass; each SQL changes at most :batch
+    rows and is repeated until it changes fewer."""
+    for parent in ("owner", "facility", "manager", "trainer"):
+        for child, key, action in CASCADES[parent]:
+            if action == PURGE:
+                yield "purged", child, (
+                    f"DELETE FROM {child} WHERE id IN (SELECT id FROM {child} "
+                    f"WHERE {key} IN ({_tombstones(parent)}) LIMIT :batch)"
+                )
+                continue
+            # Stamped children are purged themselves, before their parent.
+            children = (
+                f"SELECT id FROM {child} WHERE deleted_at IS NULL "
+                f"AND {key} IN ({_tombstones(parent)}) LIMIT :batch"
+            )
+            if action == DELETE:
+                yield "stamped", child, (
+                    f"UPDATE {child} SET deleted_at = :now WHERE id IN ({children})"
+                )
+            else:
+                yield "unlinked", child, (
+                    f"UPDATE {child} SET {key} = NULL WHERE id IN ({children})"
+                )
+    for table in DELETE_ORDER:
+        referenced = "".join(
+            f" AND NOT EXISTS (SELECT 1 FROM {child} WHERE {child}.{key} = "
+            f"{table}.id)"
+            for child, key, _ in CASCADES.get(table, [])
+        )
+        yield "purged", table, (
+            f"DELETE FROM {table} WHERE id IN ("
+            f"SELECT id FROM {table} WHERE deleted_at IS NOT NULL{referenced} "
+            f"LIMIT :batch)"
+        )
+
+
+def _statement(sql: str):
+    statement = text(sql)
+    if ":now" in sql:
+        statement = statement.bindparams(bindparam("now", type_=DateTime))
+    return statement
+
+
+STATEMENTS = [
+    (kind, table, _statement(sql)) for kind, table, sql in cascade_statements()
+]
+
+
+class PurgeStatus(SQLModel):
+    running: bool = False
+    # Soft-deleted rows not purged yet, per table.
+    pending: Dict[str, int] = {}
+    # Rows purged, stamped deleted through a cascade and unlinked from a
+    # deleted manager by this process, per table.
+    purged: Dict[str, int] = {}
+    stamped: Dict[str, int] = {}
+    unlinked: Dict[str, int] = {}
+    batches: int = 0
+    last_batch_at: Optional[datetime] = None
+
+
+def pending_counts(conn: Connection) -> Dict[str, int]:
+    return {
+        table: conn.exec_driver_sql(
+            f"SELECT count(*) FROM {table} WHERE deleted_at IS NOT NULL"
+        ).scalar()
+        for table in TABLES
+    }
+
+
+class PurgeWorker:
+    """Runs purge passes on `engine` in a daemon thread, see the module
+    docstring; idle, it looks for new tombstones every `interval` seconds.
+    `on_change(table)` is called after rows of `table` are stamped or
+    unlinked, i.e. changed for readers."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int = 500,
+        interval: float = 5.0,
+        pause: float = 0.01,
+        on_change: Optional[Callable[[str], None]] = None,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self.on_change = on_change
+        self.status = PurgeStatus()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_pass(self) -> int:
+        """Run every statement to exhaustion; returns the rows changed."""
+        total = 0
+        for kind, table, statement in STATEMENTS:
+            while not self._stop.is_set():
+                with self.engine.begin() as conn:
+                    params = {"batch": self.batch_size, "now": datetime.now()}
+                    count = conn.execute(statement, params).rowcount
+                if count:
+                    self._record(kind, table, count)
+                    total += count
+                if count < self.batch_size:
+                    break
+                time.sleep(self.pause)
+        return total
+
+    def _record(self, kind: str, table: str, count: int) -> None:
+        counts = getattr(self.status, kind)
+        counts[table] = counts.get(table, 0) + count
+        self.status.batches += 1
+        self.status.last_batch_at = datetime.now()
+        if kind != "purged" and self.on_change is not None:
+            self.on_change(table)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self.run_pass():
+                self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self.status.running = True
+        self._thread = threading.Thread(target=self._run, name="purge", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.status.running = False
+
+
+def purge_status(conn: Connection, worker: Optional[PurgeWorker]) -> PurgeStatus:
+    status = worker.status.model_copy() if worker else PurgeStatus()
+    status.pending = pending_counts(conn)
+    return status
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from . import cache, models  # noqa: F401  (registers the tables)
+    from .database import engine
+    from .settings import settings
+
+    parser = argparse.ArgumentParser(description="Purge soft-deleted rows.")
+    parser.parse_args(argv)
+
+    SQLModel.metadata.create_all(engine)
+    worker = PurgeWorker(
+        engine, settings.purge_batch_size, pause=0, on_change=cache.invalidate_table
+    )
+    while worker.run_pass():
+        pass
+    print(
+        f"purged {sum(worker.status.purged.values())} rows "
+        f"in {worker.status.batches} batches: {worker.status.purged}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Set-based reassignment of trainers and staff.
+
+Moving people between managers and facilities never loads them: each move is
+an `UPDATE <table> SET ... WHERE id IN (...)` (one per `IN_CHUNK_SIZE` ids)
+or `WHERE facility_id = :id`, all in the request's transaction, and the
+response reports how many rows each table had updated. It backs
+
+    PATCH /managers/{manager_id}       trainer_ids / staff_ids assign those
+                                       trainers / staff to the manager; the
+                                       counts are in the X-Rows-Affected header
+    POST  /trainers/reassign           {"ids": [...], "manager_id": ...,
+    POST  /staff/reassign               "facility_id": ...}
+    POST  /facilities/{facility_id}/reassign
+                                       {"manager_id": ...} hands the facility
+                                       and everyone working there to a manager
+
+Rows that don't exist, or are soft-deleted, are skipped and not counted. The
+manager or facility moved to must exist (404 otherwise), as SQLite doesn't
+enforce the foreign keys here.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Response
+from sqlalchemy import exists, select, update
+from sqlmodel import Session, SQLModel
+
+from .expand import chunks
+from .models import Facility, Manager, Staff, Trainer
+from .purge import live
+
+ROWS_AFFECTED_HEADER = "X-Rows-Affected"
+
+
+@dataclass(frozen=True)
+class Assignment:
+    # `<field>` of the *Update model holds ids of `model` rows whose `column`
+    # is set to the id of the row being updated.
+    field: str
+    model: Type[SQLModel]
+    column: str
+
+
+class Reassignment(SQLModel):
+    ids: List[int]
+    manager_id: Optional[int] = None
+    facility_id: Optional[int] = None
+
+
+class FacilityReassignment(SQLModel):
+    # None leaves the facility and its people without a manager.
+    manager_id: Optional[int]
+
+
+class ReassignResult(SQLModel):
+    # Rows updated per table.
+    updated: Dict[str, int] = {}
+
+
+def require(session: Session, model: Type[SQLModel], obj_id: Optional[int]) -> None:
+    if obj_id is None:
+        return
+    statement = select(exists().where(model.id == obj_id, live(model)))
+    found = session.execute(statement).scalar()
+    if not found:
+        raise HTTPException(status_code=404, detail=f"{model.__name__} not found")
+
+
+def _update(session: Session, model: Type[SQLModel], where: Any, values) -> int:
+    statement = (
+        update(model)
+        .where(where, live(model))
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+    return session.execute(statement).rowcount
+
+
+def reassign(
+    session: Session, model: Type[SQLModel], ids: List[int], values: Dict[str, Any]
+) -> int:
+    """Set `values` on the rows of `model` with these ids; returns rows updated."""
+    ids = sorted(set(ids))
+    return sum(
+        _update(session, model, model.id.in_(chunk), values) for chunk in chunks(ids)
+    )
+
+
+def assign_from_update(
+    session: Session,
+    assignments: Tuple[Assignment, ...],
+    obj_id: int,
+    item: SQLModel,
+    response: Optional[Response] = None,
+) -> Dict[str, int]:
+    """Run the `assignments` whose field is set on the *Update `item`; the rows
+    updated per table also go to the X-Rows-Affected header."""
+    given = item.model_dump(exclude_unset=True)
+    counts = {}
+    for assignment in assignments:
+        if given.get(assignment.field) is not None:
+            counts[assignment.model.__tablename__] = reassign(
+                session,
+                assignment.model,
+                given[assignment.field],
+                {assignment.column: obj_id},
+            )
+    if response is not None and counts:
+        response.headers[ROWS_AFFECTED_HEADER] = ",".join(
+            f"{table}={count}" for table, count in counts.items()
+        )
+    return counts
+
+
+def reassign_people(
+    session: Session, model: Type[SQLModel], reassignment: Reassignment
+) -> ReassignResult:
+    values = reassignment.model_dump(exclude={"ids"}, exclude_unset=True)
+    if not values:
+        raise HTTPException(
+            status_code=422, detail="Give a manager_id and/or a facility_id"
+        )
+    require(session, Manager, values.get("manager_id"))
+    require(session, Facility, values.get("facility_id"))
+    count = reassign(session, model, reassignment.ids, values)
+    session.commit()
+    return ReassignResult(updated={model.__tablename__: count})
+
+
+def reassign_facility(
+    session: Session, facility_id: int, reassignment: FacilityReassignment
+) -> ReassignResult:
+    require(session, Facility, facility_id)
+    require(session, Manager, reassignment.manager_id)
+    values = {"manager_id": reassignment.manager_id}
+    updated = {
+        "facility": _update(session, Facility, Facility.id == facility_id, values)
+    }
+    for model in (Trainer, Staff):
+        updated[model.__tablename__] = _update(
+            session, model, model.facility_id == facility_id, values
+        )
+    session.commit()
+    return ReassignResult(updated=updated)
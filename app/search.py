@@ -0,0 +1,185 @@
+"""Full-text search for `GET /trainers/search` and `GET /staff/search`.
+
+Each searchable table has an FTS5 index over its name, bio and email, as an
+external-content table (`<table>_fts`) that stores only the index, not a
+second copy of the rows. Triggers update it on every INSERT, DELETE and
+UPDATE of an indexed column, the same way the dashboard rollups are kept
+(app/dashboard.py), and migration 4 builds it for existing databases. It can
+be rebuilt from the table at any time with
+
+    python -m app.search rebuild
+
+Queries match every word of `q` as a prefix ("kettle" finds "kettlebell"),
+rank with bm25 weighting a hit in the name above the email and the bio, and
+page with a cursor on (rank, id).
+"""
+import argparse
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Float, Integer, event, select, text, tuple_
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, SQLModel
+
+from .pagination import NEXT_CURSOR_HEADER, decode_values, encode_values
+from .purge import live
+
+# Table -> indexed columns and their bm25 weights.
+SEARCHABLE: Dict[str, Tuple[Tuple[str, float], ...]] = {
+    "trainer": (("name", 10.0), ("bio", 1.0), ("email", 5.0)),
+    "staff": (("name", 10.0), ("bio", 1.0), ("email", 5.0)),
+}
+
+CURSOR_KEY = "rank"
+
+
+def _fts(table: str) -> str:
+    return f"{table}_fts"
+
+
+def _columns(table: str) -> List[str]:
+    return [name for name, _ in SEARCHABLE[table]]
+
+
+def index_ddl(table: str) -> List[str]:
+    fts, columns = _fts(table), _columns(table)
+    names = ", ".join(columns)
+
+    def values(row: str) -> str:
+        return ", ".join([f"{row}.id"] + [f"{row}.{name}" for name in columns])
+
+    insert = f"INSERT INTO {fts} (rowid, {names}) VALUES ({values('new')});"
+    delete = (
+        f"INSERT INTO {fts} ({fts}, rowid, {names}) "
+        f"VALUES ('delete', {values('old')});"
+    )
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, "
+        f"content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update "
+        f"AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+def install(conn: Connection) -> None:
+    """Create the search indexes and their triggers unless they exist."""
+    for table in SEARCHABLE:
+        for ddl in index_ddl(table):
+            conn.exec_driver_sql(ddl)
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def _install_after_create(target, connection, **kw):
+    install(connection)
+
+
+def rebuild(conn: Connection) -> None:
+    """Re-index every searchable table from its rows."""
+    for table in SEARCHABLE:
+        fts = _fts(table)
+        conn.exec_driver_sql(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def match_query(q: str) -> str:
+    """FTS5 query requiring every word of `q`, each as a prefix."""
+    # Only word characters reach FTS5, so user input can't be FTS5 syntax.
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", q))
+
+
+class SearchParams:
+    """Query parameters of the search endpoints."""
+
+    def __init__(
+        self,
+        q: str = Query(min_length=1, max_length=200, description="Words to find"),
+        facility_id: Optional[int] = None,
+        limit: int = Query(default=20, ge=1, le=100),
+        cursor: Optional[str] = Query(
+            default=None, description="Value of X-Next-Cursor from the previous page"
+        ),
+    ):
+        self.q = q
+        self.facility_id = facility_id
+        self.limit = limit
+        self.cursor = cursor
+
+
+def search_statement(model: Type[SQLModel], params: SearchParams, match: str):
+    table = model.__table__
+    fts = _fts(table.name)
+    weights = ", ".join(str(weight) for _, weight in SEARCHABLE[table.name])
+    hits = (
+        text(
+            f"SELECT rowid AS id, bm25({fts}, {weights}) AS score "
+            f"FROM {fts} WHERE {fts} MATCH :match"
+        )
+        .bindparams(match=match)
+        .columns(id=Integer, score=Float)
+        .subquery("hits")
+    )
+    statement = (
+        select(*table.c, hits.c.score)
+        .join_from(table, hits, hits.c.id == table.c.id)
+        .where(live(table.c))
+        .order_by(hits.c.score, hits.c.id)
+        .limit(params.limit)
+    )
+    if params.facility_id is not None:
+        statement = statement.where(table.c.facility_id == params.facility_id)
+    if params.cursor is not None:
+        score, id = _decode(params.cursor)
+        statement = statement.where(
+            tuple_(hits.c.score, hits.c.id) > tuple_(score, id)
+        )
+    return statement
+
+
+def _decode(cursor: str) -> Tuple[float, int]:
+    values = decode_values(cursor, CURSOR_KEY)
+    try:
+        return float(values[0]), int(values[1])
+    except (ValueError, IndexError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {exc}")
+
+
+def search(
+    session: Session,
+    model: Type[SQLModel],
+    params: SearchParams,
+    response: Optional[Response] = None,
+) -> List[Any]:
+    """Ranked rows of `model` matching `params.q`, one page at a time."""
+    match = match_query(params.q)
+    if not match:
+        return []
+    rows = session.exec(search_statement(model, params, match)).all()
+    if response is not None and len(rows) == params.limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_values(
+            CURSOR_KEY, [last.score, last.id]
+        )
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from . import models  # noqa: F401  (registers the tables)
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the search indexes.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        rebuild(conn)
+    print(f"rebuilt the search indexes of {', '.join(SEARCHABLE)}")
+
+
+if __name__ == "__main__":
+    main()
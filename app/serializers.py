@@ -0,0 +1,88 @@
+"""JSON bodies of the CRUD responses.
+
+By default a body is validated from the rows through its response model and
+dumped by pydantic-core in one pass, with a `TypeAdapter` cached per model.
+That still runs every field validator on the way out, including the email
+MX check, on rows the *Create/*Update validators already accepted.
+
+With `fast_json` on (GYM_FAST_JSON=true, needs `orjson`) rows are not
+validated again: a converter compiled once per response model copies each
+field off the row (an ORM object, a result row or a dict), recursing into
+nested models and lists, and orjson encodes the result. The bytes are the
+same as the default path's. Routes keep declaring their response models, so
+the OpenAPI schema doesn't change either way.
+"""
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter
+
+from .settings import settings
+
+try:
+    import orjson
+except ImportError:  # only needed with fast_json
+    orjson = None
+
+Converter = Callable[[Any], Any]
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def _model_converter(model: type) -> Converter:
+    names = tuple(model.model_fields)
+    nested = [
+        (name, convert)
+        for name, info in model.model_fields.items()
+        if (convert := _converter(info.annotation)) is not None
+    ]
+
+    def convert_model(obj: Any) -> dict:
+        if isinstance(obj, dict):
+            item = {name: obj.get(name) for name in names}
+        else:
+            item = {name: getattr(obj, name) for name in names}
+        for name, convert in nested:
+            item[name] = convert(item[name])
+        return item
+
+    return convert_model
+
+
+def _converter(annotation: Any) -> Optional[Converter]:
+    """Converter for values of `annotation`, or None when orjson takes them as
+    they are (str, int, datetime, enums, ...)."""
+    origin = get_origin(annotation)
+    if origin in (list, List):
+        convert_item = _converter(get_args(annotation)[0])
+        if convert_item is None:
+            return list
+        return lambda values: [convert_item(value) for value in values]
+    if origin is Union:
+        inner = [arg for arg in get_args(annotation) if arg is not type(None)]
+        convert_inner = _converter(inner[0]) if len(inner) == 1 else None
+        if convert_inner is None:
+            return None
+        return lambda value: None if value is None else convert_inner(value)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _model_converter(annotation)
+    return None
+
+
+@lru_cache(maxsize=None)
+def compiled(response_model: Any) -> Converter:
+    """Function turning rows into plain values orjson can encode."""
+    return _converter(response_model) or (lambda value: value)
+
+
+def dump_json(response_model: Any, content: Any) -> bytes:
+    """`content` rendered as `response_model`, see the module docstring."""
+    if settings.fast_json:
+        if orjson is None:
+            raise RuntimeError("fast_json needs the orjson package")
+        return orjson.dumps(compiled(response_model)(content))
+    adapter = _adapter(response_model)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
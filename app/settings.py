@@ -0,0 +1,159 @@
+import os
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, Optional
+
+
+ENV_PREFIX = "GYM_"
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Application settings.
+
+    Every field can be set from a GYM_<FIELD NAME> environment variable, e.g.
+    GYM_DB_ECHO=false. GYM_PROFILE picks a named profile from PROFILES whose
+    values replace the defaults below; environment variables win over both.
+    """
+
+    profile: str = "dev"
+
+    # "sync" serves the CRUD routes from def handlers on the threadpool with
+    # Session, "async" from async def handlers with AsyncSession (aiosqlite).
+    db_mode: str = "sync"
+    db_url: str = "sqlite:///db.sqlite3"
+    db_echo: bool = True
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+
+    # Applied with PRAGMA on every new SQLite connection; empty means leave
+    # SQLite's default alone.
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5_000
+    sqlite_mmap_size: int = 0
+    # Negative values are KiB, positive values are pages.
+    sqlite_cache_size: int = -2_000
+
+    # Request/SQL metrics on /metrics and the Server-Timing header. Statements
+    # slower than slow_query_ms are logged (0 disables the slow query log).
+    metrics_enabled: bool = True
+    slow_query_ms: float = 200.0
+    slow_query_log_params: bool = True
+
+    # MX lookups used by email validation: "dns" queries the network, "stub"
+    # never does (tests, air-gapped deployments).
+    mx_backend: str = "dns"
+    mx_stub_default: bool = True
+    mx_cache_size: int = 10_000
+    mx_positive_ttl: float = 3600.0
+    mx_negative_ttl: float = 300.0
+    mx_timeout: float = 5.0
+    # Seconds every stub lookup takes, to stand in for a slow resolver.
+    mx_stub_delay: float = 0.0
+
+    # "sync" checks the MX records of new owners and managers in their
+    # validators, on the request path. "deferred" accepts them with
+    # email_status=pending and leaves the check to a background pool of
+    # email_verify_workers threads (see app/verification.py), which looks up
+    # the domains of up to email_verify_batch_size pending rows at a time and
+    # retries failed lookups email_verify_retries times.
+    email_verification: str = "sync"
+    email_verify_workers: int = 4
+    email_verify_batch_size: int = 100
+    email_verify_retries: int = 3
+    email_verify_retry_delay: float = 0.5
+    email_verify_interval: float = 1.0
+
+    # Largest array accepted by the POST /<entity>/bulk endpoints.
+    bulk_max_items: int = 5_000
+    # Rows fetched per round trip by the GET /<entity>/export streams.
+    export_batch_size: int = 1_000
+    # Most ids one GET ?ids= or POST /<entity>/lookup request may ask for.
+    multi_get_max_ids: int = 5_000
+
+    # Response cache for the GET routes (see app/cache.py): "" disables it,
+    # "memory" keeps an in-process LRU, "redis" shares it between workers.
+    cache_backend: str = ""
+    cache_max_entries: int = 10_000
+    # Seconds an entry may be served for; 0 keeps it until invalidated.
+    cache_ttl: float = 0.0
+    cache_url: str = "redis://localhost:6379/0"
+
+    # DELETE only stamps deleted_at; a background worker then purges the row
+    # and its dependents in batches (see app/purge.py). 0 batch pause means
+    # none, purge_interval is how often an idle worker looks for deletions.
+    soft_delete: bool = False
+    purge_batch_size: int = 500
+    purge_pause: float = 0.01
+    purge_interval: float = 5.0
+
+    # Run the create and update handlers' writes on one writer thread that
+    # commits them in groups of up to write_batch_max, waiting at most
+    # write_batch_delay_ms for a group to fill (see app/writes.py).
+    write_coalescing: bool = False
+    write_batch_max: int = 64
+    write_batch_delay_ms: float = 2.0
+
+    # Admission control (see app/admission.py). threadpool_size is the number
+    # of threads running the sync handlers (0 keeps AnyIO's 40). At most
+    # admission_read_limit GET and admission_write_limit other requests are
+    # handled at once (0: no limit); admission_route_limits gives routes their
+    # own limit, e.g. "POST /trainers/bulk=2,GET /trainers/export=4". Requests
+    # that wait longer than admission_max_queue_ms for a slot, or that find
+    # admission_max_queue (0: no limit) already waiting, get a 503 with
+    # Retry-After: admission_retry_after seconds.
+    threadpool_size: int = 0
+    admission_read_limit: int = 0
+    admission_write_limit: int = 0
+    admission_route_limits: str = ""
+    admission_max_queue: int = 0
+    admission_max_queue_ms: float = 1000.0
+    admission_retry_after: int = 1
+
+    # Encode responses with orjson from converters compiled per response
+    # model instead of re-validating the rows (see app/serializers.py).
+    fast_json: bool = False
+
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "dev": {},
+    # In-memory database shared by every connection, no network access.
+    "test": {
+        "db_url": "sqlite://",
+        "db_echo": False,
+        "sqlite_journal_mode": "",
+        "sqlite_synchronous": "",
+        "mx_backend": "stub",
+    },
+    "prod": {
+        "db_echo": False,
+        "db_pool_size": 20,
+        "db_max_overflow": 20,
+        "sqlite_mmap_size": 256 * 1024 * 1024,
+        "sqlite_cache_size": -64_000,
+    },
+}
+
+
+def _parse(value: str, default: Any) -> Any:
+    if isinstance(default, bool):
+        return value.strip().lower() in {"1", "true", "yes", "on"}
+    return type(default)(value)
+
+
+def load_settings(profile: Optional[str] = None) -> Settings:
+    profile = profile or os.environ.get(f"{ENV_PREFIX}PROFILE", Settings.profile)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown settings profile: {profile!r}")
+
+    values = replace(Settings(profile=profile), **PROFILES[profile])
+    overrides = {}
+    for field in fields(Settings):
+        raw = os.environ.get(f"{ENV_PREFIX}{field.name.upper()}")
+        if raw is not None and field.name != "profile":
+            overrides[field.name] = _parse(raw, getattr(values, field.name))
+    return replace(values, **overrides)
+
+
+settings = load_settings()
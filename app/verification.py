@@ -0,0 +1,223 @@
+"""Deferred email verification for owners and managers.
+
+With `email_verification` set to "deferred" (GYM_EMAIL_VERIFICATION=deferred)
+the *Create validators no longer look up the email's MX records; the row is
+saved straight away with `email_status` "pending" and a slow resolver can't
+time a signup out. `EmailVerifier` then works through the pending rows in the
+background:
+
+- it reads them `email_verify_batch_size` at a time, in id order, through a
+  partial index on the pending rows;
+- it looks up each distinct domain of the batch once, on a pool of
+  `email_verify_workers` threads, through the shared resolver of app/mx.py
+  (so answers are cached and shared with the sync mode);
+- a lookup that raises (timeout, no nameservers) is retried up to
+  `email_verify_retries` times with a doubling delay, and the rows of a
+  domain that never answered end up "failed";
+- the outcomes are written back in one transaction per batch, "verified" or
+  "invalid" (no MX records), unless the email was changed in the meantime.
+
+Changing an email with PATCH makes it pending again. `GET /email-verification`
+reports the rows still pending per table (the queue depth), the lookups in
+flight and what the worker has done so far.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine, Row
+from sqlmodel import SQLModel
+
+from . import mx
+from .models import EmailStatus
+
+TABLES = ("owner", "manager")
+
+PENDING = EmailStatus.PENDING.name
+
+
+def _pending_statement(table: str):
+    return text(
+        f"SELECT id, email FROM {table} WHERE email_status = '{PENDING}' "
+        f"AND deleted_at IS NULL AND id > :after ORDER BY id LIMIT :batch"
+    )
+
+
+def _update_statement(table: str):
+    # Skips rows whose email changed (and is pending again) since the read.
+    return text(
+        f"UPDATE {table} SET email_status = :status "
+        f"WHERE id = :id AND email = :email AND email_status = '{PENDING}'"
+    )
+
+
+PENDING_STATEMENTS = {table: _pending_statement(table) for table in TABLES}
+UPDATE_STATEMENTS = {table: _update_statement(table) for table in TABLES}
+
+
+class VerificationStatus(SQLModel):
+    mode: str = "sync"
+    running: bool = False
+    # Rows waiting for their check, per table.
+    pending: Dict[str, int] = {}
+    # Domains being looked up right now.
+    in_flight: int = 0
+    # Rows given each outcome by this process, per table.
+    verified: Dict[str, int] = {}
+    invalid: Dict[str, int] = {}
+    failed: Dict[str, int] = {}
+    lookups: int = 0
+    retries: int = 0
+    batches: int = 0
+    last_batch_at: Optional[datetime] = None
+
+
+def pending_counts(conn: Connection) -> Dict[str, int]:
+    return {
+        table: conn.exec_driver_sql(
+            f"SELECT count(*) FROM {table} WHERE email_status = '{PENDING}' "
+            f"AND deleted_at IS NULL"
+        ).scalar()
+        for table in TABLES
+    }
+
+
+def _domain(email: str) -> str:
+    return email.rpartition("@")[2].strip().lower()
+
+
+class EmailVerifier:
+    """Verifies pending emails on `engine` from a daemon thread, see the module
+    docstring; idle, it looks for new pending rows every `interval` seconds.
+    `on_change(table)` is called after a batch of `table` rows is updated."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        resolver: Optional[mx.MXResolver] = None,
+        workers: int = 4,
+        batch_size: int = 100,
+        retries: int = 3,
+        retry_delay: float = 0.5,
+        interval: float = 1.0,
+        on_change: Optional[Callable[[str], None]] = None,
+    ):
+        self.engine = engine
+        self.resolver = resolver or mx.resolver
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.interval = interval
+        self.on_change = on_change
+        self.status = VerificationStatus(mode="deferred")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def lookup(self, domain: str) -> EmailStatus:
+        """The outcome for `domain`, retrying lookups that raise."""
+        with self._lock:
+            self.status.in_flight += 1
+            self.status.lookups += 1
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    has_mx = self.resolver.has_mx(domain)
+                except Exception:
+                    if attempt == self.retries or self._stop.is_set():
+                        return EmailStatus.FAILED
+                    with self._lock:
+                        self.status.retries += 1
+                    self._stop.wait(self.retry_delay * 2**attempt)
+                else:
+                    return EmailStatus.VERIFIED if has_mx else EmailStatus.INVALID
+        finally:
+            with self._lock:
+                self.status.in_flight -= 1
+
+    def verify_batch(self, table: str, rows: List[Row]) -> int:
+        """Look up the domains of `rows` and store the outcomes; returns the
+        rows updated."""
+        domains = {_domain(row.email) for row in rows}
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, "email-verify")
+        outcomes = dict(zip(domains, self._pool.map(self.lookup, domains)))
+        results = [(row, outcomes[_domain(row.email)]) for row in rows]
+        statement = UPDATE_STATEMENTS[table]
+        with self.engine.begin() as conn:
+            stored = [
+                outcome
+                for row, outcome in results
+                if conn.execute(
+                    statement,
+                    {"id": row.id, "email": row.email, "status": outcome.name},
+                ).rowcount
+            ]
+        self._record(table, stored)
+        return len(stored)
+
+    def run_pass(self) -> int:
+        """Verify every row pending when the pass started; returns the rows
+        updated."""
+        total = 0
+        for table in TABLES:
+            after = 0
+            while not self._stop.is_set():
+                with self.engine.connect() as conn:
+                    params = {"after": after, "batch": self.batch_size}
+                    rows = conn.execute(PENDING_STATEMENTS[table], params).all()
+                if not rows:
+                    break
+                after = rows[-1].id
+                total += self.verify_batch(table, rows)
+        return total
+
+    def _record(self, table: str, outcomes: List[EmailStatus]) -> None:
+        with self._lock:
+            for outcome in outcomes:
+                counts = getattr(self.status, outcome.value)
+                counts[table] = counts.get(table, 0) + 1
+            self.status.batches += 1
+            self.status.last_batch_at = datetime.now()
+        if self.on_change is not None:
+            self.on_change(table)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self.run_pass():
+                self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self.status.running = True
+        self._thread = threading.Thread(
+            target=self._run, name="email-verify", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.status.running = False
+
+
+def verification_status(
+    conn: Connection, verifier: Optional[EmailVerifier], mode: str
+) -> VerificationStatus:
+    """`mode` is the configured `email_verification`, for when there is no
+    `verifier` running."""
+    if verifier is None:
+        status = VerificationStatus(mode=mode)
+    else:
+        with verifier._lock:
+            status = verifier.status.model_copy(deep=True)
+    status.pending = pending_counts(conn)
+    return status
@@ -0,0 +1,141 @@
+"""Group commit: many requests' writes committed in one transaction.
+
+SQLite has a single writer, so concurrent `POST /<entity>/` and
+`PATCH /<entity>/{id}` requests queue up on the write lock and each pays for
+its own commit (and, outside WAL with synchronous=NORMAL, fsync). With
+`write_coalescing` on (GYM_WRITE_COALESCING=true) those handlers hand their
+write to `WriteCoalescer` instead: one writer thread takes the writes queued
+within `write_batch_delay_ms` of each other, up to `write_batch_max` of them,
+and runs them in one `BEGIN IMMEDIATE ... COMMIT`.
+
+Every write runs in its own SAVEPOINT, so one that fails (a 404, a duplicate
+email) is rolled back alone and its request gets its own error while the
+rest of the batch commits; results are handed back only once the batch has
+committed. A write is a function of the writer's session that flushes and
+returns the serialized response, exactly like the handlers' own code path.
+
+Batch sizes, the time from a batch's first write being queued to its commit,
+and the time spent waiting for the write lock are on /metrics.
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from . import metrics
+
+
+@dataclass
+class _Write:
+    op: Callable[..., Any]
+    args: tuple
+    future: Future = field(default_factory=Future)
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class WriteCoalescer:
+    def __init__(self, engine: Engine, max_batch: int = 64, max_delay: float = 0.002):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, op: Callable[..., Any], *args: Any) -> Future:
+        """Queue `op(session, *args)`; the future gets its result once committed."""
+        write = _Write(op, args)
+        self._queue.put(write)
+        metrics.write_queue_depth.set(self._queue.qsize())
+        return write.future
+
+    def run(self, op: Callable[..., Any], *args: Any) -> Any:
+        return self.submit(op, *args).result()
+
+    async def arun(self, op: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(op, *args))
+
+    def _collect(self) -> Optional[List[_Write]]:
+        """The next batch, or None once stopped and drained."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                write = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if write is None:
+                # Stop after this batch.
+                self._queue.put(None)
+                break
+            batch.append(write)
+        metrics.write_queue_depth.set(self._queue.qsize())
+        return batch
+
+    def commit(self, batch: List[_Write]) -> None:
+        done, failed = [], []
+        with Session(self.engine) as session:
+            try:
+                started = time.perf_counter()
+                session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+                metrics.write_lock_wait.observe(time.perf_counter() - started)
+                for write in batch:
+                    savepoint = session.begin_nested()
+                    try:
+                        result = write.op(session, *write.args)
+                        savepoint.commit()
+                    except Exception as exc:
+                        savepoint.rollback()
+                        failed.append((write, exc))
+                    else:
+                        done.append((write, result))
+                session.commit()
+            except Exception as exc:
+                for write in batch:
+                    write.future.set_exception(exc)
+                return
+        metrics.write_batch_size.observe(len(batch))
+        metrics.write_batch_latency.observe(time.perf_counter() - batch[0].queued_at)
+        for write, exc in failed:
+            write.future.set_exception(exc)
+        for write, result in done:
+            write.future.set_result(result)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self.commit(batch)
+
+    def start(self) -> "WriteCoalescer":
+        self._thread = threading.Thread(target=self._run, name="writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Commit what is queued, then stop the writer thread."""
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+
+
+# Set by the app's lifespan when `write_coalescing` is on.
+coalescer: Optional[WriteCoalescer] = None
+
+
+def write(session: Session, op: Callable[..., Any], *args: Any) -> Any:
+    """Run `op(session, *args)` and commit, or hand it to the coalescer."""
+    if coalescer is not None:
+        return coalescer.run(op, *args)
+    result = op(session, *args)
+    session.commit()
+    return result
@@ -0,0 +1,492 @@
+"""Load/benchmark suite for the CRUD routes in app/main.py.
+
+Seeds a database at the requested scale (see benchmarks/seed.py), then drives
+every route in-process through ASGI with httpx, with the MX resolver stubbed
+out. For each route it reports p50/p95/p99 latency, requests per second and
+the peak RSS observed while the route was running, and writes the results as
+JSON so runs can be compared against a baseline:
+
+    python -m benchmarks.run --trainers 100k --output results.json
+    python -m benchmarks.run --trainers 100k --baseline results.json
+
+Environment variables (GYM_PROFILE, GYM_DB_MODE, ...) are honoured, so the
+same run can be repeated with e.g. GYM_DB_MODE=async to compare the two.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Request = Tuple[str, str, Dict[str, Any]]  # method, url, httpx kwargs
+
+
+@dataclass
+class Scenario:
+    method: str
+    route: str
+    make: Callable[[random.Random, "Context"], Request]
+    requests: Optional[int] = None
+    # Statuses other than 2xx that are expected, e.g. 404 after a delete.
+    ok_statuses: Tuple[int, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.route}"
+
+
+@dataclass
+class Context:
+    sizes: Dict[str, int]
+    # DELETE removes rows created earlier in the run (ids above the seeded
+    # range), so reads of random seeded ids never hit a deleted row.
+    next_delete: Dict[str, int] = field(default_factory=dict)
+
+    def random_id(self, rng: random.Random, table: str) -> int:
+        return rng.randint(1, self.sizes[table])
+
+    def delete_id(self, table: str) -> int:
+        last = self.next_delete.get(table, self.sizes[table])
+        self.next_delete[table] = last + 1
+        return self.next_delete[table]
+
+
+ENTITIES = [
+    # path, table, path parameter
+    ("owners", "owner", "owner_id"),
+    ("managers", "manager", "manager_id"),
+    ("facilities", "facility", "facility_id"),
+    ("trainers", "trainer", "trainer_id"),
+    ("staff", "staff", "staff_id"),
+]
+BULK_SIZE = 100
+
+
+def _get(path: str, **params) -> Request:
+    return ("GET", path, {"params": params} if params else {})
+
+
+def _person(rng: random.Random, prefix: str) -> Dict[str, Any]:
+    suffix = "".join(rng.choice("abcdefghij") for _ in range(6))
+    return {
+        "name": f"{prefix} {suffix.title()}",
+        "email": f"{prefix.lower()}.{suffix}.{rng.getrandbits(32)}@example.com",
+    }
+
+
+def new_row(rng: random.Random, ctx: Context, table: str) -> Dict[str, Any]:
+    if table in ("owner", "manager"):
+        return _person(rng, table.title())
+    foreign_keys = {
+        "owner_id": ctx.random_id(rng, "owner"),
+        "manager_id": ctx.random_id(rng, "manager"),
+    }
+    if table == "facility":
+        return {
+            "name": "Bench Gym",
+            "street": "1 Main St",
+            "city": "Austin",
+            "state": "Texas",
+            "state_abbr": "TX",
+            "zip_code": "78701",
+            **foreign_keys,
+        }
+    return {
+        **_person(rng, table.title()),
+        "bio": "kettlebell and mobility",
+        "facility_id": ctx.random_id(rng, "facility"),
+        **foreign_keys,
+    }
+
+
+def update(table: str) -> Dict[str, Any]:
+    if table == "facility":
+        return {"street": "2 Side St"}
+    return {"name": "Renamed Entity"}
+
+
+def ids(rng: random.Random, ctx: Context, count: int = 50) -> List[int]:
+    return [ctx.random_id(rng, "trainer") for _ in range(count)]
+
+
+def entity_scenarios(path: str, table: str, param: str) -> List[Scenario]:
+    item = f"/{path}/{{{param}}}"
+
+    def url(rng, ctx):
+        return f"/{path}/{ctx.random_id(rng, table)}"
+
+    scenarios = [
+        Scenario(
+            "POST",
+            f"/{path}/",
+            lambda rng, ctx: (
+                "POST",
+                f"/{path}/",
+                {"json": new_row(rng, ctx, table)},
+            ),
+        ),
+        Scenario(
+            "POST",
+            f"/{path}/bulk",
+            lambda rng, ctx: (
+                "POST",
+                f"/{path}/bulk",
+                {"json": [new_row(rng, ctx, table) for _ in range(BULK_SIZE)]},
+            ),
+            requests=50,
+        ),
+        Scenario(
+            "GET", f"/{path}/export", lambda rng, ctx: _get(f"/{path}/export"), 3
+        ),
+        Scenario("GET", f"/{path}/", lambda rng, ctx: _get(f"/{path}/")),
+        Scenario("GET", item, lambda rng, ctx: _get(url(rng, ctx))),
+        Scenario(
+            "PATCH",
+            item,
+            lambda rng, ctx: ("PATCH", url(rng, ctx), {"json": update(table)}),
+        ),
+        Scenario(
+            "DELETE",
+            item,
+            lambda rng, ctx: ("DELETE", f"/{path}/{ctx.delete_id(table)}", {}),
+            # Only when the POST scenarios were filtered out with --routes.
+            ok_statuses=(404,),
+        ),
+    ]
+    relations = {
+        "facility": ["owner/", "manager/", "staff/trainers/"],
+        "trainer": ["owner/", "manager/", "facility/"],
+        "staff": ["owner/", "manager/", "facility/"],
+    }
+    for suffix in relations.get(table, []):
+        scenarios.append(
+            Scenario(
+                "GET",
+                f"{item}/{suffix}",
+                lambda rng, ctx, suffix=suffix: _get(f"{url(rng, ctx)}/{suffix}"),
+            )
+        )
+    return scenarios
+
+
+# Prefixes of the words seed.py writes into bios.
+SEARCH_TERMS = ["kettle", "yoga", "post", "strength mob", "box"]
+
+
+def build_scenarios() -> List[Scenario]:
+    from app.pagination import SortKey, encode_cursor
+
+    def deep_cursor(rng, ctx):
+        row = SimpleNamespace(id=ctx.random_id(rng, "trainer"))
+        return encode_cursor(SortKey.ID, row)
+
+    def deep_offset(rng, ctx):
+        return rng.randint(0, max(0, ctx.sizes["trainer"] - 100))
+
+    scenarios: List[Scenario] = []
+    for path, table, param in ENTITIES:
+        scenarios += entity_scenarios(path, table, param)
+    scenarios += [
+        Scenario(
+            "GET",
+            "/trainers/ (deep cursor)",
+            lambda rng, ctx: _get("/trainers/", cursor=deep_cursor(rng, ctx)),
+        ),
+        Scenario(
+            "GET",
+            "/trainers/ (deep offset)",
+            lambda rng, ctx: _get("/trainers/", offset=deep_offset(rng, ctx)),
+        ),
+        Scenario(
+            "GET",
+            "/trainers/ (expand)",
+            lambda rng, ctx: _get("/trainers/", expand="owner,manager,facility"),
+        ),
+        Scenario(
+            "GET",
+            "/trainers/ (fields)",
+            lambda rng, ctx: _get("/trainers/", fields="id,name"),
+        ),
+        Scenario(
+            "GET",
+            "/trainers/ (ids)",
+            lambda rng, ctx: _get("/trainers/", ids=",".join(map(str, ids(rng, ctx)))),
+        ),
+        Scenario(
+            "POST",
+            "/trainers/lookup",
+            lambda rng, ctx: ("POST", "/trainers/lookup", {"json": ids(rng, ctx)}),
+        ),
+        *(
+            Scenario(
+                "GET",
+                f"/{path}/search",
+                lambda rng, ctx, path=path: _get(
+                    f"/{path}/search", q=rng.choice(SEARCH_TERMS)
+                ),
+            )
+            for path in ("trainers", "staff")
+        ),
+        Scenario(
+            "GET",
+            "/owners/{owner_id}/dashboard",
+            lambda rng, ctx: _get(f"/owners/{ctx.random_id(rng, 'owner')}/dashboard"),
+        ),
+        Scenario("GET", "/health/db", lambda rng, ctx: _get("/health/db")),
+        Scenario("GET", "/metrics", lambda rng, ctx: _get("/metrics")),
+    ]
+    return scenarios
+
+
+class RSSSampler:
+    """Peak resident set size of this process while the sampler is running."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def _current(self) -> int:
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * self._page_size
+        except OSError:
+            # Not Linux: fall back to the lifetime high-water mark.
+            scale = 1 if sys.platform == "darwin" else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_scenario(client, scenario: Scenario, ctx: Context, args) -> dict:
+    rng = random.Random(f"{args.seed}:{scenario.name}")
+    total = scenario.requests or args.requests
+    warmup = min(args.warmup, total)
+    latencies: List[float] = []
+    errors = 0
+    remaining = warmup + total
+
+    async def worker():
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            # The first `warmup` requests issued are not measured.
+            measured = remaining < total
+            method, url, kwargs = scenario.make(rng, ctx)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            elapsed = time.perf_counter() - start
+            if measured:
+                latencies.append(elapsed)
+            status = response.status_code
+            if status >= 400 and status not in scenario.ok_statuses:
+                errors += 1
+
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else math.nan,
+        "rps": (warmup + total) / wall,
+        "peak_rss_mb": rss.peak / 2**20,
+    }
+
+
+def uncovered_routes(app, scenarios: List[Scenario]) -> List[str]:
+    covered = {(s.method, s.route.split(" ")[0]) for s in scenarios}
+    missing = []
+    for route in app.routes:
+        if not getattr(route, "include_in_schema", False):
+            continue  # /docs, /openapi.json, ...
+        for method in sorted(route.methods):
+            if (method, route.path) not in covered:
+                missing.append(f"{method} {route.path}")
+    return missing
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Routes whose p95 grew, or whose throughput fell, by more than threshold."""
+    regressions = []
+    for name, current in results["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms"
+            )
+        if current["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: rps {before['rps']:.0f} -> {current['rps']:.0f}"
+            )
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def print_table(results: dict) -> None:
+    header = f"{'route':<48}" + "".join(
+        f" {column:>8}" for column in ("p50 ms", "p95 ms", "p99 ms", "rps", "rss MB")
+    )
+    header += " errors"
+    print(header)
+    print("-" * len(header))
+    for name, r in results["routes"].items():
+        print(
+            f"{name:<48} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f} "
+            f"{r['rps']:8.0f} {r['peak_rss_mb']:8.1f} {r['errors']:6d}"
+        )
+
+
+async def run(args) -> dict:
+    db_path = args.db or f"bench-{args.trainers}.sqlite3"
+    # The app reads its settings when first imported.
+    os.environ.setdefault("GYM_PROFILE", "prod")
+    os.environ["GYM_DB_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("GYM_MX_BACKEND", "stub")
+    os.environ.setdefault("GYM_DB_ECHO", "false")
+    os.environ.setdefault("GYM_SLOW_QUERY_MS", "0")
+
+    import httpx
+    from sqlmodel import create_engine
+
+    from .seed import parse_scale, seed, table_sizes
+
+    trainers = parse_scale(args.trainers)
+    if args.reseed and os.path.exists(db_path):
+        os.remove(db_path)
+    if not os.path.exists(db_path):
+        seed(create_engine(f"sqlite:///{db_path}"), trainers, args.seed)
+
+    from app.main import app
+    from app.settings import settings
+
+    sizes = table_sizes(trainers)
+    scenarios = build_scenarios()
+    if args.routes:
+        scenarios = [
+            s for s in scenarios if any(part in s.name for part in args.routes)
+        ]
+    ctx = Context(sizes=sizes)
+
+    results: dict = {
+        "meta": {
+            "trainers": trainers,
+            "sizes": sizes,
+            "db_mode": settings.db_mode,
+            "profile": settings.profile,
+            "concurrency": args.concurrency,
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "routes": {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    # The lifespan starts the background workers the settings ask for (the
+    # purge, email verification, the write coalescer).
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as c:
+        for scenario in scenarios:
+            r = await run_scenario(c, scenario, ctx, args)
+            results["routes"][scenario.name] = r
+            if not args.quiet:
+                print(
+                    f"  {scenario.name}: p95 {r['p95_ms']:.2f} ms, {r['rps']:.0f} rps",
+                    file=sys.stderr,
+                )
+
+    missing = uncovered_routes(app, scenarios) if not args.routes else []
+    if missing:
+        print("routes without a scenario: " + ", ".join(missing), file=sys.stderr)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trainers", default="1k", help="1k, 100k, 1m or a number")
+    parser.add_argument("--db", help="default: bench-<trainers>.sqlite3")
+    parser.add_argument("--reseed", action="store_true", help="recreate the database")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--routes", nargs="*", help="only routes containing these")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with a previous --output file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="allowed regression (0.10=10%%)"
+    )
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
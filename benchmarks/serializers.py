@@ -0,0 +1,88 @@
+"""Compare the default and the `fast_json` response serializers.
+
+Renders the bodies of a few list and expanded routes from rows loaded out of
+a seeded in-memory database, with each serializer in turn (see
+app/serializers.py), and reports the time per body:
+
+    python -m benchmarks.serializers
+    python -m benchmarks.serializers --trainers 10k --repeat 500
+
+The route benchmark (benchmarks/run.py) measures the same end to end: run it
+once as usual and once with GYM_FAST_JSON=true against the first as baseline.
+"""
+import argparse
+import os
+import time
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Tuple
+
+os.environ.setdefault("GYM_MX_BACKEND", "stub")
+
+from sqlmodel import Session, create_engine, select  # noqa: E402
+
+from app import serializers  # noqa: E402
+from app.expand import expand_rows, expanded_model  # noqa: E402
+from app.models import Facility, Trainer, TrainerRead  # noqa: E402
+
+from .seed import parse_scale, seed  # noqa: E402
+
+EXPAND = frozenset({"owner", "manager", "facility"})
+
+
+def cases(session: Session) -> Dict[str, Tuple[Any, Any]]:
+    """Route -> (response model, rows as the handler passes them)."""
+    trainers = session.exec(select(Trainer).order_by(Trainer.id).limit(100)).all()
+    facility = session.exec(select(Facility).limit(1)).one()
+    staffed = frozenset({"staff", "trainers"})
+    return {
+        "GET /trainers/": (List[TrainerRead], trainers),
+        "GET /trainers/?expand=owner,manager,facility": (
+            List[expanded_model(Trainer, EXPAND)],
+            expand_rows(session, Trainer, trainers, EXPAND),
+        ),
+        "GET /facilities/{facility_id}/staff/trainers/": (
+            expanded_model(Facility, staffed),
+            expand_rows(session, Facility, [facility], staffed)[0],
+        ),
+    }
+
+
+def per_call_ms(render: Callable[[], bytes], repeat: int) -> float:
+    render()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trainers", default="1k", help="1k, 100k, 1m or a number")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    seed(engine, parse_scale(args.trainers))
+    default = replace(serializers.settings, fast_json=False)
+    fast = replace(serializers.settings, fast_json=True)
+
+    print(f"{'route':<50} {'default ms':>10} {'fast ms':>10} {'speedup':>8}")
+    with Session(engine) as session:
+        for route, (response_model, content) in cases(session).items():
+            times = []
+            for mode in (default, fast):
+                serializers.settings = mode
+                times.append(
+                    per_call_ms(
+                        lambda: serializers.dump_json(response_model, content),
+                        args.repeat,
+                    )
+                )
+            print(
+                f"{route:<50} {times[0]:>10.3f} {times[1]:>10.3f} "
+                f"{times[0] / times[1]:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel
+
+from app import mx
+from app.database import make_engine
+from app.main import app, get_session
+from app.settings import load_settings
+
+
+@pytest.fixture(autouse=True)
+def stub_mx():
+    # Never touch the network from tests.
+    backend = mx.StubBackend({"nomx.example": False})
+    original = mx.resolver.backend
+    mx.set_backend(backend)
+    yield backend
+    mx.set_backend(original)
+
+
+@pytest.fixture(name="engine")
+def engine_fixture():
+    engine = make_engine(load_settings("test"))
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(name="session")
+def session_fixture(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+import httpx
+from fastapi import FastAPI
+
+from app import metrics
+from app.admission import AdmissionController, AdmissionMiddleware, parse_route_limits
+
+
+def make_app(controller):
+    app = FastAPI()
+    release = threading.Event()
+
+    @app.get("/slow")
+    def slow():
+        release.wait(2)
+        return {"ok": True}
+
+    @app.get("/fast")
+    def fast():
+        return {"ok": True}
+
+    @app.post("/items/{item_id}")
+    def write(item_id: int):
+        release.wait(2)
+        return {"id": item_id}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    return app, release
+
+
+async def send_all(app, release, requests, hold=0.2):
+    """Send `requests` at once; the slow handlers finish after `hold` seconds."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+
+        async def unblock():
+            await asyncio.sleep(hold)
+            release.set()
+
+        responses, _ = await asyncio.gather(
+            asyncio.gather(*(c.request(method, url) for method, url in requests)),
+            unblock(),
+        )
+    return responses
+
+
+def test_requests_waiting_too_long_for_a_slot_are_shed():
+    controller = AdmissionController(read_limit=1, max_queue_ms=50, retry_after=3)
+    app, release = make_app(controller)
+    shed = metrics.admission_shed.value("read")
+
+    requests = [("GET", "/slow"), ("GET", "/fast"), ("POST", "/items/1")]
+    responses = asyncio.run(send_all(app, release, requests))
+
+    assert [r.status_code for r in responses] == [200, 503, 200]
+    assert responses[1].headers["retry-after"] == "3"
+    assert responses[1].json()["detail"]["type"] == "overloaded"
+    assert metrics.admission_shed.value("read") == shed + 1
+    assert metrics.admission_in_flight.value("read") == 0
+
+
+def test_full_queues_shed_at_once_and_routes_get_their_own_pool():
+    controller = AdmissionController(
+        write_limit=1,
+        route_limits=parse_route_limits("POST /items/{item_id}=1"),
+        max_queue=1,
+        max_queue_ms=5000,
+    )
+    app, release = make_app(controller)
+
+    responses = asyncio.run(
+        send_all(
+            app,
+            release,
+            [("POST", "/items/1"), ("POST", "/items/2"), ("POST", "/items/3")]
+            + [("GET", "/slow")],
+        )
+    )
+
+    # One runs, one waits, the third finds the queue full; reads are unlimited.
+    assert sorted(r.status_code for r in responses[:3]) == [200, 200, 503]
+    assert responses[3].status_code == 200
+    assert list(controller.route_pools) == ["POST /items/{item_id}"]
+    assert controller.pools["write"].in_flight == 0
@@ -0,0 +1,140 @@
+from dataclasses import replace
+
+from sqlmodel import select
+
+from app import crud
+from app.models import Facility, Owner, Trainer, TrainingAppointment
+from app.purge import PurgeWorker
+
+DAY = "2024-03-04"
+
+
+def seed(session):
+    owner = Owner(name="Ann", email="ann@gmail.com")
+    gym = Facility(
+        name="Downtown",
+        street="1 Main St",
+        city="Austin",
+        state="Texas",
+        state_abbr="TX",
+        zip_code="78701",
+        owner=owner,
+    )
+    session.add_all(
+        [
+            Trainer(name="Trainer A", owner=owner, facility=gym),
+            Trainer(name="Trainer B", owner=owner, facility=gym),
+        ]
+    )
+    session.commit()
+
+
+def book(client, trainer_id, time, minutes=60):
+    return client.post(
+        "/appointments/",
+        json={
+            "trainer_id": trainer_id,
+            "start": f"{DAY}T{time}:00",
+            "duration_minutes": minutes,
+        },
+    )
+
+
+def window(start="09:00", end="17:00"):
+    return {"from": f"{DAY}T{start}:00", "to": f"{DAY}T{end}:00"}
+
+
+def test_overlapping_bookings_are_refused(client, session):
+    seed(session)
+    first = book(client, 1, "10:00", 90).json()
+    assert first["end"] == f"{DAY}T11:30:00"
+    assert book(client, 1, "13:00").status_code == 200
+
+    for time, minutes in (("10:00", 30), ("09:30", 60), ("11:00", 60), ("12:30", 45)):
+        response = book(client, 1, time, minutes)
+        assert response.status_code == 409, (time, minutes)
+    assert response.json()["detail"]["appointment_id"] == 2
+    # Back to back, and on another trainer's schedule, is fine.
+    assert book(client, 1, "11:30", 90).status_code == 200
+    assert book(client, 2, "10:00", 90).status_code == 200
+    assert book(client, 3, "10:00").status_code == 404
+
+    listed = client.get("/trainers/1/appointments", params=window("11:00", "13:30"))
+    assert [a["start"][11:16] for a in listed.json()] == ["10:00", "11:30", "13:00"]
+
+    # Cancelling frees the slot.
+    assert client.delete(f"/appointments/{first['id']}").status_code == 200
+    assert client.get(f"/appointments/{first['id']}").status_code == 404
+    assert book(client, 1, "10:00", 30).status_code == 200
+
+
+def test_availability_and_facility_free_slots(client, session):
+    seed(session)
+    book(client, 1, "08:30", 60)
+    book(client, 1, "11:00", 60)
+    book(client, 1, "12:00", 30)
+    book(client, 1, "16:45", 60)
+    book(client, 2, "09:00", 8 * 60)
+
+    availability = client.get(
+        "/trainers/1/availability", params={**window(), "min_minutes": 60}
+    ).json()
+    slots = [(s["start"][11:16], s["end"][11:16]) for s in availability["slots"]]
+    assert slots == [("09:30", "11:00"), ("12:30", "16:45")]
+
+    free = client.get(
+        "/facilities/1/free-slots", params={**window(), "min_minutes": 15}
+    ).json()
+    by_trainer = {
+        t["trainer_id"]: [(s["start"][11:16], s["end"][11:16]) for s in t["slots"]]
+        for t in free["trainers"]
+    }
+    assert by_trainer == {
+        1: [("09:30", "11:00"), ("12:30", "16:45")],
+        2: [],
+    }
+
+    response = client.get(
+        "/trainers/1/availability", params=window("17:00", "09:00")
+    )
+    assert response.status_code == 400
+    assert client.get("/facilities/9/free-slots", params=window()).status_code == 404
+
+
+def test_purging_a_trainer_deletes_its_appointments(
+    client, session, engine, monkeypatch
+):
+    monkeypatch.setattr(crud, "settings", replace(crud.settings, soft_delete=True))
+    seed(session)
+    for time in ("09:00", "10:00", "11:00"):
+        book(client, 1, time)
+    book(client, 2, "09:00")
+    client.delete("/trainers/1")
+    assert client.get("/trainers/1/appointments", params=window()).status_code == 404
+
+    worker = PurgeWorker(engine, batch_size=2)
+    worker.run_pass()
+    assert worker.status.purged == {"trainingappointment": 3, "trainer": 1}
+    remaining = session.exec(select(TrainingAppointment.trainer_id)).all()
+    assert remaining == [2]
+
+
+def test_times_with_an_offset_are_read_as_utc(client, session):
+    seed(session)
+    response = client.post(
+        "/appointments/",
+        json={"trainer_id": 1, "start": f"{DAY}T10:00:00Z", "duration_minutes": 60},
+    )
+    assert response.status_code == 200
+    assert response.json()["start"] == f"{DAY}T10:00:00"
+    assert book(client, 1, "10:30").status_code == 409
+
+    response = client.get(
+        "/trainers/1/availability",
+        params={"from": f"{DAY}T11:00:00+02:00", "to": f"{DAY}T17:00:00Z"},
+    )
+    assert response.status_code == 200
+    assert response.json()["slots"] == [
+        {"start": f"{DAY}T09:00:00", "end": f"{DAY}T10:00:00"},
+        {"start": f"{DAY}T11:00:00", "end": f"{DAY}T17:00:00"},
+    ]
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.async_crud import router
+from app.database import get_async_session, make_async_engine
+from app.settings import load_settings
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture(name="async_client")
+def async_client_fixture():
+    engine = make_async_engine(load_settings("test"))
+
+    async def create_all():
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+    asyncio.run(create_all())
+
+    async def get_session_override():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_async_session] = get_session_override
+    with TestClient(app) as client:
+        yield client
+
+
+def test_async_crud_roundtrip(async_client):
+    owner = async_client.post(
+        "/owners/", json={"name": "ann lee", "email": "ann@gmail.com"}
+    ).json()
+    manager = async_client.post(
+        "/managers/",
+        json={"name": "bob stone", "email": "bob@gmail.com", "owner_id": owner["id"]},
+    ).json()
+
+    response = async_client.get(f"/owners/{owner['id']}")
+    assert response.status_code == 200
+    assert [m["id"] for m in response.json()["managers"]] == [manager["id"]]
+    assert async_client.get(f"/managers/{manager['id']}").json()["owner"]["id"] == 1
+
+    response = async_client.patch(f"/managers/{manager['id']}", json={"name": "Bo Diddley"})
+    assert response.json()["name"] == "Bo Diddley"
+
+    assert async_client.delete(f"/managers/{manager['id']}").status_code == 200
+    assert async_client.get(f"/managers/{manager['id']}").status_code == 404
+
+
+def test_async_bulk_and_list(async_client):
+    response = async_client.post(
+        "/trainers/bulk", json=[{"name": f"Trainer {c}"} for c in "ABCDE"]
+    )
+    assert len(response.json()["created"]) == 5
+
+    response = async_client.get("/trainers/", params={"limit": 2})
+    assert [row["id"] for row in response.json()] == [1, 2]
+    response = async_client.get(
+        "/trainers/", params={"limit": 5, "cursor": response.headers["X-Next-Cursor"]}
+    )
+    assert [row["id"] for row in response.json()] == [3, 4, 5]
+
+
+def test_async_expand(async_client):
+    owner = async_client.post(
+        "/owners/", json={"name": "ann lee", "email": "ann@gmail.com"}
+    ).json()
+    async_client.post(
+        "/trainers/bulk",
+        json=[{"name": f"Trainer {c}", "owner_id": owner["id"]} for c in "AB"],
+    )
+
+    rows = async_client.get("/trainers/", params={"expand": "owner"}).json()
+    assert [row["owner"]["id"] for row in rows] == [owner["id"]] * 2
+    body = async_client.get("/owners/1", params={"expand": "trainers"}).json()
+    assert body["managers"] == [] and len(body["trainers"]) == 2
+
+
+def test_async_search(async_client):
+    async_client.post(
+        "/trainers/bulk",
+        json=[{"name": "Lou Park", "bio": "kettlebell"}, {"name": "Kim Bell"}],
+    )
+    rows = async_client.get("/trainers/search", params={"q": "kettle"}).json()
+    assert [row["name"] for row in rows] == ["Lou Park"]
+
+
+def test_async_fields(async_client):
+    async_client.post("/trainers/bulk", json=[{"name": "Trainer A", "bio": "Hi"}])
+    response = async_client.get("/trainers/", params={"fields": "bio"})
+    assert response.json() == [{"id": 1, "bio": "Hi"}]
+    response = async_client.get("/trainers/1", params={"fields": "name"})
+    assert response.json() == {"id": 1, "name": "Trainer A"}
+
+
+def test_async_multi_get(async_client):
+    async_client.post("/trainers/bulk", json=[{"name": f"Trainer {c}"} for c in "AB"])
+    response = async_client.get("/trainers/", params={"ids": "2,1,4"})
+    assert [row["id"] for row in response.json()] == [2, 1]
+    assert response.headers["X-Missing-Ids"] == "4"
+    response = async_client.post("/trainers/lookup", json=[2, 2])
+    assert [row["id"] for row in response.json()] == [2]
+
+
+def test_async_manager_update_assigns_trainers(async_client):
+    async_client.post("/owners/", json={"name": "ann lee", "email": "ann@gmail.com"})
+    async_client.post(
+        "/managers/",
+        json={"name": "bob stone", "email": "bob@gmail.com", "owner_id": 1},
+    )
+    async_client.post("/trainers/bulk", json=[{"name": "Trainer A"}])
+    response = async_client.patch("/managers/1", json={"trainer_ids": [1, 2]})
+    assert response.headers["X-Rows-Affected"] == "trainer=1"
+    assert async_client.get("/trainers/1").json()["manager_id"] == 1
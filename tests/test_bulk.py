@@ -0,0 +1,46 @@
+from sqlmodel import select
+
+from app.models import Owner, Trainer
+
+
+def test_bulk_create_returns_ids_in_order(client, session):
+    response = client.post(
+        "/owners/bulk",
+        json=[
+            {"name": "ann lee", "email": "ann@gmail.com"},
+            {"name": "bob stone", "email": "bob@gmail.com"},
+        ],
+    )
+    assert response.status_code == 200
+    created = response.json()["created"]
+    assert [item["index"] for item in created] == [0, 1]
+
+    owners = {owner.id: owner for owner in session.exec(select(Owner)).all()}
+    assert [owners[item["id"]].name for item in created] == ["Ann Lee", "Bob Stone"]
+
+
+def test_bulk_create_atomic_rejects_whole_batch(client, session):
+    response = client.post(
+        "/trainers/bulk",
+        json=[{"name": "Good Name"}, {"name": "x"}, {"name": "Other Name"}],
+    )
+    assert response.status_code == 422
+    assert [error["index"] for error in response.json()["detail"]] == [1]
+    assert session.exec(select(Trainer)).all() == []
+
+
+def test_bulk_create_best_effort_reports_per_item_errors(client, session):
+    response = client.post(
+        "/owners/bulk?mode=best_effort",
+        json=[
+            {"name": "ann lee", "email": "ann@gmail.com"},
+            {"name": "bob stone", "email": "bob@nomx.example"},
+            {"name": "cat ng", "email": "cat@gmail.com"},
+        ],
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["index"] for item in body["created"]] == [0, 2]
+    assert body["errors"][0]["index"] == 1
+    assert body["errors"][0]["errors"][0]["loc"] == ["email"]
+    assert len(session.exec(select(Owner)).all()) == 2
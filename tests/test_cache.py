@@ -0,0 +1,171 @@
+import pytest
+from sqlmodel import update
+
+from app import cache
+from app.cache import CachedResponse, MemoryBackend
+from app.models import Owner
+
+
+@pytest.fixture(autouse=True)
+def memory_cache():
+    backend = MemoryBackend()
+    cache.set_backend(backend)
+    yield backend
+    cache.set_backend(None)
+
+
+def create(client, path, **data):
+    response = client.post(path, json=data)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def owner(client, name="Ann Lee", email="ann@gmail.com"):
+    return create(client, "/owners/", name=name, email=email)
+
+
+def facility(client, owner_id):
+    return create(
+        client,
+        "/facilities/",
+        name="Iron Den",
+        street="1 Main St",
+        city="Austin",
+        state="Texas",
+        state_abbr="TX",
+        zip_code="78701",
+        owner_id=owner_id,
+    )
+
+
+def test_second_read_is_served_from_cache(client):
+    owner_id = owner(client)
+    first = client.get(f"/owners/{owner_id}")
+    second = client.get(f"/owners/{owner_id}")
+
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.json() == first.json()
+    assert second.headers["etag"] == first.headers["etag"]
+
+
+def test_if_none_match_returns_304(client):
+    owner_id = owner(client)
+    etag = client.get(f"/owners/{owner_id}").headers["etag"]
+
+    response = client.get(f"/owners/{owner_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_patch_invalidates_item_and_lists(client):
+    owner_id = owner(client)
+    etag = client.get(f"/owners/{owner_id}").headers["etag"]
+    client.get("/owners/")
+
+    client.patch(f"/owners/{owner_id}", json={"name": "Ann Smith"})
+
+    item = client.get(f"/owners/{owner_id}", headers={"If-None-Match": etag})
+    assert item.status_code == 200
+    assert item.json()["name"] == "Ann Smith"
+    listing = client.get("/owners/")
+    assert listing.headers["x-cache"] == "MISS"
+    assert listing.json()[0]["name"] == "Ann Smith"
+
+
+def test_new_child_invalidates_only_its_parent(client):
+    ann = owner(client)
+    bob = owner(client, "Bob Stone", "bob@gmail.com")
+    client.get(f"/owners/{ann}")
+    client.get(f"/owners/{bob}")
+
+    create(client, "/managers/", name="Cat Ng", email="cat@gmail.com", owner_id=ann)
+
+    response = client.get(f"/owners/{ann}")
+    assert response.headers["x-cache"] == "MISS"
+    assert [m["name"] for m in response.json()["managers"]] == ["Cat Ng"]
+    assert client.get(f"/owners/{bob}").headers["x-cache"] == "HIT"
+
+
+def test_moving_a_trainer_invalidates_both_facilities(client):
+    owner_id = owner(client)
+    first, second = facility(client, owner_id), facility(client, owner_id)
+    trainer_id = create(client, "/trainers/", name="Dee Roy", facility_id=first)
+    for facility_id in (first, second):
+        client.get(f"/facilities/{facility_id}/staff/trainers/")
+
+    client.patch(f"/trainers/{trainer_id}", json={"facility_id": second})
+
+    old = client.get(f"/facilities/{first}/staff/trainers/")
+    new = client.get(f"/facilities/{second}/staff/trainers/")
+    assert (old.headers["x-cache"], new.headers["x-cache"]) == ("MISS", "MISS")
+    assert old.json()["trainers"] == []
+    assert [t["id"] for t in new.json()["trainers"]] == [trainer_id]
+
+
+def test_bulk_insert_invalidates_lists(client):
+    assert client.get("/trainers/").json() == []
+
+    client.post("/trainers/bulk", json=[{"name": "Dee Roy"}])
+
+    assert [t["name"] for t in client.get("/trainers/").json()] == ["Dee Roy"]
+
+
+def test_errors_are_not_cached(client, memory_cache):
+    assert client.get("/owners/1").status_code == 404
+    assert len(memory_cache) == 0
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    for key in "abc":
+        entry = CachedResponse(200, [], b"{}", '"x"')
+        backend.set(key, entry, {key}, backend.version())
+        backend.get("a")
+
+    assert backend.get("a") is not None
+    assert backend.get("b") is None
+
+
+def test_memory_backend_drops_entries_built_before_an_invalidation():
+    backend = MemoryBackend()
+    version = backend.version()
+    backend.invalidate({"owner:1"})
+    backend.set("k", CachedResponse(200, [], b"{}", '"x"'), {"owner:1"}, version)
+
+    assert backend.get("k") is None
+
+
+class RecordingBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.invalidated = []
+
+    def invalidate(self, tags):
+        self.invalidated.append(set(tags))
+        super().invalidate(tags)
+
+
+def test_savepoints_invalidate_only_when_the_transaction_commits(session):
+    backend = RecordingBackend()
+    cache.set_backend(backend)
+    session.add(Owner(name="Ann Lee", email="ann@gmail.com"))
+    session.commit()
+    backend.invalidated.clear()
+
+    # Before any transaction has begun: the tags wait for the one it begins.
+    session.exec(update(Owner).values(name="Ann Smith"))
+    kept = session.begin_nested()
+    session.add(Owner(name="Bob Stone", email="bob@gmail.com"))
+    kept.commit()
+    dropped = session.begin_nested()
+    session.add(Owner(name="Cy Young", email="cy@gmail.com"))
+    session.flush()
+    dropped.rollback()
+    assert backend.invalidated == []
+
+    session.commit()
+    [tags] = backend.invalidated
+    assert {"owner", "owner/any", "owner:2"} <= tags
+    assert "owner:3" not in tags
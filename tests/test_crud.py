@@ -0,0 +1,87 @@
+from sqlalchemy import event
+
+from app.models import Facility, Manager, Owner, Trainer
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(
+            statement.split()[0]
+        ),
+    )
+    return statements
+
+
+def test_create_and_update_skip_the_refresh(client, engine):
+    statements = count_queries(engine)
+    response = client.post(
+        "/owners/", json={"name": "ann lee", "email": "ann@gmail.com"}
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] == 1
+    assert statements == ["INSERT"]
+
+    statements.clear()
+    response = client.patch("/owners/1", json={"role": "Manager"})
+    assert response.json()["role"] == "Manager"
+    assert response.json()["name"] == "Ann Lee"
+    assert statements == ["SELECT", "UPDATE"]
+
+
+def test_not_found_is_shared(client):
+    for path, name in [("owners", "Owner"), ("staff", "Staff")]:
+        for method in ("GET", "PATCH", "DELETE"):
+            response = client.request(method, f"/{path}/42", json={})
+            assert response.status_code == 404
+            assert response.json() == {"detail": f"{name} not found"}
+    assert client.get("/trainers/42/owner/").status_code == 404
+
+
+def test_detail_and_relation_routes(client, session):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    manager = Manager(name="Bob Stone", email="bob@gmail.com", owner=owner)
+    facility = Facility(
+        name="Downtown",
+        street="1 Main St",
+        city="Austin",
+        state="Texas",
+        state_abbr="TX",
+        zip_code="78701",
+        owner=owner,
+        manager=manager,
+    )
+    session.add_all(
+        Trainer(name=f"Trainer {c}", facility=facility, owner=owner) for c in "AB"
+    )
+    session.commit()
+
+    manager = client.get("/managers/1").json()
+    assert manager["owner"]["email"] == "ann@gmail.com"
+    assert client.get("/trainers/1/facility/").json()["facility"]["name"] == "Downtown"
+
+    facility = client.get("/facilities/1/staff/trainers/").json()
+    assert [t["id"] for t in facility["trainers"]] == [1, 2]
+    assert facility["staff"] == []
+
+
+def test_update_ignores_fields_without_a_column(client, session):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    session.add(Manager(name="Bob Stone", email="bob@gmail.com", owner=owner))
+    session.commit()
+
+    response = client.patch(
+        "/managers/1", json={"name": "Bo Diddley", "trainer_ids": [1]}
+    )
+    assert response.status_code == 200
+    assert response.json()["name"] == "Bo Diddley"
+
+
+def test_delete_returns_the_row(client, session):
+    session.add(Trainer(name="Trainer A"))
+    session.commit()
+    response = client.delete("/trainers/1")
+    assert response.json()["name"] == "Trainer A"
+    assert client.get("/trainers/1").status_code == 404
@@ -0,0 +1,120 @@
+from datetime import date, datetime
+
+from app import dashboard
+from app.migrations import migrate
+from app.models import Facility, Manager, Owner, Staff, Trainer
+
+
+def facility(name, owner, **kwargs):
+    return Facility(
+        name=name,
+        street="1 Main St",
+        city="Austin",
+        state="Texas",
+        state_abbr="TX",
+        zip_code="78701",
+        owner=owner,
+        **kwargs,
+    )
+
+
+def seed(session):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    downtown, uptown = facility("Downtown", owner), facility("Uptown", owner)
+    session.add(Manager(name="Bob Stone", email="bob@gmail.com", owner=owner))
+    session.add_all(
+        Trainer(
+            name=f"Trainer {c}",
+            owner=owner,
+            facility=downtown,
+            employment_date=datetime(2024, month, 1),
+        )
+        for c, month in zip("ABC", (1, 1, 3))
+    )
+    session.add(
+        Staff(
+            name="Sam Hill",
+            email="sam@gmail.com",
+            owner=owner,
+            facility=uptown,
+            employment_date=datetime(2024, 3, 15),
+        )
+    )
+    session.commit()
+
+
+def test_dashboard_counts(client, session):
+    seed(session)
+    params = {"months": 3, "until": "2024-03-31"}
+    response = client.get("/owners/1/dashboard", params=params)
+    assert response.status_code == 200
+    assert response.json() == {
+        "owner_id": 1,
+        "facilities": 2,
+        "managers": 1,
+        "trainers": 3,
+        "staff": 1,
+        "by_facility": [
+            {"facility_id": 1, "name": "Downtown", "trainers": 3, "staff": 0},
+            {"facility_id": 2, "name": "Uptown", "trainers": 0, "staff": 1},
+        ],
+        "hiring": [
+            {"month": "2024-01", "trainers": 2, "staff": 0},
+            {"month": "2024-02", "trainers": 0, "staff": 0},
+            {"month": "2024-03", "trainers": 1, "staff": 1},
+        ],
+    }
+    params = {"months": 2, "until": "2024-02-01"}
+    months = client.get("/owners/1/dashboard", params=params).json()["hiring"]
+    assert [(m["month"], m["trainers"]) for m in months] == [
+        ("2024-01", 2),
+        ("2024-02", 0),
+    ]
+    # Twelve calendar months up to today by default, hires or not.
+    hiring = client.get("/owners/1/dashboard").json()["hiring"]
+    assert [m["month"] for m in hiring] == dashboard.calendar_months(date.today(), 12)
+    assert client.get("/owners/2/dashboard").status_code == 404
+
+
+def test_calendar_months_cross_years():
+    assert dashboard.calendar_months(date(2024, 2, 29), 3) == [
+        "2023-12",
+        "2024-01",
+        "2024-02",
+    ]
+
+
+def test_writes_keep_the_rollups_in_sync(client, session, engine):
+    seed(session)
+    client.patch("/trainers/1", json={"facility_id": 2})
+    client.delete("/trainers/2")
+    client.post("/trainers/bulk", json=[{"name": "Trainer D", "owner_id": 1}])
+    session.execute(Trainer.__table__.update().values(employment_date=None))
+    session.commit()
+
+    params = {"months": 1, "until": "2024-03-01"}
+    body = client.get("/owners/1/dashboard", params=params).json()
+    assert body["trainers"] == 3
+    assert [f["trainers"] for f in body["by_facility"]] == [1, 1]
+    assert body["hiring"] == [{"month": "2024-03", "trainers": 0, "staff": 1}]
+
+    with engine.begin() as conn:
+        dashboard.rebuild(conn)
+    assert client.get("/owners/1/dashboard", params=params).json() == body
+
+
+def test_migration_backfills_existing_rows(engine, session):
+    seed(session)
+    with engine.begin() as conn:
+        for table in dashboard.SUMMARY_TABLES:
+            conn.exec_driver_sql(f"DROP TABLE {table}")
+        for (name,) in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        ).all():
+            conn.exec_driver_sql(f"DROP TRIGGER {name}")
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        result = dashboard.owner_dashboard(conn, 1)
+    assert (result.facilities, result.trainers, result.staff) == (2, 3, 1)
@@ -0,0 +1,26 @@
+from app.database import make_engine
+from app.settings import load_settings
+
+
+def test_prod_profile_applies_pragmas(tmp_path, monkeypatch):
+    monkeypatch.setenv("GYM_DB_URL", f"sqlite:///{tmp_path / 'gym.sqlite3'}")
+    monkeypatch.setenv("GYM_SQLITE_BUSY_TIMEOUT_MS", "1234")
+    settings = load_settings("prod")
+    assert settings.db_echo is False
+
+    engine = make_engine(settings)
+    with engine.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == 1234
+        assert pragma("cache_size") == -64_000
+    assert engine.pool.size() == 20
+
+
+def test_health_db_reports_pragmas(client):
+    response = client.get("/health/db")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["profile"] in {"dev", "test", "prod"}
+    assert set(body["pragmas"]) >= {"journal_mode", "synchronous", "busy_timeout"}
@@ -0,0 +1,78 @@
+from sqlalchemy import event
+
+from app.models import Facility, Manager, Owner, Trainer
+
+
+def seed(session, trainers=10):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    manager = Manager(name="Bob Stone", email="bob@gmail.com", owner=owner)
+    facility = Facility(
+        name="Downtown",
+        street="1 Main St",
+        city="Austin",
+        state="Texas",
+        state_abbr="TX",
+        zip_code="78701",
+        owner=owner,
+        manager=manager,
+    )
+    session.add_all(
+        Trainer(name=f"Trainer {chr(65 + i)}", owner=owner, manager=manager, facility=facility)
+        for i in range(trainers)
+    )
+    session.commit()
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def test_list_expand_batches_relations(client, session, engine):
+    seed(session)
+    session.expunge_all()
+    statements = count_queries(engine)
+
+    response = client.get("/trainers/", params={"expand": "owner,manager,facility"})
+    assert response.status_code == 200
+    rows = response.json()
+    assert len(rows) == 10
+    assert rows[0]["owner"]["name"] == "Ann Lee"
+    assert rows[0]["manager"]["name"] == "Bob Stone"
+    assert rows[0]["facility"]["zip_code"] == "78701"
+    assert len(statements) == 4
+
+
+def test_list_without_expand_is_unchanged(client, session):
+    seed(session, trainers=1)
+    row = client.get("/trainers/").json()[0]
+    assert "owner" not in row and "facility" not in row
+
+
+def test_get_by_id_expands_to_many(client, session):
+    seed(session, trainers=3)
+    response = client.get("/facilities/1", params={"expand": "trainers,staff,owner"})
+    body = response.json()
+    assert [t["id"] for t in body["trainers"]] == [1, 2, 3]
+    assert body["staff"] == []
+    assert body["owner"]["id"] == 1
+    assert "manager" not in body
+
+
+def test_get_manager_expand_keeps_owner(client, session):
+    seed(session, trainers=2)
+    body = client.get("/managers/1", params={"expand": "trainers"}).json()
+    assert body["owner"]["id"] == 1
+    assert len(body["trainers"]) == 2
+
+
+def test_unknown_relation(client, session):
+    seed(session, trainers=1)
+    response = client.get("/trainers/1", params={"expand": "owner,pets"})
+    assert response.status_code == 400
+    assert "pets" in response.json()["detail"]
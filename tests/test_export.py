@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+
+from app.models import Facility, Owner
+
+
+def add_facilities(session, count):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    session.add(owner)
+    session.commit()
+    session.add_all(
+        Facility(
+            name=f"Gym {i}",
+            street="1 Main St",
+            city="Austin",
+            state="Texas",
+            state_abbr="TX",
+            zip_code="78701",
+            owner_id=owner.id,
+        )
+        for i in range(count)
+    )
+    session.commit()
+
+
+def test_export_ndjson(client, session):
+    add_facilities(session, 5)
+    response = client.get("/facilities/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [1, 2, 3, 4, 5]
+    assert rows[0]["name"] == "Gym 0"
+
+
+def test_export_csv(client, session):
+    add_facilities(session, 3)
+    response = client.get("/facilities/export", params={"format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["id"] for row in rows] == ["1", "2", "3"]
+    assert rows[2]["zip_code"] == "78701"
+
+
+def test_export_empty_table_csv_has_header(client):
+    response = client.get("/trainers/export", params={"format": "csv"})
+    assert response.text.splitlines()[0].startswith("name,email,bio")
+
+
+def test_export_resumes_from_cursor(client, session):
+    add_facilities(session, 5)
+    first = client.get("/facilities/", params={"limit": 2})
+    response = client.get(
+        "/facilities/export", params={"cursor": first.headers["X-Next-Cursor"]}
+    )
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [3, 4, 5]
+
+
+def test_export_route_is_not_shadowed_by_get_by_id(client):
+    assert client.get("/managers/export").status_code == 200
+    assert client.get("/owners/export").status_code == 200
+
+
+def test_export_takes_no_page_size(client):
+    operation = client.get("/openapi.json").json()["paths"]["/trainers/export"]["get"]
+    params = {p["name"] for p in operation["parameters"]}
+    assert {"cursor", "order_by", "format"} <= params
+    assert not params & {"offset", "limit"}
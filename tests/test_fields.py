@@ -0,0 +1,77 @@
+from sqlalchemy import event
+
+from app.fields import sparse_model
+from app.models import Manager, Owner, Trainer
+
+
+def capture_selects(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def seed(session):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    session.add(Manager(name="Bob Stone", email="bob@gmail.com", owner=owner))
+    session.add_all(
+        Trainer(name=f"Trainer {c}", bio="x" * 1000, owner=owner) for c in "ABC"
+    )
+    session.commit()
+
+
+def test_list_selects_only_the_requested_columns(client, session, engine):
+    seed(session)
+    statements = capture_selects(engine)
+    response = client.get(
+        "/trainers/",
+        params={"fields": "name", "limit": 2, "order_by": "created_at"},
+    )
+    assert response.json() == [
+        {"id": 1, "name": "Trainer A"},
+        {"id": 2, "name": "Trainer B"},
+    ]
+    (statement,) = statements
+    assert "trainer.bio" not in statement
+    assert "trainer.email" not in statement
+    assert "trainer.created_at" in statement  # for the cursor
+
+    response = client.get(
+        "/trainers/",
+        params={
+            "fields": "name",
+            "order_by": "created_at",
+            "cursor": response.headers["X-Next-Cursor"],
+        },
+    )
+    assert response.json() == [{"id": 3, "name": "Trainer C"}]
+
+
+def test_get_with_fields_and_expand(client, session):
+    seed(session)
+    response = client.get("/trainers/1", params={"fields": " bio , id"})
+    assert response.json() == {"id": 1, "bio": "x" * 1000}
+
+    # The foreign key is selected for the expansion but not returned.
+    body = client.get(
+        "/trainers/2", params={"fields": "name", "expand": "owner"}
+    ).json()
+    assert body["owner"]["email"] == "ann@gmail.com"
+    assert body.keys() == {"id", "name", "owner"}
+
+    # GET /managers/{id} always includes the owner.
+    body = client.get("/managers/1", params={"fields": "email"}).json()
+    assert body == {"id": 1, "email": "bob@gmail.com", "owner": body["owner"]}
+
+    response = client.get("/trainers/", params={"fields": "name,salary"})
+    assert response.status_code == 400
+    assert "salary" in response.json()["detail"]
+
+
+def test_sparse_models_are_cached():
+    names = frozenset({"id", "name"})
+    assert sparse_model(Trainer, names) is sparse_model(Trainer, frozenset(names))
+    assert sparse_model(Trainer, names).model_fields.keys() == {"id", "name"}
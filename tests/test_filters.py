@@ -0,0 +1,86 @@
+from itertools import combinations
+
+import pytest
+from sqlmodel import select
+
+from app.filters import FacilityFilters, zip_prefix_range
+from app.models import Facility, Manager, Owner
+from app.pagination import PageParams, SortKey, page_statement
+
+
+def seed(session):
+    owners = [Owner(name=n, email=f"{n[:3]}@gmail.com") for n in ("Ann", "Bob")]
+    manager = Manager(name="Cy Young", email="cy@gmail.com", owner=owners[0])
+    places = [
+        ("Austin", "Texas", "TX", "78701", 0),
+        ("AUSTIN", "Texas", "tx", "78745", 1),
+        ("Austin", "Minnesota", "MN", "55912", 0),
+        ("Dallas", "Texas", "TX", "75201", 1),
+    ]
+    session.add_all(
+        Facility(
+            name=f"Gym {i}",
+            street="1 Main St",
+            city=city,
+            state=state,
+            state_abbr=abbr,
+            zip_code=zip_code,
+            owner=owners[owner],
+            manager=manager if i == 0 else None,
+        )
+        for i, (city, state, abbr, zip_code, owner) in enumerate(places)
+    )
+    session.commit()
+
+
+def ids(response):
+    assert response.status_code == 200
+    return [row["id"] for row in response.json()]
+
+
+def test_facility_filters(client, session):
+    seed(session)
+
+    def get(**params):
+        return ids(client.get("/facilities/", params=params))
+
+    assert get(city="austin") == [1, 2, 3]
+    assert get(city=" Austin ", state_abbr="TX") == [1, 2]
+    assert get(state="texas") == [1, 2, 4]
+    assert get(zip="787") == [1, 2]
+    assert get(zip="78745") == [2]
+    assert get(owner_id=2) == [2, 4]
+    assert get(manager_id=1) == [1]
+    assert get(city="Austin", owner_id=2, limit=1) == [2]
+    assert client.get("/facilities/", params={"zip": "78a"}).status_code == 422
+
+    export = client.get("/facilities/export", params={"state_abbr": "tx"})
+    assert [line.count('"city"') for line in export.text.splitlines()] == [1, 1, 1]
+
+
+def test_zip_prefix_range():
+    assert zip_prefix_range("787") == ("787", "788")
+    assert zip_prefix_range("9") == ("9", ":")
+
+
+VALUES = dict(
+    city="Austin", state="Texas", state_abbr="TX", zip="787", owner_id=1, manager_id=2
+)
+
+
+@pytest.mark.parametrize("order_by", list(SortKey))
+@pytest.mark.parametrize(
+    "names", [c for n in (1, 2) for c in combinations(VALUES, n)], ids=str
+)
+def test_every_filter_is_an_index_search(engine, names, order_by):
+    filters = FacilityFilters(**{name: VALUES[name] if name in names else None
+                                 for name in VALUES})  # fmt: skip
+    page = PageParams(offset=0, limit=100, cursor=None, order_by=order_by)
+    statement = page_statement(
+        filters.apply(select(Facility), Facility), Facility, page
+    )
+    sql = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    assert plan[0].startswith("SEARCH facility USING INDEX"), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
@@ -0,0 +1,97 @@
+import io
+import json
+
+from sqlmodel import select
+
+from app.importer import Checkpoint, Importer
+from app.models import Facility, Manager, Owner, Staff, Trainer
+
+
+def write(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def sources(tmp_path):
+    return {
+        "owners": write(
+            tmp_path / "owners.csv",
+            ["name,email", "Ann Lee,ann@gmail.com", "Bob Stone,bob@gmail.com"],
+        ),
+        "managers": write(
+            tmp_path / "managers.jsonl",
+            [
+                json.dumps(
+                    {
+                        "name": "Cat Ng",
+                        "email": "cat@gmail.com",
+                        "owner_email": "BOB@gmail.com",
+                    }
+                )
+            ],
+        ),
+        "facilities": write(
+            tmp_path / "facilities.csv",
+            [
+                "name,street,city,state,state_abbr,zip_code,owner_email,manager_email",
+                "Iron Den,1 Main St,Austin,Texas,TX,78701,bob@gmail.com,cat@gmail.com",
+            ],
+        ),
+        "trainers": write(
+            tmp_path / "trainers.csv",
+            [
+                "name,email,owner_email,facility_name",
+                "Dee Roy,dee@gmail.com,ann@gmail.com,iron den",
+                "Eve Park,eve@gmail.com,ann@gmail.com,No Such Gym",
+            ],
+        ),
+        "staff": write(
+            tmp_path / "staff.csv",
+            ["name,email,facility_name", "Fay Wu,fay@gmail.com,Iron Den"],
+        ),
+    }
+
+
+def test_import_resolves_natural_keys(engine, session, tmp_path):
+    errors = io.StringIO()
+    results = Importer(engine, batch_size=1, errors_file=errors).run(sources(tmp_path))
+
+    assert [(s.entity, s.inserted, s.invalid) for s in results] == [
+        ("owners", 2, 0),
+        ("managers", 1, 0),
+        ("facilities", 1, 0),
+        ("trainers", 1, 1),
+        ("staff", 1, 0),
+    ]
+    bob = session.exec(select(Owner).where(Owner.email == "bob@gmail.com")).one()
+    manager = session.exec(select(Manager)).one()
+    facility = session.exec(select(Facility)).one()
+    assert manager.owner_id == bob.id
+    assert (facility.owner_id, facility.manager_id) == (bob.id, manager.id)
+    assert session.exec(select(Trainer)).one().facility_id == facility.id
+    assert session.exec(select(Staff)).one().facility_id == facility.id
+
+    (error,) = [json.loads(line) for line in errors.getvalue().splitlines()]
+    assert (error["entity"], error["line"]) == ("trainers", 2)
+    assert error["errors"][0]["type"] == "unknown_reference"
+
+
+def test_import_skips_existing_rows(engine, session, tmp_path):
+    files = sources(tmp_path)
+    Importer(engine).run(files)
+    results = Importer(engine).run(files)
+
+    assert sum(stats.inserted for stats in results) == 0
+    assert len(session.exec(select(Owner)).all()) == 2
+
+
+def test_import_resumes_from_checkpoint(engine, session, tmp_path):
+    files = {"owners": sources(tmp_path)["owners"]}
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    checkpoint.advance("owners", files["owners"], 1)
+
+    (stats,) = Importer(engine, checkpoint=Checkpoint(checkpoint.path)).run(files)
+
+    assert (stats.read, stats.inserted) == (1, 1)
+    assert [o.email for o in session.exec(select(Owner))] == ["bob@gmail.com"]
+    assert Checkpoint(checkpoint.path).position("owners", files["owners"]) == 2
@@ -1,10 +1,4 @@
-from fastapi.testclient import TestClient
-from app.main2 import app
-
-client = TestClient(app)
-
-
-def test_read_main():
-    response = client.get("/")
+def test_read_main(client):
+    response = client.get("/owners/")
     assert response.status_code == 200
-    assert response.json() == {"message": "Hello World"}
+    assert response.json() == []
@@ -0,0 +1,55 @@
+import logging
+from dataclasses import replace
+
+from app import metrics
+from app.metrics import http_requests, sql_statements
+from app.models import Trainer
+from app.settings import settings
+
+
+def test_server_timing_and_metrics(client, session):
+    session.add_all(Trainer(name=f"Trainer {c}") for c in "ABC")
+    session.commit()
+    before = sql_statements.value("GET", "/trainers/")
+
+    response = client.get("/trainers/")
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert timing.startswith("app;dur=")
+    assert 'db;dur=' in timing and '1 queries' in timing
+    assert sql_statements.value("GET", "/trainers/") == before + 1
+
+    text = client.get("/metrics").text
+    labels = 'method="GET",route="/trainers/"'
+    assert f'gym_http_requests_total{{{labels},status="200"}}' in text
+    assert f'gym_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}' in text
+    assert f"gym_sql_rows_total{{{labels}}}" in text
+
+
+def test_route_templates_are_used_as_labels(client, session):
+    session.add(Trainer(name="Trainer A"))
+    session.commit()
+    before = http_requests.value("GET", "/trainers/{trainer_id}", "200")
+    client.get("/trainers/1")
+    assert http_requests.value("GET", "/trainers/{trainer_id}", "200") == before + 1
+
+
+def test_slow_query_log(client, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "settings", replace(settings, slow_query_ms=1e-9))
+    with caplog.at_level(logging.WARNING, logger="app.sql.slow"):
+        client.get("/trainers/", params={"limit": 7})
+    assert any(
+        "slow query" in message and "7" in message for message in caplog.messages
+    )
+
+
+def test_rows_are_counted_for_every_select(client, session):
+    session.add_all(Trainer(name=f"Trainer {c}") for c in "ABC")
+    session.commit()
+    sql_rows = metrics.sql_rows
+
+    for params in ({}, {"fields": "name"}):
+        before = sql_rows.value("GET", "/trainers/")
+        assert client.get("/trainers/", params=params).status_code == 200
+        # Whole rows and column-only selects alike, each row once.
+        assert sql_rows.value("GET", "/trainers/") == before + 3, params
@@ -0,0 +1,168 @@
+import pytest
+from sqlmodel import SQLModel
+
+from app.database import make_engine
+from app.migrations import MIGRATIONS, add_column, applied_versions, migrate
+from app.settings import load_settings
+
+
+def indexes(engine):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        )
+        return {row[0] for row in rows}
+
+
+def schema(engine):
+    """Every index and trigger, and the columns of every table."""
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT type, name FROM sqlite_master WHERE type != 'table' "
+            "AND sql IS NOT NULL"
+        ).all()
+        tables = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).scalars()
+        columns = {
+            table: {
+                row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")
+            }
+            for table in tables
+        }
+    return set(rows), columns
+
+
+# The tables as the first version of the app created them: no indexes,
+# summary or FTS tables, `deleted_at` or `email_status`.
+OLD_SCHEMA = [
+    "CREATE TABLE owner (name VARCHAR NOT NULL, email VARCHAR NOT NULL, "
+    "role VARCHAR(7), created_at DATETIME, id INTEGER NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE manager (name VARCHAR NOT NULL, email VARCHAR NOT NULL, "
+    "role VARCHAR(7), created_at DATETIME, owner_id INTEGER, "
+    "id INTEGER NOT NULL, PRIMARY KEY (id), "
+    "FOREIGN KEY(owner_id) REFERENCES owner (id))",
+    "CREATE TABLE facility (name VARCHAR NOT NULL, street VARCHAR NOT NULL, "
+    "city VARCHAR NOT NULL, state VARCHAR NOT NULL, state_abbr VARCHAR, "
+    "zip_code VARCHAR NOT NULL, owner_id INTEGER NOT NULL, manager_id INTEGER, "
+    "id INTEGER NOT NULL, created_at DATETIME, PRIMARY KEY (id), "
+    "FOREIGN KEY(owner_id) REFERENCES owner (id), "
+    "FOREIGN KEY(manager_id) REFERENCES manager (id))",
+    "CREATE TABLE trainer (name VARCHAR NOT NULL, email VARCHAR, bio VARCHAR, "
+    "role VARCHAR(7), created_at DATETIME, employment_date DATETIME, "
+    "owner_id INTEGER, manager_id INTEGER, facility_id INTEGER, "
+    "id INTEGER NOT NULL, PRIMARY KEY (id), "
+    "FOREIGN KEY(owner_id) REFERENCES owner (id), "
+    "FOREIGN KEY(manager_id) REFERENCES manager (id), "
+    "FOREIGN KEY(facility_id) REFERENCES facility (id))",
+    "CREATE TABLE staff (name VARCHAR NOT NULL, email VARCHAR NOT NULL, "
+    "bio VARCHAR, role VARCHAR(7), created_at DATETIME, owner_id INTEGER, "
+    "manager_id INTEGER, facility_id INTEGER NOT NULL, id INTEGER NOT NULL, "
+    "employment_date DATETIME NOT NULL, PRIMARY KEY (id), "
+    "FOREIGN KEY(owner_id) REFERENCES owner (id), "
+    "FOREIGN KEY(manager_id) REFERENCES manager (id), "
+    "FOREIGN KEY(facility_id) REFERENCES facility (id))",
+]
+
+
+@pytest.fixture(name="old_engine")
+def old_engine_fixture():
+    engine = make_engine(load_settings("test"))
+    with engine.begin() as conn:
+        for ddl in OLD_SCHEMA:
+            conn.exec_driver_sql(ddl)
+    yield engine
+    engine.dispose()
+
+
+def upgrade(engine):
+    # What `create_tables` does on startup.
+    SQLModel.metadata.create_all(engine)
+    return migrate(engine)
+
+
+def test_migrate_adds_indexes_to_existing_database(old_engine):
+    engine = old_engine
+    assert indexes(engine) == set()
+
+    applied = upgrade(engine)
+
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    assert {"ix_trainer_facility_id", "ux_owner_email_normalized"} <= indexes(engine)
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM trainer WHERE facility_id = 1"
+        ).all()
+        email_index = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'ux_owner_email_normalized'"
+        ).scalar()
+    assert "ix_trainer_facility_id" in plan[0][-1]
+    assert email_index.endswith("WHERE deleted_at IS NULL")
+
+
+def test_fresh_database_has_the_schema_migrations_build(engine, old_engine):
+    upgrade(engine)
+    upgrade(old_engine)
+    assert schema(old_engine) == schema(engine)
+
+
+def test_migrated_rollups_and_triggers_work(old_engine):
+    with old_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO owner (name, email, role) VALUES "
+            "('Ann Lee', 'ann@gmail.com', 'OWNER')"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO facility (name, street, city, state, zip_code, owner_id) "
+            "VALUES ('Downtown', '1 Main St', 'Austin', 'Texas', '78701', 1)"
+        )
+    upgrade(old_engine)
+    with old_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO trainer (name, owner_id, facility_id) "
+            "VALUES ('Trainer A', 1, 1)"
+        )
+        conn.exec_driver_sql("UPDATE facility SET deleted_at = '2024-01-01'")
+        totals = conn.exec_driver_sql(
+            "SELECT facilities, trainers FROM owner_stats WHERE owner_id = 1"
+        ).one()
+    assert tuple(totals) == (0, 1)
+
+
+def test_migrate_is_idempotent(engine):
+    migrate(engine)
+    assert migrate(engine) == []
+    with engine.connect() as conn:
+        assert applied_versions(conn) == [m.version for m in MIGRATIONS]
+
+
+def test_duplicate_emails_stop_the_unique_index(old_engine):
+    engine = old_engine
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO owner (name, email, role) VALUES "
+            "('Ann Lee', 'ann@gmail.com', 'OWNER'), "
+            "('Ann Lee', 'ANN@gmail.com', 'OWNER')"
+        )
+
+    with pytest.raises(RuntimeError, match="ann@gmail.com"):
+        migrate(engine)
+    with engine.connect() as conn:
+        assert applied_versions(conn) == [1]
+
+
+def test_add_column_skips_existing_columns(engine):
+    with engine.begin() as conn:
+        add_column(conn, "owner", "nickname", "TEXT")
+        add_column(conn, "owner", "nickname", "TEXT")
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(owner)")]
+    assert columns.count("nickname") == 1
+
+
+def test_duplicate_email_is_a_conflict(client, session):
+    owner = {"name": "Ann Lee", "email": "ann@gmail.com"}
+    assert client.post("/owners/", json=owner).status_code == 200
+
+    response = client.post("/owners/", json={**owner, "email": "Ann@Gmail.com"})
+    assert response.status_code == 409
+    session.rollback()
@@ -0,0 +1,65 @@
+from dataclasses import replace
+
+from sqlalchemy import event
+
+from app import crud, expand
+from app.models import Owner, Trainer
+
+
+def count_selects(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def seed(session):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    session.add_all(Trainer(name=f"Trainer {c}", owner=owner) for c in "ABCDE")
+    session.commit()
+
+
+def test_get_ids_keeps_the_order_and_reports_missing(client, session, engine):
+    seed(session)
+    statements = count_selects(engine)
+    response = client.get("/trainers/", params={"ids": "4,2,42,4,5,7"})
+    assert [row["id"] for row in response.json()] == [4, 2, 5]
+    assert response.headers["X-Missing-Ids"] == "42,7"
+    assert "X-Next-Cursor" not in response.headers
+    assert len(statements) == 1
+
+    response = client.get("/trainers/", params={"ids": "1,2"})
+    assert "X-Missing-Ids" not in response.headers
+    assert client.get("/trainers/", params={"ids": "1,x"}).status_code == 400
+
+
+def test_ids_are_fetched_in_chunks(client, session, engine, monkeypatch):
+    seed(session)
+    monkeypatch.setattr(expand, "IN_CHUNK_SIZE", 2)
+    statements = count_selects(engine)
+    response = client.get("/trainers/", params={"ids": "5,4,3,2,1"})
+    assert [row["id"] for row in response.json()] == [5, 4, 3, 2, 1]
+    assert len(statements) == 3
+
+
+def test_post_lookup(client, session, monkeypatch):
+    seed(session)
+    response = client.post(
+        "/trainers/lookup",
+        params={"fields": "name", "expand": "owner"},
+        json=[3, 9, 1, 3],
+    )
+    assert response.status_code == 200
+    assert [(row["id"], row["name"]) for row in response.json()] == [
+        (3, "Trainer C"),
+        (1, "Trainer A"),
+    ]
+    assert response.json()[0]["owner"]["name"] == "Ann Lee"
+    assert response.headers["X-Missing-Ids"] == "9"
+
+    monkeypatch.setattr(crud, "settings", replace(crud.settings, multi_get_max_ids=2))
+    assert client.post("/trainers/lookup", json=[1, 2, 1]).status_code == 200
+    assert client.post("/trainers/lookup", json=[1, 2, 3]).status_code == 413
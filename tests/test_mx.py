@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.mx import MXCache, MXResolver, StubBackend, validate_email_domain
+from app import mx
+
+
+def make_resolver(backend, positive_ttl=60.0, negative_ttl=60.0, maxsize=100):
+    return MXResolver(backend, MXCache(maxsize, positive_ttl, negative_ttl))
+
+
+def test_positive_and_negative_answers_are_cached():
+    backend = StubBackend({"nomx.example": False})
+    resolver = make_resolver(backend)
+
+    assert resolver.has_mx("gmail.com") is True
+    assert resolver.has_mx("GMAIL.com") is True
+    assert resolver.has_mx("nomx.example") is False
+    assert resolver.has_mx("nomx.example") is False
+    assert backend.calls == 2
+
+
+def test_expired_entries_are_looked_up_again():
+    backend = StubBackend({"nomx.example": False})
+    resolver = make_resolver(backend, positive_ttl=60.0, negative_ttl=0.01)
+
+    resolver.has_mx("nomx.example")
+    resolver.has_mx("gmail.com")
+    time.sleep(0.02)
+    resolver.has_mx("nomx.example")
+    resolver.has_mx("gmail.com")
+    assert backend.calls == 3
+
+
+def test_cache_evicts_least_recently_used():
+    cache = MXCache(maxsize=2, positive_ttl=60.0, negative_ttl=60.0)
+    cache.set("a.com", True)
+    cache.set("b.com", True)
+    cache.get("a.com")
+    cache.set("c.com", True)
+
+    assert cache.get("b.com") is None
+    assert cache.get("a.com") is True
+    assert cache.get("c.com") is True
+
+
+def test_concurrent_lookups_are_coalesced():
+    class SlowBackend(StubBackend):
+        def lookup(self, domain):
+            time.sleep(0.05)
+            return super().lookup(domain)
+
+    backend = SlowBackend()
+    resolver = make_resolver(backend)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(resolver.has_mx("gmail.com")))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 10
+    assert backend.calls == 1
+
+
+def test_async_lookups_are_coalesced_and_share_the_cache():
+    class SlowBackend(StubBackend):
+        async def alookup(self, domain):
+            await asyncio.sleep(0.01)
+            return self.lookup(domain)
+
+    backend = SlowBackend({"nomx.example": False})
+    resolver = make_resolver(backend)
+
+    async def run():
+        return await asyncio.gather(*(resolver.ahas_mx("nomx.example") for _ in range(10)))
+
+    assert asyncio.run(run()) == [False] * 10
+    assert resolver.has_mx("nomx.example") is False
+    assert backend.calls == 1
+
+
+def test_validate_email_domain(monkeypatch):
+    monkeypatch.setattr(mx, "resolver", make_resolver(StubBackend({"nomx.example": False})))
+
+    assert validate_email_domain("Someone@Gmail.com") == "someone@gmail.com"
+    with pytest.raises(ValueError, match="no MX records"):
+        validate_email_domain("someone@nomx.example")
+    with pytest.raises(ValueError):
+        validate_email_domain("not-an-email")
@@ -0,0 +1,135 @@
+from dataclasses import replace
+
+import pytest
+from sqlmodel import select
+
+from app import crud, dashboard
+from app.main import app
+from app.models import Facility, Manager, Owner, Staff, Trainer
+from app.purge import PurgeWorker
+
+
+@pytest.fixture(autouse=True)
+def soft_delete(monkeypatch):
+    monkeypatch.setattr(crud, "settings", replace(crud.settings, soft_delete=True))
+
+
+def facility(name, owner, manager):
+    return Facility(
+        name=name,
+        street="1 Main St",
+        city="Austin",
+        state="Texas",
+        state_abbr="TX",
+        zip_code="78701",
+        owner=owner,
+        manager=manager,
+    )
+
+
+def seed(session, trainers=3):
+    owners = [Owner(name=n, email=f"{n[:3].lower()}@gmail.com") for n in ("Ann", "Bob")]
+    managers = [
+        Manager(name=name, email=f"{name[:2].lower()}@gmail.com", owner=owner)
+        for name, owner in (("Cy Young", owners[0]), ("Di Shaw", owners[1]))
+    ]
+    gyms = [facility("Downtown", owners[0], managers[0])]
+    gyms.append(facility("Uptown", owners[1], managers[0]))
+    session.add_all(
+        Trainer(
+            name=f"Trainer {chr(ord('A') + i)}",
+            bio="kettlebell",
+            owner=owners[0],
+            manager=managers[0],
+            facility=gyms[0],
+        )
+        for i in range(trainers)
+    )
+    session.add(
+        Trainer(
+            name="Trainer Z", owner=owners[1], manager=managers[0], facility=gyms[1]
+        )
+    )
+    session.add(
+        Staff(name="Sam Hill", email="sam@gmail.com", owner=owners[0], facility=gyms[0])
+    )
+    session.commit()
+
+
+def test_soft_deleted_rows_leave_every_read_path(client, session):
+    seed(session)
+    assert client.delete("/trainers/1").status_code == 200
+    session.expire_all()
+    assert session.get(Trainer, 1).deleted_at is not None
+
+    assert client.get("/trainers/1").status_code == 404
+    assert client.patch("/trainers/1", json={"bio": "x"}).status_code == 404
+    assert 1 not in [t["id"] for t in client.get("/trainers/").json()]
+    response = client.get("/trainers/", params={"ids": "1,2"})
+    assert response.headers["X-Missing-Ids"] == "1"
+    assert 1 not in [t["id"] for t in client.get("/trainers/search?q=kettle").json()]
+    assert '"id":1,' not in client.get("/trainers/export").text
+    related = client.get("/facilities/1/staff/trainers/").json()["trainers"]
+    assert [t["id"] for t in related] == [2, 3]
+    assert client.get("/owners/1/dashboard").json()["trainers"] == 2
+
+    client.delete("/owners/2")
+    assert client.get("/owners/2/dashboard").status_code == 404
+    assert client.get("/trainers/4", params={"expand": "owner"}).json()["owner"] is None
+
+
+def test_purge_cascades_in_batches(client, session, engine):
+    seed(session, trainers=10)
+    client.delete("/owners/1")
+    client.delete("/managers/1")
+
+    changed = []
+    worker = PurgeWorker(engine, batch_size=4, pause=0, on_change=changed.append)
+    app.state.purge_worker = worker
+    status = client.get("/purge").json()
+    assert status["pending"] == {
+        "owner": 1, "manager": 1, "facility": 0, "trainer": 0, "staff": 0
+    }  # fmt: skip
+
+    assert worker.run_pass() > 0
+    assert worker.run_pass() == 0
+    status = client.get("/purge").json()
+    app.state.purge_worker = None
+    assert set(status["pending"].values()) == {0}
+    assert status["purged"] == {
+        "owner": 1, "manager": 1, "facility": 1, "trainer": 10, "staff": 1
+    }  # fmt: skip
+    # Owner 2 keeps its facility and trainer, without the deleted manager.
+    assert status["unlinked"] == {"facility": 1, "trainer": 1}
+    # 10 trainers at 4 per batch.
+    assert status["batches"] >= 3 + 2
+    assert set(changed) == {"facility", "trainer", "staff"}
+
+    session.expire_all()
+    assert [t.id for t in session.exec(select(Trainer))] == [11]
+    assert session.exec(select(Facility)).one().manager_id is None
+    assert session.exec(select(Manager)).one().name == "Di Shaw"
+    body = client.get("/owners/2/dashboard").json()
+    with engine.begin() as conn:
+        dashboard.rebuild(conn)
+    assert client.get("/owners/2/dashboard").json() == body
+
+
+def test_deleted_account_can_be_created_again_before_the_purge(
+    client, session, engine
+):
+    seed(session)
+    assert client.delete("/owners/1").status_code == 200
+    assert client.delete("/staff/1").status_code == 200
+
+    again = client.post("/owners/", json={"name": "Ann", "email": "ANN@gmail.com"})
+    assert again.status_code == 200
+    staff = {"name": "Sam Hill", "email": "sam@gmail.com", "facility_id": 2}
+    assert client.post("/staff/", json=staff).status_code == 200
+    # Still one live account per address.
+    response = client.post("/owners/", json={"name": "Ann", "email": "ann@gmail.com"})
+    assert response.status_code == 409
+    session.rollback()
+
+    PurgeWorker(engine, pause=0).run_pass()
+    assert client.get(f"/owners/{again.json()['id']}").status_code == 200
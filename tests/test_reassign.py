@@ -0,0 +1,99 @@
+from sqlalchemy import event
+from sqlmodel import select
+
+from app.models import Facility, Manager, Owner, Staff, Trainer
+
+
+def capture(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def seed(session):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    managers = [
+        Manager(name=name, email=f"{name[:3].lower()}@gmail.com", owner=owner)
+        for name in ("Bob Stone", "Cy Young")
+    ]
+    facilities = [
+        Facility(
+            name=name,
+            street="1 Main St",
+            city="Austin",
+            state="Texas",
+            state_abbr="TX",
+            zip_code="78701",
+            owner=owner,
+            manager=managers[0],
+        )
+        for name in ("Downtown", "Uptown")
+    ]
+    session.add_all(
+        Trainer(name=f"Trainer {c}", facility=facilities[0], manager=managers[0])
+        for c in "ABC"
+    )
+    session.add(
+        Staff(name="Sam Hill", email="sam@gmail.com", facility=facilities[0])
+    )
+    session.commit()
+
+
+def managers_of(session, model):
+    session.expire_all()
+    return [row.manager_id for row in session.exec(select(model).order_by(model.id))]
+
+
+def test_manager_update_assigns_without_loading_rows(client, session, engine):
+    seed(session)
+    statements = capture(engine)
+    response = client.patch(
+        "/managers/2", json={"trainer_ids": [3, 1, 99], "staff_ids": [1]}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Rows-Affected"] == "trainer=2,staff=1"
+    assert not any(s.startswith("SELECT") and "FROM trainer" in s for s in statements)
+    assert [s.split()[0] for s in statements] == ["SELECT", "UPDATE", "UPDATE"]
+    assert managers_of(session, Trainer) == [2, 1, 2]
+    assert managers_of(session, Staff) == [2]
+
+    response = client.patch("/managers/2", json={"name": "Cy Young"})
+    assert "X-Rows-Affected" not in response.headers
+
+
+def test_reassign_people(client, session):
+    seed(session)
+    response = client.post(
+        "/trainers/reassign", json={"ids": [1, 2, 2, 7], "facility_id": 2}
+    )
+    assert response.json() == {"updated": {"trainer": 2}}
+    facilities = client.get("/owners/1/dashboard").json()["by_facility"]
+    assert [f["trainers"] for f in facilities] == [1, 2]
+
+    response = client.post("/staff/reassign", json={"ids": [1], "manager_id": 2})
+    assert response.json() == {"updated": {"staff": 1}}
+    assert managers_of(session, Staff) == [2]
+
+    missing = client.post("/trainers/reassign", json={"ids": [1], "manager_id": 9})
+    assert missing.status_code == 404
+    assert missing.json() == {"detail": "Manager not found"}
+    assert client.post("/trainers/reassign", json={"ids": [1]}).status_code == 422
+
+
+def test_reassign_facility(client, session):
+    seed(session)
+    response = client.post("/facilities/1/reassign", json={"manager_id": 2})
+    assert response.json() == {"updated": {"facility": 1, "trainer": 3, "staff": 1}}
+    assert managers_of(session, Facility) == [2, 1]
+    assert managers_of(session, Trainer) == [2, 2, 2]
+
+    response = client.post("/facilities/1/reassign", json={"manager_id": None})
+    assert response.json()["updated"]["trainer"] == 3
+    assert managers_of(session, Staff) == [None]
+    assert client.post("/facilities/9/reassign", json={}).status_code == 422
+    response = client.post("/facilities/9/reassign", json={"manager_id": 1})
+    assert response.status_code == 404
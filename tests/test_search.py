@@ -0,0 +1,98 @@
+from app import search
+from app.migrations import migrate
+from app.models import Facility, Owner, Staff, Trainer
+
+
+def seed(session):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    downtown = Facility(
+        name="Downtown",
+        street="1 Main St",
+        city="Austin",
+        state="Texas",
+        state_abbr="TX",
+        zip_code="78701",
+        owner=owner,
+    )
+    session.add_all(
+        [
+            Trainer(name="Kim Bell", bio="Strength and conditioning"),
+            Trainer(name="Lou Park", bio="Kettlebell classes", facility=downtown),
+            Trainer(name="Max Ruiz", bio="Postpartum fitness, kettlebells"),
+            Staff(name="Kettle Front", email="front@gmail.com", facility=downtown),
+        ]
+    )
+    session.commit()
+
+
+def names(response):
+    assert response.status_code == 200
+    return [row["name"] for row in response.json()]
+
+
+def test_search_ranks_prefix_matches(client, session):
+    seed(session)
+    # A name hit outranks bio hits; "kettle" matches as a prefix.
+    assert names(client.get("/trainers/search", params={"q": "bell"})) == ["Kim Bell"]
+    assert names(client.get("/trainers/search", params={"q": "kettle"})) == [
+        "Lou Park",
+        "Max Ruiz",
+    ]
+    assert names(client.get("/trainers/search", params={"q": "kettle post"})) == [
+        "Max Ruiz"
+    ]
+    assert names(client.get("/staff/search", params={"q": "kettle"})) == [
+        "Kettle Front"
+    ]
+    scoped = client.get("/trainers/search", params={"q": "kettle", "facility_id": 1})
+    assert names(scoped) == ["Lou Park"]
+    # FTS5 syntax in the query is just words.
+    assert names(client.get("/trainers/search", params={"q": 'max"*('})) == [
+        "Max Ruiz"
+    ]
+
+
+def test_search_follows_writes(client, session):
+    seed(session)
+    client.patch("/trainers/3", json={"name": "Max Young"})
+    client.delete("/trainers/2")
+    client.post("/trainers/bulk", json=[{"name": "Ned Kettleman"}])
+
+    assert names(client.get("/trainers/search", params={"q": "kettle"})) == [
+        "Ned Kettleman",
+        "Max Young",
+    ]
+    assert names(client.get("/trainers/search", params={"q": "ruiz"})) == []
+
+
+def test_search_cursor_pagination(client, session):
+    trainers = [{"name": f"Trainer {c}", "bio": "yoga"} for c in "ABCDE"]
+    client.post("/trainers/bulk", json=trainers)
+    seen = []
+    params = {"q": "yoga", "limit": 2}
+    while True:
+        response = client.get("/trainers/search", params=params)
+        seen += names(response)
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert sorted(seen) == [f"Trainer {c}" for c in "ABCDE"]
+    assert len(seen) == 5
+
+    bad = client.get("/trainers/", params={"cursor": params["cursor"]})
+    assert bad.status_code == 400
+
+
+def test_migration_builds_the_index(engine, session):
+    seed(session)
+    with engine.begin() as conn:
+        for table in search.SEARCHABLE:
+            conn.exec_driver_sql(f"DROP TABLE {table}_fts")
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT rowid FROM trainer_fts WHERE trainer_fts MATCH 'kettle*'"
+        ).all()
+    assert sorted(row[0] for row in rows) == [2, 3]
@@ -0,0 +1,88 @@
+from dataclasses import replace
+from datetime import datetime
+from typing import List, Optional
+
+import pytest
+from sqlmodel import SQLModel, select
+
+from app import serializers
+from app.expand import expand_rows, expanded_model
+from app.models import Facility, Manager, Owner, Role, Staff, Trainer, TrainerRead
+
+
+@pytest.fixture
+def fast_json(monkeypatch):
+    def use(enabled):
+        settings = replace(serializers.settings, fast_json=enabled)
+        monkeypatch.setattr(serializers, "settings", settings)
+
+    return use
+
+
+def seed(session):
+    owner = Owner(name="Ann Lee", email="ann@gmail.com")
+    manager = Manager(name="Bob Stone", email="bob@gmail.com", owner=owner)
+    facility = Facility(
+        name="Café Größe",
+        street="1 Main St",
+        city="Austin",
+        state="Texas",
+        state_abbr=None,
+        zip_code="78701",
+        owner=owner,
+        manager=manager,
+    )
+    session.add(Trainer(name="Trainer A", bio="Hi", facility=facility, owner=owner))
+    session.add(
+        Trainer(
+            name="Trainer B",
+            role=Role.MANAGER,
+            employment_date=datetime(2024, 1, 2, 3, 4, 5, 678),
+        )
+    )
+    session.add(Staff(name="Sam Hill", email="sam@gmail.com", facility=facility))
+    session.commit()
+
+
+def test_fast_json_renders_the_same_bytes(session, fast_json):
+    seed(session)
+    trainers = session.exec(select(Trainer)).all()
+    names = frozenset({"owner", "manager", "facility"})
+    staffed = frozenset({"staff", "trainers"})
+    facility = session.get(Facility, 1)
+    cases = [
+        (List[TrainerRead], trainers),
+        (TrainerRead, trainers[1]),
+        (
+            List[expanded_model(Trainer, names)],
+            expand_rows(session, Trainer, trainers, names),
+        ),
+        (
+            expanded_model(Facility, staffed),
+            expand_rows(session, Facility, [facility], staffed)[0],
+        ),
+    ]
+    for response_model, content in cases:
+        fast_json(False)
+        expected = serializers.dump_json(response_model, content)
+        fast_json(True)
+        assert serializers.dump_json(response_model, content) == expected
+
+
+def test_converters_recurse_into_nested_models():
+    class Child(SQLModel):
+        id: int
+
+    class Parent(SQLModel):
+        child: Optional[Child] = None
+        children: List[Child] = []
+        tags: List[str] = []
+
+    convert = serializers.compiled(Parent)
+    assert convert({"child": None, "children": [{"id": 1}], "tags": ["a"]}) == {
+        "child": None,
+        "children": [{"id": 1}],
+        "tags": ["a"],
+    }
+    assert serializers.compiled(Parent) is convert
+
@@ -0,0 +1,89 @@
+from dataclasses import replace
+
+import pytest
+
+from app import mx
+from app.main import app
+from app.models import EmailStatus, Owner
+from app.verification import EmailVerifier, verification_status
+
+
+@pytest.fixture(autouse=True)
+def deferred(monkeypatch):
+    monkeypatch.setattr(
+        mx, "settings", replace(mx.settings, email_verification="deferred")
+    )
+
+
+def test_creates_are_pending_until_the_worker_verifies_them(
+    client, engine, stub_mx
+):
+    stub_mx.records["nomx.example"] = False
+    stub_mx.failures["flaky.example"] = 1
+    stub_mx.failures["down.example"] = 10
+    emails = [
+        "ann@gmail.com",
+        "bob@gmail.com",
+        "cy@nomx.example",
+        "di@flaky.example",
+        "ed@down.example",
+    ]
+    for email, name in zip(emails, ("Ann", "Bob", "Cyd", "Dia", "Eve")):
+        response = client.post("/owners/", json={"name": name, "email": email})
+        assert response.status_code == 200, response.text
+        assert response.json()["email_status"] == "pending"
+    # The validators no longer resolved anything.
+    assert stub_mx.calls == 0
+    manager = client.post(
+        "/managers/", json={"name": "Max", "email": "max@gmail.com", "owner_id": 1}
+    ).json()
+
+    assert client.get("/email-verification").json()["mode"] == "sync"
+    changed = []
+    verifier = EmailVerifier(
+        engine, workers=2, batch_size=2, retries=2, retry_delay=0,
+        on_change=changed.append,
+    )  # fmt: skip
+    app.state.email_verifier = verifier
+    status = client.get("/email-verification").json()
+    app.state.email_verifier = None
+    assert status["mode"] == "deferred"
+    assert status["pending"] == {"owner": 5, "manager": 1}
+
+    assert verifier.run_pass() == 6
+    assert set(changed) == {"owner", "manager"}
+    statuses = [client.get(f"/owners/{i}").json()["email_status"] for i in range(1, 6)]
+    assert statuses == ["verified", "verified", "invalid", "verified", "failed"]
+    assert client.get(f"/managers/{manager['id']}").json()["email_status"] == (
+        "verified"
+    )
+    assert verifier.status.retries == 1 + 2
+    assert verifier.status.failed == {"owner": 1}
+    with engine.connect() as conn:
+        assert verification_status(conn, verifier, "deferred").pending == {
+            "owner": 0,
+            "manager": 0,
+        }
+    assert verifier.run_pass() == 0
+
+
+def test_changing_an_email_verifies_it_again(client, engine, session):
+    session.add(Owner(name="Ann", email="ann@gmail.com"))
+    session.commit()
+    EmailVerifier(engine).run_pass()
+    assert client.get("/owners/1").json()["email_status"] == "verified"
+
+    client.patch("/owners/1", json={"name": "Ann Lee"})
+    assert client.get("/owners/1").json()["email_status"] == "verified"
+    response = client.patch("/owners/1", json={"email": "ann@nomx.example"})
+    assert response.json()["email_status"] == "pending"
+    EmailVerifier(engine).run_pass()
+    assert client.get("/owners/1").json()["email_status"] == "invalid"
+
+
+def test_sync_mode_still_rejects_domains_without_mx(client, monkeypatch):
+    monkeypatch.setattr(mx, "settings", replace(mx.settings, email_verification="sync"))
+    response = client.post("/owners/", json={"name": "Ann", "email": "a@nomx.example"})
+    assert response.status_code == 422
+    response = client.post("/owners/", json={"name": "Ann", "email": "a@gmail.com"})
+    assert response.json()["email_status"] == EmailStatus.VERIFIED
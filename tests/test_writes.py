@@ -0,0 +1,129 @@
+import threading
+from dataclasses import replace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, select
+
+from app import cache, metrics, writes
+from app.cache import MemoryBackend
+from app.crud import RESOURCES, insert_row
+from app.database import make_engine
+from app.main import app, get_session
+from app.models import Trainer, TrainerCreate
+from app.settings import load_settings
+
+
+@pytest.fixture(name="file_engine")
+def file_engine_fixture(tmp_path):
+    # One connection per thread, unlike the shared in-memory database.
+    db_url = f"sqlite:///{tmp_path}/db.sqlite3"
+    engine = make_engine(replace(load_settings("test"), db_url=db_url))
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(name="coalescer")
+def coalescer_fixture(file_engine, monkeypatch):
+    coalescer = writes.WriteCoalescer(file_engine, max_batch=8, max_delay=0.05)
+    monkeypatch.setattr(writes, "coalescer", coalescer.start())
+
+    def get_session_override():
+        with Session(file_engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    yield coalescer
+    coalescer.stop()
+    app.dependency_overrides.clear()
+
+
+def test_concurrent_creates_commit_together_with_their_own_results(
+    coalescer, file_engine
+):
+    client = TestClient(app)
+    batches = metrics.write_batch_size.count()
+    names = [f"Trainer {chr(ord('A') + i)}" for i in range(8)]
+    # Two of the writes fail: one doesn't validate, one updates a missing row.
+    requests = [("post", "/trainers/", {"name": name}) for name in names]
+    requests += [("post", "/trainers/", {"name": "X"})]
+    requests += [("patch", "/trainers/999", {"name": "Trainer Z"})]
+    responses = [None] * len(requests)
+
+    def send(index, method, path, body):
+        responses[index] = getattr(client, method)(path, json=body)
+
+    threads = [
+        threading.Thread(target=send, args=(i, *request))
+        for i, request in enumerate(requests)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [r.status_code for r in responses] == [200] * 8 + [422, 404]
+    assert sorted(r.json()["name"] for r in responses[:8]) == names
+    assert len({r.json()["id"] for r in responses[:8]}) == 8
+    with Session(file_engine) as session:
+        assert len(session.exec(select(Trainer)).all()) == 8
+    # 9 writes reached the queue (the 422 never did) in fewer commits.
+    assert 2 <= metrics.write_batch_size.count() - batches < 9
+
+
+def test_a_failing_write_does_not_undo_the_rest_of_its_batch(coalescer, file_engine):
+    trainers = next(r for r in RESOURCES if r.model is Trainer)
+
+    def fail(session):
+        session.add(Trainer(name="Trainer Q"))
+        session.flush()
+        raise RuntimeError("boom")
+
+    futures = [
+        coalescer.submit(insert_row, trainers, TrainerCreate(name="Trainer A")),
+        coalescer.submit(fail),
+        coalescer.submit(insert_row, trainers, TrainerCreate(name="Trainer B")),
+    ]
+    assert futures[0].result().status_code == 200
+    with pytest.raises(RuntimeError):
+        futures[1].result()
+    assert futures[2].result().status_code == 200
+    with Session(file_engine) as session:
+        names = session.exec(select(Trainer.name).order_by(Trainer.id)).all()
+    assert names == ["Trainer A", "Trainer B"]
+
+
+def test_cache_is_invalidated_after_the_batch_commits(
+    coalescer, file_engine, monkeypatch
+):
+    trainers = next(r for r in RESOURCES if r.model is Trainer)
+    events = []
+
+    class Backend(MemoryBackend):
+        def invalidate(self, tags):
+            events.append(set(tags))
+            super().invalidate(tags)
+
+    monkeypatch.setattr(cache, "backend", Backend())
+    event.listen(file_engine, "commit", lambda conn: events.append("COMMIT"))
+
+    def fail(session):
+        session.add(Trainer(name="Trainer Q"))
+        session.flush()
+        raise RuntimeError("boom")
+
+    futures = [
+        coalescer.submit(insert_row, trainers, TrainerCreate(name="Trainer A")),
+        coalescer.submit(fail),
+    ]
+    assert futures[0].result().status_code == 200
+    with pytest.raises(RuntimeError):
+        futures[1].result()
+
+    # One commit for the batch, then the tags of the write that was kept only.
+    [commit, tags] = events
+    assert commit == "COMMIT"
+    assert {"trainer", "trainer:1"} <= tags
+    assert "trainer:2" not in tags